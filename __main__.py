@@ -17,4 +17,9 @@ if __name__=='__main__':
 
     sim.show()
     status = app.exec_()
+    sys.stdout = sys.__stdout__
+    sys.stderr = sys.__stderr__
+    sim.stdout.closeStream()
+    sim.stderr.closeStream()
+    sim.log_writer.close()
     exit(status)
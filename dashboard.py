@@ -3,15 +3,17 @@ from PySide2.QtCore import *
 from PySide2.QtGui import *
 from PySide2.QtWidgets import *
 
-from widgets import Minimap, StreamError, StreamInput, StreamOutput
+from widgets import (LogWriter, Minimap, NetworkTablesClient, POSE_KEYS, StreamError, StreamInput, StreamOutput,
+                     TelemetryDispatcher)
 
 
 class Simulator(QWidget):
     def __init__(self):
         super().__init__(None, Qt.WindowStaysOnTopHint)
 
-        self.stdout = StreamOutput()
-        self.stderr = StreamError()
+        self.log_writer = LogWriter()
+        self.stdout = StreamOutput(log_writer=self.log_writer)
+        self.stderr = StreamError(log_writer=self.log_writer)
         self.exec = StreamInput()
 
         self.frame = QFrame()
@@ -21,6 +23,11 @@ class Simulator(QWidget):
         self.frame.setLayout(self.grid)
         self.setLayout(self.grid)
         self.map = Minimap()
+        self.telemetry = NetworkTablesClient().start()
+        self.dispatcher = TelemetryDispatcher(self.telemetry, parent=self)
+        self.pose = {}  # the latest of each of POSE_KEYS received
+        for key in POSE_KEYS:
+            self.dispatcher.subscribe(key, self.updatePose)  # one call per frame for all three
 
         # -- setting splitters
         splitter_bottom = QSplitter(Qt.Horizontal)  # STDIN, STDOUT
@@ -87,3 +94,9 @@ class Simulator(QWidget):
         self.grid.addWidget(splitter_main, 0, 0)
         splitter_main.setSizes((self.screen.height() * 0.6, self.screen.height() * 0.4))
         splitter_bottom.setSizes((self.map.width / 2, self.map.width / 2, self.stderr.sizeHint().width()))
+
+    def updatePose(self, values):
+        self.pose.update((key, value) for key, value in values.items() if value is not None)
+        x, y = (self.pose.get(key) for key in POSE_KEYS[:2])
+        if x is not None and y is not None:  # nothing to record until the robot has sent both
+            self.map.recordPose(x, y)
@@ -2,7 +2,7 @@ import sys
 from PySide2.QtCore import *
 from PySide2.QtGui import *
 from PySide2.QtWidgets import *
-from widgets import StreamError, StreamInput, StreamOutput
+from widgets import LogWriter, StreamError, StreamInput, StreamOutput
 
 class MyTableWidget(QWidget):
     def __init__(self, parent):
@@ -33,8 +33,9 @@ class Simulator(QWidget):
     def __init__(self):
         super().__init__(None, Qt.WindowStaysOnTopHint)
 
-        self.stdout = StreamOutput()
-        self.stderr = StreamError()
+        self.log_writer = LogWriter()
+        self.stdout = StreamOutput(log_writer=self.log_writer)
+        self.stderr = StreamError(log_writer=self.log_writer)
         self.exec = StreamInput()
 
         self.frame = QFrame()
@@ -3,7 +3,8 @@ from PySide2.QtCore import *
 from PySide2.QtGui import *
 from PySide2.QtWidgets import *
 
-from widgets import StreamError, StreamInput, StreamOutput, CameraPanel
+from widgets import (StreamError, StreamInput, StreamOutput, CameraPanel, CompassWidget, GYRO_KEY, NetworkTablesClient,
+                     TelemetryDispatcher, TelemetryStore)
 
 class App(QMainWindow):
     def __init__(self):
@@ -22,103 +23,6 @@ class App(QMainWindow):
 
         self.show()
 
-class CompassWidget(QWidget):
-
-    angleChanged = Signal(float)
-
-    def __init__(self, parent = None):
-
-        QWidget.__init__(self, parent)
-
-        self._angle = 0.0
-        self._margins = 10
-        self._pointText = {0: "N", 45: "NE", 90: "E", 135: "SE", 180: "S",
-                           225: "SW", 270: "W", 315: "NW"}
-
-    def paintEvent(self, event):
-
-        painter = QPainter()
-        painter.begin(self)
-        painter.setRenderHint(QPainter.Antialiasing)
-
-        painter.fillRect(event.rect(), self.palette().brush(QPalette.Window))
-        self.drawMarkings(painter)
-        self.drawNeedle(painter)
-
-        painter.end()
-
-    def drawMarkings(self, painter):
-
-        painter.save()
-        painter.translate(self.width()/2, self.height()/2)
-        scale = min((self.width() - self._margins)/120.0,
-                    (self.height() - self._margins)/120.0)
-        painter.scale(scale, scale)
-
-        font = QFont(self.font())
-        font.setPixelSize(10)
-        metrics = QFontMetricsF(font)
-
-        painter.setFont(font)
-        painter.setPen(self.palette().color(QPalette.Shadow))
-
-        i = 0
-        while i < 360:
-
-            if i % 45 == 0:
-                painter.drawLine(0, -40, 0, -50)
-                painter.drawText(-metrics.width(self._pointText[i])/2.0, -52,
-                                 self._pointText[i])
-            else:
-                painter.drawLine(0, -45, 0, -50)
-
-            painter.rotate(15)
-            i += 15
-
-        painter.restore()
-
-    def drawNeedle(self, painter):
-
-        painter.save()
-        painter.translate(self.width()/2, self.height()/2)
-        painter.rotate(self._angle)
-        scale = min((self.width() - self._margins)/120.0,
-                    (self.height() - self._margins)/120.0)
-        painter.scale(scale, scale)
-
-        painter.setPen(QPen(Qt.NoPen))
-        painter.setBrush(self.palette().brush(QPalette.Shadow))
-
-        painter.drawPolygon(
-            QPolygon([QPoint(-10, 0), QPoint(0, -45), QPoint(10, 0),
-                      QPoint(0, 45), QPoint(-10, 0)])
-            )
-
-        painter.setBrush(self.palette().brush(QPalette.Highlight))
-
-        painter.drawPolygon(
-            QPolygon([QPoint(-5, -25), QPoint(0, -45), QPoint(5, -25),
-                      QPoint(0, -30), QPoint(-5, -25)])
-            )
-
-        painter.restore()
-
-    def sizeHint(self):
-
-        return QSize(150, 150)
-
-    def angle(self):
-        return self._angle
-
-    def setAngle(self, angle):
-
-        if angle != self._angle:
-            self._angle = angle
-            self.angleChanged.emit(angle)
-            self.update()
-
-    angle = property(float, angle, setAngle)
-
 class MyTableWidget(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
@@ -140,10 +44,15 @@ class MyTableWidget(QWidget):
         self.tab2.layout = QGridLayout(self)
         self.gyroCompass = CompassWidget()
         self.gyroCompass.resize(400, 200)
-        self.cameraPanels = CameraPanel(2, app)
+        self.store = TelemetryStore(retention=180)  # the cameras' status and everything the robot publishes
+        self.cameraPanels = CameraPanel(2, app, store=self.store)
         self.spinBox = QSpinBox()
         self.spinBox.setRange(0, 10000)
         self.spinBox.valueChanged.connect(self.gyroCompass.setAngle)
+        self.telemetry = NetworkTablesClient().start()
+        self.dispatcher = TelemetryDispatcher(self.telemetry, parent=self)
+        self.dispatcher.subscribe(GYRO_KEY, self.updateGyro)
+        self.dispatcher.subscribe('/', self.store.record)
         self.tab2.layout.addWidget(self.cameraPanels, 0, 0)
         self.tab2.layout.addWidget(self.gyroCompass, 0, 2)
         self.tab2.layout.addWidget(self.spinBox, 2, 2)
@@ -158,6 +67,10 @@ class MyTableWidget(QWidget):
         self.layout.addWidget(self.tabs)
         self.setLayout(self.layout)
 
+    def updateGyro(self, values):
+        if values[GYRO_KEY] is not None:
+            self.gyroCompass.setAngle(values[GYRO_KEY])
+
 def on_click(self):
     print("\n")
     for currentQTableWidgetItem in self.tableWidget.selectedItems():
@@ -1,7 +1,11 @@
 import shapely.geometry
+import math
 import time
 import abc
 
+from field_map.expiry import TimingWheel
+from field_map.index import GridIndex
+
 
 class Singleton(type):
     def __call__(cls, *args, **kwargs):
@@ -13,10 +17,15 @@ class Singleton(type):
 
 
 class BaseMap(metaclass=Singleton):
-    def __init__(self, w, l):
+    def __init__(self, w, l, cell_size=None):
+        """
+        :param cell_size: optional. Cell size of the spatial index, in map units. Defaults to 1/32 of the longer side.
+        """
         self.width = w
         self.length = l
         self._objects = {}
+        self._index = GridIndex(cell_size or max(w, l) / 32)
+        self._expiry = TimingWheel()
     
     def add_object(self, obj, name=None, ):
         """
@@ -28,26 +37,50 @@ class BaseMap(metaclass=Singleton):
         assert isinstance(obj, Polygon) or isinstance(obj, BaseRobot), 'The object must be a polygon or a robot'
         
         if name is None:
-            self._objects[id(obj)] = obj
+            name = id(obj)
         else:
             assert name not in self._objects
-            self._objects[name] = obj
+        self._objects[name] = obj
+        self._index.insert(name, obj.bounds)
+        if getattr(obj, 'expires_at', None) is not None:
+            self._expiry.add(name, obj)
+        self._object_added(name, obj)
     
     def update_object(self, name, obj):
+        """
+        Replace a named object. Call this too after an object has moved, so the index follows it.
+        """
         assert isinstance(name,
                           str) and name in self._objects, 'Update can only be performed on a named existing object'
         
+        old = self._objects[name]
+        if old is not obj:
+            self._expiry.discard(name)
+            if getattr(obj, 'expires_at', None) is not None:
+                self._expiry.add(name, obj)
         self._objects[name] = obj
+        self._index.update(name, obj.bounds)
+        self._object_removed(name, old)
+        self._object_added(name, obj)
     
     def remove_object(self, obj):
         """
         :param obj: the name of object or the object itself.
         :return:
         """
-        if isinstance(obj, str):
-            del self._objects[obj]
-        else:
-            del self._objects[id(obj)]
+        key = obj if isinstance(obj, str) else self._key(obj)
+        obj = self._objects.pop(key)
+        self._index.remove(key)
+        self._expiry.discard(key)
+        self._object_removed(key, obj)
+    
+    def _key(self, obj):
+        if id(obj) in self._objects:
+            return id(obj)
+        for name, other in self._objects.items():  # a named object
+            if other is obj:
+                return name
+        raise KeyError(obj)
     
     def __getitem__(self, item):
         if isinstance(item, str):
@@ -58,34 +91,137 @@ class BaseMap(metaclass=Singleton):
     def __iter__(self):
         return iter(self._objects.values())
     
+    def names(self):
+        """
+        :return: a live view of the names of the objects, the same as query gives, so ids for objects added without a
+            name
+        """
+        return self._objects.keys()
+    
     def __repr__(self):
         return f'<BaseMap instance>'
     
+    def tick(self, now=None):
+        """
+        Remove the objects that have expired. Call this regularly; it only looks at objects due around now.
+        :param now: optional. Defaults to the current time.
+        :return: list of the removed objects
+        """
+        expired = self._expiry.advance(now)
+        for key, obj in expired:
+            del self._objects[key]
+            self._index.remove(key)
+            self._object_removed(key, obj)
+        return [obj for key, obj in expired]
+    
+    def query(self, bounds):
+        """
+        :param bounds: (minx, miny, maxx, maxy)
+        :return: list of (name, object) for the objects whose bounding box overlaps bounds. Objects added without a
+            name have their id as name.
+        """
+        objects = self._objects
+        return [(key, objects[key]) for key in self._index.query(bounds) if not objects[key].is_expired]
+    
+    def _object_added(self, key, obj):
+        """
+        Called after an object is added, or replaced by update_object. Subclasses that cache anything
+        derived from the objects hook in here and in _object_removed.
+        """
+    
+    def _object_removed(self, key, obj):
+        """
+        Called after an object is removed, or before it is replaced by update_object.
+        """
+    
+    def _geometry(self, key, obj):
+        """
+        :return: what intersect tests obj with: obj itself, or a faster equivalent such as a prepared geometry
+        """
+        return obj
+    
+    def _candidates(self, keys):
+        """
+        :return: the objects for keys, skipping the ones that have expired but were not swept yet
+        """
+        objects = [self._objects[key] for key in keys]
+        return [obj for obj in objects if not obj.is_expired]
+    
     def intersect(self, other):
         """
-        :param other: a polygon
+        :param other: a polygon, or the BaseRobot for its footprint
         :return: True if the polygon intersects with anything in the map
         """
-        for obj in self:
-            if obj.is_expired:
-                self.remove_object(obj)
-                print('Removed object %s: expired' % obj)
-                continue
-            
-            if obj.intersects(other):
+        other = other.polygon if isinstance(other, BaseRobot) else other
+        for key in self._index.query(other.bounds):
+            obj = self._objects[key]
+            if not obj.is_expired and self._geometry(key, obj).intersects(other):
                 return True
         
         return False
+    
+    def within_distance(self, other, distance):
+        """
+        :param other: a polygon or a point, or the BaseRobot for its footprint
+        :return: list of the objects no further than distance from other
+        """
+        other = other.polygon if isinstance(other, BaseRobot) else other
+        minx, miny, maxx, maxy = other.bounds
+        keys = self._index.query((minx - distance, miny - distance, maxx + distance, maxy + distance))
+        return [obj for obj in self._candidates(keys) if obj.distance(other) <= distance]
+    
+    def nearest(self, other, max_distance=None):
+        """
+        :param other: a polygon or a point, or the BaseRobot for its footprint
+        :param max_distance: optional. Ignore objects further than this.
+        :return: (object, distance) for the object closest to other, or (None, None) if there is none
+        """
+        other = other.polygon if isinstance(other, BaseRobot) else other
+        best, best_distance = None, None
+        for keys, reached in self._index.rings(other.bounds):
+            for obj in self._candidates(keys):
+                distance = obj.distance(other)
+                if best is None or distance < best_distance:
+                    best, best_distance = obj, distance
+            if best is not None and best_distance <= reached or max_distance is not None and reached > max_distance:
+                break  # nothing further out can be closer
+        if best is not None and max_distance is not None and best_distance > max_distance:
+            return None, None
+        return best, best_distance
 
 
 class Polygon(shapely.geometry.Polygon):
-    def __init__(self, *points):
-        super().__init__(points)  # it wouldn't make sense to have a hole in a polygon for our purpose
-        self.points = tuple(map(tuple, points))  # so it's hashable
+    def __init__(self, *points, vertices=None, bounds=None):
+        """
+        :param points: the vertices, as (x, y) pairs
+        :param vertices: optional. The vertices as a (k, 2) array instead, e.g. mapped from a layout file. They are
+            only turned into pairs when points is first read.
+        :param bounds: optional. (minx, miny, maxx, maxy), if already known
+        """
+        # it wouldn't make sense to have a hole in a polygon for our purpose
+        super().__init__(points if vertices is None else vertices)
+        self._points = tuple(map(tuple, points)) if vertices is None else vertices
+        if bounds is None:
+            xs, ys = zip(*self.points)
+            bounds = (min(xs), min(ys), max(xs), max(ys))
+        self._bounds = tuple(bounds)
+    
+    @property
+    def points(self):
+        """
+        :return: the vertices as a tuple of (x, y) tuples, so it's hashable
+        """
+        if not isinstance(self._points, tuple):
+            self._points = tuple(map(tuple, self._points.tolist()))
+        return self._points
     
     def __repr__(self):
         return f'<{self}>'
     
+    @property
+    def bounds(self):
+        return self._bounds  # shapely rebuilds this from the coordinates on every access
+    
     def __hash__(self):
         return hash(self.points)
     
@@ -100,28 +236,90 @@ class Polygon(shapely.geometry.Polygon):
 class BaseRobot(metaclass=Singleton):
     """
     Robot represents the current robot. For enemy robots, use a polygon
+
+    The robot has a pose: (x, y) is the center of its frame and heading the direction its length points in, in
+    radians counterclockwise from the x axis. The footprint polygon is only built when asked for, and kept until
+    the pose changes.
     """
+    __slots__ = ('width', 'length', '_x', '_y', '_heading', '_corners', '_bounds', '_polygon')
+    is_expired = False
     
-    def __init__(self, width, length):
+    def __init__(self, width, length, x=None, y=None, heading=math.pi / 2):
+        """
+        :param x, y: optional. Default to the pose where the frame sits in the corner of the field, length along y.
+        """
         self.width = width
         self.length = length
-        self._polygon = Polygon((0, 0), (width, 0), (width, length), (0, length))
-        self.is_expired = False
+        self.set_pose(width / 2 if x is None else x, length / 2 if y is None else y, heading)
+    
+    @property
+    def pose(self):
+        return self._x, self._y, self._heading
+    
+    @pose.setter
+    def pose(self, pose):
+        self.set_pose(*pose)
+    
+    def set_pose(self, x, y, heading):
+        """
+        Move the robot. If it is on a map, call the map's update_object afterwards so its index follows.
+        """
+        self._x, self._y, self._heading = x, y, heading
+        self._corners = self._bounds = self._polygon = None
     
-    def __getattr__(self, item):
-        try:
-            return getattr(self._polygon, item)
-        except AttributeError:
-            e = AttributeError('Robot has no attribute %s' % item)
-            e.__suppress_context__ = True
-            raise e
+    @property
+    def corners(self):
+        """
+        :return: the four corners of the footprint, counterclockwise from front left
+        """
+        if self._corners is None:
+            cos, sin = math.cos(self._heading), math.sin(self._heading)
+            x, y = self._x, self._y
+            half_length, half_width = self.length / 2, self.width / 2
+            self._corners = tuple((x + dx * cos - dy * sin, y + dx * sin + dy * cos)
+                                  for dx, dy in ((half_length, half_width), (-half_length, half_width),
+                                                 (-half_length, -half_width), (half_length, -half_width)))
+        return self._corners
+    
+    @property
+    def bounds(self):
+        if self._bounds is None:
+            xs, ys = zip(*self.corners)
+            self._bounds = (min(xs), min(ys), max(xs), max(ys))
+        return self._bounds
+    
+    @property
+    def polygon(self):
+        """
+        :return: the footprint as a Polygon
+        """
+        if self._polygon is None:
+            self._polygon = Polygon(*self.corners)
+        return self._polygon
+    
+    @property
+    def points(self):
+        return self.corners
+    
+    def intersects(self, other):
+        return self.polygon.intersects(other)
+    
+    def distance(self, other):
+        return self.polygon.distance(other)
+    
+    def contains(self, other):
+        return self.polygon.contains(other)
     
     def move_forward(self, distance):
-        raise NotImplementedError
+        x, y, heading = self.pose
+        self.set_pose(x + distance * math.cos(heading), y + distance * math.sin(heading), heading)
     
     def move_backward(self, distance):
-        raise NotImplementedError
-    
-    def turn(self,distance):
-        raise NotImplementedError
+        self.move_forward(-distance)
     
+    def turn(self, angle):
+        """
+        :param angle: in radians, counterclockwise
+        """
+        x, y, heading = self.pose
+        self.set_pose(x, y, (heading + angle + math.pi) % (2 * math.pi) - math.pi)
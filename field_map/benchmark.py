@@ -0,0 +1,138 @@
+"""
+Benchmarks the planners on standard field scenarios.
+
+    python -m field_map.benchmark --budget 0.02 --repeats 5
+
+For every scenario and planner this reports how often a complete path was found within the budget, the median
+planning time and the median path length relative to an unhurried A* reference. RRT* falls back to A* when it has
+not reached the goal in time, and how often it did is reported separately, since those paths are A*'s.
+"""
+import argparse
+import math
+import random
+import statistics
+import time
+
+import numpy as np
+
+from field_map.abc import BaseRobot
+from field_map.map import FieldMap, FieldObject, FieldStructure
+from field_map.planner import Planner
+
+ROBOT_SIZE = (28, 32)  # width, length in inches, frame perimeter limit with bumpers
+
+
+def rectangle(x, y, w, h):
+    return (x, y), (x + w, y), (x + w, y + h), (x, y + h)
+
+
+def open_field(field_map):
+    return (60, 60), (590, 270)
+
+
+def walls(field_map):
+    field_map.add_object(FieldStructure(*rectangle(200, 0, 30, 250)), 'wall 1')
+    field_map.add_object(FieldStructure(*rectangle(400, 74, 30, 250)), 'wall 2')
+    return (60, 160), (590, 160)
+
+
+def deep_space(field_map):
+    """
+    The 2019 field, roughly: a cargo ship in the middle and two rockets on each side wall.
+    """
+    field_map.add_object(FieldStructure(*rectangle(276, 140, 96, 45)), 'cargo ship')
+    for i, x in enumerate((210, 400)):
+        field_map.add_object(FieldStructure((x, 0), (x + 38, 0), (x + 30, 28), (x + 8, 28)), 'rocket %d' % (2 * i))
+        field_map.add_object(FieldStructure((x, 324), (x + 38, 324), (x + 30, 296), (x + 8, 296)),
+                             'rocket %d' % (2 * i + 1))
+    return (60, 60), (590, 270)
+
+
+def cluttered(field_map):
+    rng = random.Random(7407)
+    for i in range(30):
+        x, y = rng.uniform(100, 540), rng.uniform(20, 290)
+        field_map.add_object(FieldObject(*rectangle(x, y, rng.uniform(6, 24), rng.uniform(6, 24)), expires_in=3600))
+    return (40, 160), (610, 160)
+
+
+def narrow_passage(field_map):
+    gap = math.hypot(*ROBOT_SIZE) + 12
+    field_map.add_object(FieldStructure(*rectangle(310, 0, 30, 162 - gap / 2)), 'lower wall')
+    field_map.add_object(FieldStructure(*rectangle(310, 162 + gap / 2, 30, 162 - gap / 2)), 'upper wall')
+    return (60, 60), (590, 270)
+
+
+SCENARIOS = {'open': open_field, 'walls': walls, 'deep space': deep_space, 'cluttered': cluttered,
+             'narrow': narrow_passage}
+
+
+def run(budget=0.02, repeats=5, methods=('astar', 'rrt*')):
+    """
+    :return: list of result dicts, one per scenario and method
+    """
+    results = []
+    for name, build in SCENARIOS.items():
+        field_map = FieldMap()
+        start, goal = build(field_map)
+        planner = Planner(field_map, BaseRobot(*ROBOT_SIZE))
+        reference = planner.plan(start, goal, budget=10)
+        for method in methods:
+            times, lengths, complete, fallbacks = [], [], 0, 0
+            for _ in range(repeats):
+                planner.last = None  # no reuse, every run plans from scratch
+                plan = planner.plan(start, goal, budget, method)
+                times.append(plan.elapsed)
+                fallbacks += plan.method != method
+                if plan.complete:
+                    complete += 1
+                    lengths.append(plan.length)
+            results.append({
+                'scenario': name, 'method': method, 'success': complete / repeats, 'fallback': fallbacks / repeats,
+                'time': statistics.median(times),
+                'quality': statistics.median(lengths) / reference.length if lengths and reference.complete else None,
+            })
+        results.append(dict(scenario=name, method='replan', **_replan(field_map, planner, start, goal, budget)))
+    return results
+
+
+def _replan(field_map, planner, start, goal, budget):
+    """
+    Plan, drop an obstacle on the path, and time the repair, bringing the distance field up to date included.
+    """
+    planner.last = None
+    plan = planner.plan(start, goal, budget=10)
+    if len(plan.path) < 2:
+        return {'success': 0, 'time': 0, 'quality': None}
+    # Where the path has the most room around it, away from its ends, so that there is a way around the obstacle
+    points = np.vstack([np.linspace(a, b, 10, endpoint=False) for a, b in zip(plan.path[:-1], plan.path[1:])])
+    points = points[np.minimum(np.hypot(*(points - start).T), np.hypot(*(points - goal).T)) > 4 * planner.radius]
+    if not len(points):
+        return {'success': 0, 'time': 0, 'quality': None}
+    x, y = points[np.argmax(planner.distance.distance(points[:, 0], points[:, 1]))]
+    obstacle = FieldObject(*rectangle(x - 6, y - 6, 12, 12), expires_in=3600)
+    field_map.add_object(obstacle)
+    repaired = planner.plan(start, goal, budget)
+    field_map.remove_object(obstacle)
+    return {'success': float(repaired.complete), 'time': repaired.elapsed,
+            'quality': repaired.length / plan.length if repaired.complete else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the motion planners')
+    parser.add_argument('--budget', type=float, default=0.02, help='planning time budget, in seconds')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    print('%-12s %-8s %8s %10s %8s %9s' % ('scenario', 'method', 'success', 'time (ms)', 'length', 'fallback'))
+    for result in run(args.budget, args.repeats):
+        quality = '%.2fx' % result['quality'] if result['quality'] is not None else '-'
+        fallback = '%.0f%%' % (result['fallback'] * 100) if result['method'] == 'rrt*' else '-'
+        print('%-12s %-8s %7.0f%% %10.1f %8s %9s' % (result['scenario'], result['method'], result['success'] * 100,
+                                                     result['time'] * 1000, quality, fallback))
+    print('took %.1f s' % (time.perf_counter() - started))
+
+
+if __name__ == '__main__':
+    main()
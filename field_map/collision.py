@@ -0,0 +1,143 @@
+import numpy as np
+
+CHUNK_ELEMENTS = 1 << 18  # pose-corner-edge triples handled at once, bounds the size of the temporaries
+
+
+class Obstacles:
+    """
+    A set of polygons flattened into NumPy arrays of vertices and edges, for checking many poses at once.
+    """
+
+    def __init__(self, rings):
+        """
+        :param rings: list of (k, 2) vertex arrays, one per polygon, not closed
+        """
+        rings = [ring for ring in rings if len(ring)]
+        self.count = len(rings)
+        if rings:
+            self.vertices = np.concatenate(rings).astype(np.float64)
+            self.ends = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings]).astype(np.float64)
+            self.first = np.cumsum([0] + [len(ring) for ring in rings[:-1]])  # first edge of each polygon
+        else:
+            self.vertices = self.ends = np.empty((0, 2))
+            self.first = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.vertices)
+
+
+def footprint(x, y, heading, length, width):
+    """
+    :param heading: radians, counterclockwise from the x axis
+    :return: (n, 4, 2) corners of a length by width rectangle centered on each pose, length along the heading
+    """
+    local = np.array([(1, 1), (1, -1), (-1, -1), (-1, 1)]) * (length / 2, width / 2)
+    cos, sin = np.cos(heading)[:, None], np.sin(heading)[:, None]
+    return np.stack((x[:, None] + local[:, 0] * cos - local[:, 1] * sin,
+                     y[:, None] + local[:, 0] * sin + local[:, 1] * cos), axis=-1)
+
+
+def check_poses(x, y, heading, length, width, obstacles, field=None):
+    """
+    Check a batch of robot poses against a set of obstacles.
+
+    :param x, y, heading: arrays of n poses. heading in radians, counterclockwise from the x axis.
+    :param length, width: the robot footprint, centered on the pose with its length along the heading
+    :param obstacles: an Obstacles
+    :param field: optional. (length, width) of the field, whose edges then count as obstacles too
+    :return: (collides, clearance). collides is a boolean array, clearance the distance from each footprint to
+        the nearest obstacle, 0 where it collides and inf if there is nothing to hit.
+    """
+    x, y, heading = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64) for a in (x, y, heading)))
+    x, y, heading = x.ravel(), y.ravel(), heading.ravel()
+    n = len(x)
+    collides = np.zeros(n, dtype=bool)
+    clearance = np.full(n, np.inf)
+    corners = footprint(x, y, heading, length, width)
+
+    if field is not None:
+        field_length, field_width = field
+        cx, cy = corners[..., 0], corners[..., 1]
+        to_edge = np.minimum(np.minimum(cx, field_length - cx), np.minimum(cy, field_width - cy)).min(axis=1)
+        collides |= to_edge < 0
+        clearance = np.minimum(clearance, to_edge)
+
+    if len(obstacles):
+        step = max(1, CHUNK_ELEMENTS // (4 * len(obstacles)))
+        for start in range(0, n, step):
+            stop = min(start + step, n)
+            hit, distance = _check_chunk(x[start:stop], y[start:stop], heading[start:stop], corners[start:stop],
+                                         length, width, obstacles)
+            collides[start:stop] |= hit
+            np.minimum(clearance[start:stop], distance, out=clearance[start:stop])
+
+    clearance[collides] = 0
+    return collides, np.maximum(clearance, 0)
+
+
+def _check_chunk(x, y, heading, corners, length, width, obstacles):
+    a, b = obstacles.vertices, obstacles.ends
+    ax, ay = a[:, 0], a[:, 1]
+    ex, ey = b[:, 0] - ax, b[:, 1] - ay  # (E,)
+    edge_length = np.maximum(np.hypot(ex, ey), 1e-12)
+
+    # Obstacle vertices in each pose's frame: inside the footprint, or their distance to it
+    dx, dy = ax - x[:, None], ay - y[:, None]  # (n, E)
+    cos, sin = np.cos(heading)[:, None], np.sin(heading)[:, None]
+    along = np.abs(dx * cos + dy * sin) - length / 2
+    across = np.abs(dy * cos - dx * sin) - width / 2
+    hit = ((along <= 0) & (across <= 0)).any(axis=1)
+    distance = np.hypot(np.maximum(along, 0), np.maximum(across, 0)).min(axis=1)
+
+    # Footprint corners to obstacle edges, with the products expanded so each term is one broadcast operation
+    px, py = corners[..., 0][..., None], corners[..., 1][..., None]  # (n, 4, 1)
+    ux, uy = ex / edge_length, ey / edge_length
+    t = px * ux
+    t += py * uy
+    t -= ax * ux + ay * uy
+    np.clip(t, 0, edge_length, out=t)  # distance along each edge to the point nearest the corner
+    gap_x = t * ux
+    gap_x += ax
+    gap_x -= px
+    gap_y = t * uy
+    gap_y += ay
+    gap_y -= py
+    gap_x *= gap_x
+    gap_y *= gap_y
+    gap_x += gap_y
+    distance = np.minimum(distance, np.sqrt(gap_x.min(axis=(1, 2))))
+
+    # Footprint edges properly crossing obstacle edges. Only possible where an edge passes within half a diagonal
+    # of the pose, which rules out most poses in open space.
+    reach = np.hypot(length, width) / 2
+    near = np.flatnonzero(distance < reach)
+    if len(near):
+        px, py = px[near], py[near]
+        side = ex * py
+        side -= ey * px
+        side -= ex * ay - ey * ax  # which side of each obstacle edge each corner is on
+        crosses = side * np.roll(side, -1, axis=1) < 0
+        fx, fy = np.roll(px, -1, axis=1) - px, np.roll(py, -1, axis=1) - py  # (m, 4, 1)
+        offset = fx * py - fy * px
+        start = fx * ay
+        start -= fy * ax
+        start -= offset
+        stop = fx * b[:, 1]
+        stop -= fy * b[:, 0]
+        stop -= offset
+        crosses &= start * stop < 0
+        hit[near] |= crosses.any(axis=(1, 2))
+
+    # Footprint entirely inside an obstacle: its center is, by the even-odd rule per polygon
+    cx, cy = x[:, None], y[:, None]
+    straddles = (ay > cy) != (b[:, 1] > cy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing_x = ax + (cy - ay) * ex / ey
+    crossings = (straddles & (cx < crossing_x)).astype(np.int32)
+    hit |= (np.add.reduceat(crossings, obstacles.first, axis=1) % 2 == 1).any(axis=1)
+
+    hit |= distance <= 0  # touching
+    return hit, distance
+
+
+__all__ = ['Obstacles', 'footprint', 'check_poses']
@@ -0,0 +1,286 @@
+import time
+
+import numpy as np
+
+
+def distance_transform(mask, cap, walls=None, rows=None, cols=None):
+    """
+    Euclidean distance from every cell to the nearest cell in mask, in cells, between cell centers.
+
+    Done in two separable passes: a vertical pass finding the nearest masked cell in each column, then a horizontal
+    pass combining those over at most cap cells to either side. Each pass is a handful of whole-array operations. The
+    horizontal pass, most of the work, only covers the cells asked for, and only goes through the columns that have a
+    masked cell within reach when there are fewer of those than offsets to try.
+
+    :param mask: 2d boolean array of target cells
+    :param cap: distances are only exact up to cap, and anything further is reported as cap
+    :param walls: optional. (bottom, top, left, right) booleans, whether the space past each side of the array
+        counts as masked
+    :param rows, cols: optional. Slices of mask to return the distances of, defaults to all of it. The rest of mask is
+        only looked at for masked cells.
+    :return: float array of distances, the shape of mask[rows, cols]
+    """
+    height, width = mask.shape
+    rows = rows if rows is not None else slice(0, height)
+    cols = cols if cols is not None else slice(0, width)
+    far = cap + 1
+    bottom, top, left, right = walls if walls is not None else (False,) * 4
+    index = np.arange(height)[:, None]
+
+    # Vertical pass: distance to the nearest masked cell in the same column
+    below = np.maximum.accumulate(np.where(mask, index, -far - 1 if not bottom else -1), axis=0)
+    above = np.minimum.accumulate(np.where(mask, index, height + far if not top else height)[::-1], axis=0)[::-1]
+    vertical = np.minimum(np.minimum(index - below, above - index), far)[rows].astype(np.float64)
+    vertical **= 2
+
+    # Horizontal pass: squared distance through each column within reach
+    c0, c1 = cols.start, cols.stop
+    squared = vertical[:, c0:c1].copy()
+    # Columns that bring anything closer than far, the walls being a column of zeros just outside either side
+    reaching = np.flatnonzero((vertical[:, max(c0 - far, 0):c1 + far] < far * far).any(axis=0)) + max(c0 - far, 0)
+    if len(reaching) + 2 < 2 * far:
+        sources = [(j, vertical[:, j:j + 1]) for j in reaching]
+        if left and c0 - far <= 0:
+            sources.append((-1, 0.))
+        if right and c1 + far >= width:
+            sources.append((width, 0.))
+        offsets = np.arange(c0, c1)
+        for j, column in sources:
+            lo, hi = max(j - far, c0), min(j + far + 1, c1)
+            if lo < hi:
+                out = squared[:, lo - c0:hi - c0]
+                np.minimum(out, column + (offsets[lo - c0:hi - c0] - j) ** 2, out=out)
+    else:
+        padded = np.full((len(vertical), width + 2 * far), far * far, dtype=np.float64)
+        padded[:, far:far + width] = vertical
+        if left:
+            padded[:, :far] = 0
+        if right:
+            padded[:, far + width:] = 0
+        for offset in range(1, far + 1):
+            step = offset * offset
+            if offset % 4 == 1 and step >= squared.max():  # no further column can bring anything closer
+                break
+            np.minimum(squared, padded[:, far + c0 - offset:far + c1 - offset] + step, out=squared)
+            np.minimum(squared, padded[:, far + c0 + offset:far + c1 + offset] + step, out=squared)
+    return np.minimum(np.sqrt(squared), cap)
+
+
+def _merge(regions, region, touching=False):
+    """
+    Add [row0, row1, col0, col1] to a list of such regions, replacing those it overlaps, or also those it touches,
+    by the box bounding them all.
+    """
+    slack = 1 if touching else 0  # touching regions may just share an edge
+    merged = True
+    while merged:
+        merged = False
+        for other in regions:
+            if (region[0] < other[1] + slack and other[0] < region[1] + slack
+                    and region[2] < other[3] + slack and other[2] < region[3] + slack):
+                regions.remove(other)
+                region = [min(region[0], other[0]), max(region[1], other[1]),
+                          min(region[2], other[2]), max(region[3], other[3])]
+                merged = True
+                break
+    regions.append(region)
+
+
+class DistanceField:
+    """
+    Signed distance to the nearest obstacle, positive in free space and negative inside obstacles, sampled at the
+    cell centers of an OccupancyGrid and saturated at max_distance. The field edges count as obstacles.
+
+    Changes to the grid are recomputed lazily before the next query, and only around the cells that changed. Cells that
+    became occupied can only bring obstacles closer, so for those the distances to just the new cells are merged in,
+    which takes a few milliseconds for a robot sized obstacle. Cells that were cleared are recomputed in bands of rows,
+    so an update can stop at a deadline and carry on later.
+    """
+    BAND = 64  # rows recomputed at a time
+    HISTORY = 64  # regions kept for changed_since
+
+    def __init__(self, grid, max_distance):
+        """
+        :param grid: an OccupancyGrid
+        :param max_distance: in map units. Distances further than this are reported as max_distance.
+        """
+        self.grid = grid
+        self.resolution = grid.resolution
+        self.max_distance = max_distance
+        self.cap = int(np.ceil(max_distance / grid.resolution)) + 1  # in cells, one more for the half-cell offset
+        self.values = np.empty(grid.shape, dtype=np.float64)
+        self._dirty = []
+        self._occupied = grid.counts > 0  # the grid as of the last update
+        self._pending = []  # [row0, row1, col0, col1] of the regions still to recompute
+        self._history = []  # (version, row0, row1, col0, col1) of the regions recomputed, newest last
+        self._forgotten = 0  # newest version some of whose regions were dropped from the history
+        self.version = 0  # counts the updates, so users can cache what they derive from the values
+        self._compute(slice(0, grid.shape[0]), slice(0, grid.shape[1]))
+        grid.watchers.append(self._dirty)
+
+    def _compute(self, rows, cols):
+        """
+        Recompute values[rows, cols]. Obstacles up to cap cells outside the region are taken into account, but only
+        the region itself goes through the horizontal passes.
+        """
+        height, width = self.grid.shape
+        cap = self.cap
+        r0, r1 = max(rows.start - cap, 0), min(rows.stop + cap, height)
+        c0, c1 = max(cols.start - cap, 0), min(cols.stop + cap, width)
+        walls = (r0 == 0, r1 == height, c0 == 0, c1 == width)
+        occupied = self.grid.counts[r0:r1, c0:c1] > 0
+        region = slice(rows.start - r0, rows.stop - r0), slice(cols.start - c0, cols.stop - c0)
+        signed = distance_transform(occupied, cap, walls, *region) - 0.5
+        inside = occupied[region]
+        if inside.any():
+            # Distances are between cell centers, so the obstacle surface is half a cell from the nearest one
+            signed[inside] = 0.5 - distance_transform(~occupied, cap, None, *region)[inside]
+        signed *= self.resolution
+        np.clip(signed, -self.max_distance, self.max_distance, out=signed)
+        self.values[rows, cols] = signed
+
+    def update(self, deadline=None):
+        """
+        Bring the field up to date with the grid. Queries do this by themselves.
+        :param deadline: optional. time.perf_counter() time to stop at, leaving the rest for the next call. A band of
+            rows is the least done.
+        :return: whether the field is up to date
+        """
+        changed = False
+        if self._dirty:
+            height, width = self.grid.shape
+            reach = self.cap
+            regions, self._dirty[:] = list(self._dirty), []
+            for rows, cols in regions:
+                occupied = self.grid.counts[rows, cols] > 0
+                before = self._occupied[rows, cols]
+                if np.array_equal(occupied, before):
+                    continue
+                cleared = (before & ~occupied).any()
+                added = occupied & ~before
+                self._occupied[rows, cols] = occupied
+                # Every cell within reach of a changed cell may have a different nearest obstacle now
+                region = [max(rows.start - reach, 0), min(rows.stop + reach, height),
+                          max(cols.start - reach, 0), min(cols.stop + reach, width)]
+                if cleared:
+                    self._queue(region)
+                else:
+                    if not changed:
+                        self.version += 1
+                        changed = True
+                    self._add(rows, cols, added, region)
+        if not self._pending:
+            self._trim()
+            return True
+        if not changed:
+            self.version += 1
+        while self._pending:
+            region = self._pending[-1]
+            r0, r1, c0, c1 = region
+            band = min(r0 + self.BAND, r1)
+            self._compute(slice(r0, band), slice(c0, c1))
+            self._history.append((self.version, r0, band, c0, c1))
+            if band == r1:
+                self._pending.pop()
+            else:
+                region[0] = band
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        self._trim()
+        return not self._pending
+
+    def _trim(self):
+        if len(self._history) > self.HISTORY:
+            self._forgotten = self._history[-self.HISTORY - 1][0]
+            del self._history[:-self.HISTORY]
+
+    def _add(self, rows, cols, added, region):
+        """
+        Merge cells that became occupied into the field: the distance to them lowers the distances of the free cells
+        around, and the occupied cells get their distance inside.
+        :param added: boolean array over [rows, cols] of the cells that became occupied
+        :param region: [row0, row1, col0, col1] of the cells within reach of them
+        """
+        r0, r1, c0, c1 = region
+        mask = np.zeros((r1 - r0, c1 - c0), dtype=bool)
+        mask[rows.start - r0:rows.stop - r0, cols.start - c0:cols.stop - c0] = added
+        closer = (distance_transform(mask, self.cap) - 0.5) * self.resolution
+        np.clip(closer, -self.max_distance, self.max_distance, out=closer)
+        values = self.values[r0:r1, c0:c1]
+        occupied = self.grid.counts[r0:r1, c0:c1] > 0
+        np.minimum(values, closer, out=values, where=~occupied)
+        # Cells inside obstacles that grew may now be further from the nearest free cell, so all the occupied cells
+        # around are done again, within the box bounding them
+        occupied_rows, occupied_cols = np.flatnonzero(occupied.any(axis=1)), np.flatnonzero(occupied.any(axis=0))
+        self._computeInside(slice(r0 + occupied_rows[0], r0 + occupied_rows[-1] + 1),
+                            slice(c0 + occupied_cols[0], c0 + occupied_cols[-1] + 1))
+        self._history.append((self.version, r0, r1, c0, c1))
+
+    def _computeInside(self, rows, cols):
+        height, width = self.grid.shape
+        cap = self.cap
+        r0, r1 = max(rows.start - cap, 0), min(rows.stop + cap, height)
+        c0, c1 = max(cols.start - cap, 0), min(cols.stop + cap, width)
+        occupied = self.grid.counts[r0:r1, c0:c1] > 0
+        region = slice(rows.start - r0, rows.stop - r0), slice(cols.start - c0, cols.stop - c0)
+        inside = occupied[region]
+        signed = (0.5 - distance_transform(~occupied, cap, None, *region)[inside]) * self.resolution
+        self.values[rows, cols][inside] = np.maximum(signed, -self.max_distance)
+
+    def _queue(self, region):
+        """
+        Add a region to recompute, merged with the pending ones it overlaps so no cell is done twice. Regions apart
+        stay apart.
+        """
+        _merge(self._pending, region)
+
+    def changed_since(self, version):
+        """
+        :return: list of (rows, cols) slices of the values recomputed after version, or None if that is no longer
+            known, in which case anything may have changed
+        """
+        if version == self.version:
+            return []
+        if version < self._forgotten or version > self.version:
+            return None
+        regions = []
+        for v, r0, r1, c0, c1 in self._history:
+            if v > version:
+                _merge(regions, [r0, r1, c0, c1], touching=True)
+        return [(slice(r0, r1), slice(c0, c1)) for r0, r1, c0, c1 in regions]
+
+    def _lookup(self, x, y, update):
+        if update:
+            self.update()
+        height, width = self.values.shape
+        u = np.asarray(x, dtype=np.float64) / self.resolution - 0.5  # in cells from the first cell center
+        v = np.asarray(y, dtype=np.float64) / self.resolution - 0.5
+        col = np.clip(np.floor(u).astype(np.int64), 0, width - 2)
+        row = np.clip(np.floor(v).astype(np.int64), 0, height - 2)
+        fu, fv = np.clip(u - col, 0, 1), np.clip(v - row, 0, 1)
+        values = self.values.ravel()  # flat indices take a fraction of the time of (row, col) pairs
+        index = row * width + col
+        return (values.take(index), values.take(index + 1), values.take(index + width),
+                values.take(index + width + 1)), fu, fv
+
+    def distance(self, x, y, update=True):
+        """
+        :param update: whether to bring the field up to date first. Planners that update it against a deadline
+            themselves pass False, and get the values as they are.
+        :return: the signed distance at each point, bilinearly interpolated between cell centers
+        """
+        (v00, v01, v10, v11), fu, fv = self._lookup(x, y, update)
+        return (v00 * (1 - fu) + v01 * fu) * (1 - fv) + (v10 * (1 - fu) + v11 * fu) * fv
+
+    def gradient(self, x, y, update=True):
+        """
+        :return: (dx, dy), the gradient of the interpolated distance at each point. It points away from the nearest
+            obstacle and has a length of about 1 wherever the distance is not saturated.
+        """
+        (v00, v01, v10, v11), fu, fv = self._lookup(x, y, update)
+        dx = ((v01 - v00) * (1 - fv) + (v11 - v10) * fv) / self.resolution
+        dy = ((v10 - v00) * (1 - fu) + (v11 - v01) * fu) / self.resolution
+        return dx, dy
+
+
+__all__ = ['DistanceField', 'distance_transform']
@@ -0,0 +1,87 @@
+import math
+import time
+
+
+class TimingWheel:
+    """
+    Tracks when items expire. Items are filed in a ring of slots by deadline, each slot covering resolution
+    seconds, and advancing the wheel only visits the slots whose time has passed.
+
+    Deadlines are read from each item's expires_at when its slot comes up, so refreshing an item is just an
+    attribute write. An item found in a slot before its deadline is filed again further on, which is also
+    how deadlines more than one turn of the wheel away are handled. Deadlines may only move later.
+    """
+
+    def __init__(self, resolution=0.1, slots=128):
+        self.resolution = resolution
+        self._slots = [set() for _ in range(slots)]
+        self._items = {}  # key -> item
+        self._slot_of = {}  # key -> index of the slot it is filed in
+        self._tick = None  # the last tick advanced to
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def _file(self, key, deadline):
+        tick = math.floor(deadline / self.resolution)
+        if self._tick is not None:
+            tick = max(tick, self._tick)  # a slot behind the hand would not be visited for a whole turn
+        slot = tick % len(self._slots)
+        self._slots[slot].add(key)
+        self._slot_of[key] = slot
+
+    def add(self, key, item):
+        """
+        :param item: anything with an expires_at attribute, in seconds since the epoch
+        """
+        self.discard(key)
+        self._items[key] = item
+        self._file(key, item.expires_at)
+
+    def discard(self, key):
+        if self._items.pop(key, None) is not None:
+            self._slots[self._slot_of.pop(key)].discard(key)
+
+    def clear(self):
+        self._items.clear()
+        self._slot_of.clear()
+        for slot in self._slots:
+            slot.clear()
+
+    def advance(self, now=None):
+        """
+        Visit every slot up to now and drop the items that have expired.
+
+        :return: list of (key, item) that expired
+        """
+        if now is None:
+            now = time.time()
+        target = math.floor(now / self.resolution)
+        start = target - len(self._slots) + 1  # the first time, or after a long pause, one turn visits everything
+        if self._tick is not None:
+            start = max(start, self._tick)
+        self._tick = target
+        expired = []
+        slots, items = self._slots, self._items
+        for tick in range(start, target + 1):
+            slot = slots[tick % len(slots)]
+            if not slot:
+                continue
+            keys = list(slot)
+            slot.clear()
+            for key in keys:
+                item = items[key]
+                deadline = item.expires_at
+                if deadline <= now:
+                    del items[key]
+                    del self._slot_of[key]
+                    expired.append((key, item))
+                else:
+                    self._file(key, deadline)
+        return expired
+
+
+__all__ = ['TimingWheel']
@@ -0,0 +1,172 @@
+import glob
+import hashlib
+import math
+import os
+
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')  # wherever the dashboard is started from
+CACHE_KEEP = 4  # static rasters kept, the most recently used ones
+
+
+class OccupancyGrid:
+    """
+    Raster of a map. Cell (row, col) covers x in [col, col + 1) and y in [row, row + 1) times resolution, so row 0
+    is the bottom of the field like in the map. Each cell counts the objects covering its center, so overlapping
+    objects can be stamped and cleared independently.
+    """
+
+    def __init__(self, width, length, resolution=1):
+        """
+        :param width, length: size of the map, in map units. width is along y, length along x.
+        :param resolution: size of a cell, in map units
+        """
+        self.resolution = resolution
+        self.shape = (math.ceil(width / resolution), math.ceil(length / resolution))
+        self.counts = np.zeros(self.shape, dtype=np.uint16)
+        self._stamps = {}  # key -> (rows, cols, mask) stamped for that key, or None if it came from the static cache
+        self.watchers = []  # lists that get the (rows, cols) slices of every change appended, see DistanceField
+
+    def __contains__(self, key):
+        return key in self._stamps
+
+    @property
+    def occupied(self):
+        """
+        :return: boolean array of the occupied cells
+        """
+        return self.counts > 0
+
+    def cell(self, x, y):
+        """
+        :return: (row, col) of the cells containing the points, as arrays. They may be outside the grid.
+        """
+        return (np.floor(np.asarray(y) / self.resolution).astype(np.int64),
+                np.floor(np.asarray(x) / self.resolution).astype(np.int64))
+
+    def is_occupied(self, x, y):
+        """
+        :return: boolean array, True where the point is in an occupied cell or off the grid
+        """
+        rows, cols = self.cell(x, y)
+        inside = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        result = np.ones(rows.shape, dtype=bool)
+        result[inside] = self.counts[rows[inside], cols[inside]] > 0
+        return result
+
+    def rasterize(self, points):
+        """
+        :param points: vertices of a polygon, not closed
+        :return: (rows, cols, mask), the slices of the grid around the polygon and which of those cells have their
+            center inside it, or None if it covers no cell center
+        """
+        points = np.asarray(points, dtype=np.float64) / self.resolution  # in cells from here on
+        (minx, miny), (maxx, maxy) = points.min(axis=0), points.max(axis=0)
+        col0, col1 = max(0, math.ceil(minx - 0.5)), min(self.shape[1] - 1, math.floor(maxx - 0.5))
+        row0, row1 = max(0, math.ceil(miny - 0.5)), min(self.shape[0] - 1, math.floor(maxy - 0.5))
+        if col0 > col1 or row0 > row1:
+            return None
+
+        # Scanlines through the cell centers. Every edge crossing a row flips all the cells right of the crossing,
+        # so a running sum along the row tells which centers are inside.
+        a, b = points, np.roll(points, -1, axis=0)
+        y = np.arange(row0, row1 + 1)[:, None] + 0.5
+        straddles = (a[:, 1] > y) != (b[:, 1] > y)  # (rows, edges)
+        rows, edges = np.nonzero(straddles)
+        a, b, y = a[edges], b[edges], y[rows, 0]
+        crossing = a[:, 0] + (y - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+        first = np.clip(np.floor(crossing - 0.5).astype(np.int64) + 1 - col0, 0, col1 - col0 + 1)
+        flips = np.zeros((row1 - row0 + 1, col1 - col0 + 2), dtype=np.int32)
+        np.add.at(flips, (rows, first), 1)
+        mask = (np.cumsum(flips, axis=1)[:, :-1] & 1).astype(bool)
+        if not mask.any():
+            return None
+        return slice(row0, row1 + 1), slice(col0, col1 + 1), mask
+
+    def add(self, key, points):
+        """
+        Stamp a polygon onto the grid. Only the cells around it are touched.
+        """
+        if key in self._stamps:
+            self.remove(key, points)
+        stamp = self.rasterize(points)
+        if stamp is not None:
+            rows, cols, mask = stamp
+            self.counts[rows, cols] += mask
+            self._changed(rows, cols)
+        self._stamps[key] = stamp
+
+    def remove(self, key, points):
+        """
+        Clear what add stamped for key.
+        :param points: the same points as were added
+        """
+        if key not in self._stamps:
+            return
+        stamp = self._stamps.pop(key)
+        if stamp is None:
+            stamp = self.rasterize(points)  # loaded from the static cache, so nothing was kept
+        if stamp is not None:
+            rows, cols, mask = stamp
+            self.counts[rows, cols] -= mask
+            self._changed(rows, cols)
+
+    def _changed(self, rows, cols):
+        for watcher in self.watchers:
+            watcher.append((rows, cols))
+
+    def add_static(self, polygons, cache_dir=CACHE_DIR, counts=None):
+        """
+        Stamp polygons that will rarely change, all at once. The resulting raster is cached in cache_dir, keyed by
+        the polygons and the grid, so the same field is only rasterized once. Only the CACHE_KEEP most recently used
+        rasters are kept.
+        :param polygons: dict of key -> points
+        :param counts: optional. The raster of the polygons, already made for this grid, e.g. by a field layout.
+        """
+        if counts is not None:
+            self._add_counts(polygons, counts)
+            return
+        digest = hashlib.sha1(repr((self.shape, self.resolution, sorted(map(tuple, polygons.values())))).encode())
+        path = os.path.join(cache_dir, 'occupancy-%s.npy' % digest.hexdigest()) if cache_dir else None
+        counts = None
+        if path is not None and os.path.exists(path):
+            try:
+                counts = np.load(path)
+                os.utime(path)  # recently used, so pruning keeps it
+            except (OSError, ValueError):
+                counts = None  # a broken cache file just means rasterizing again
+        if counts is None or counts.shape != self.shape:
+            counts = np.zeros(self.shape, dtype=np.uint16)
+            for points in polygons.values():
+                stamp = self.rasterize(points)
+                if stamp is not None:
+                    rows, cols, mask = stamp
+                    counts[rows, cols] += mask
+            if path is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.save(path, counts)
+                _prune(cache_dir)
+        self._add_counts(polygons, counts)
+
+    def _add_counts(self, polygons, counts):
+        assert counts.shape == self.shape, 'The raster must be of this grid'
+        self.counts += counts
+        self._changed(slice(0, self.shape[0]), slice(0, self.shape[1]))
+        for key in polygons:
+            self._stamps[key] = None
+
+
+def _prune(cache_dir):
+    """
+    Delete all but the CACHE_KEEP most recently used static rasters in cache_dir.
+    """
+    paths = glob.glob(os.path.join(cache_dir, 'occupancy-*.npy'))
+    paths.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0, reverse=True)
+    for path in paths[CACHE_KEEP:]:
+        try:
+            os.remove(path)
+        except OSError:  # another dashboard pruned it first
+            pass
+
+
+__all__ = ['OccupancyGrid']
@@ -0,0 +1,99 @@
+import math
+
+import numpy as np
+
+
+class Heatmap:
+    """
+    2d histograms of where things happened on the field, e.g. how long the robot spent in each cell (the 'time'
+    layer) and where it collided (the 'collisions' layer). Cell (row, col) covers x in [col, col + 1) and y in
+    [row, row + 1) times cell_size, like an OccupancyGrid, so row 0 is the bottom of the field.
+
+    Samples are added in batches and binned with whole-array operations. The histograms have a fixed size however
+    many samples went in, so drawing and saving them costs the same all match long.
+    """
+    LAYERS = ('time', 'collisions')
+
+    def __init__(self, width, length, cell_size):
+        """
+        :param width, length: size of the map, in map units. width is along y, length along x.
+        :param cell_size: in map units
+        """
+        self.width = width
+        self.length = length
+        self.cell_size = cell_size
+        self.shape = (math.ceil(width / cell_size), math.ceil(length / cell_size))
+        self.layers = {name: np.zeros(self.shape, dtype=np.float64) for name in self.LAYERS}
+        self.version = 0  # counts the changes, so views can cache what they draw
+        self._trail_seen = 0  # serial number of the next trail sample add_trail has not counted
+
+    def add(self, x, y, weight=1, layer='time'):
+        """
+        Add samples to a layer. Samples off the field are ignored.
+        :param x, y: coordinates of the samples, scalars or arrays
+        :param weight: how much each sample counts, a scalar or an array like x
+        :param layer: name of the layer. Layers other than LAYERS are created when first added to.
+        """
+        x, y = np.atleast_1d(np.asarray(x, dtype=np.float64)), np.atleast_1d(np.asarray(y, dtype=np.float64))
+        weight = np.broadcast_to(np.asarray(weight, dtype=np.float64), x.shape)
+        rows = np.floor(y / self.cell_size).astype(np.int64)
+        cols = np.floor(x / self.cell_size).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        if layer not in self.layers:
+            self.layers[layer] = np.zeros(self.shape, dtype=np.float64)
+        # the same as np.add.at on (rows, cols), but bincount is several times faster
+        flat = rows[inside] * self.shape[1] + cols[inside]
+        self.layers[layer] += np.bincount(flat, weight[inside], minlength=self.shape[0] * self.shape[1]) \
+            .reshape(self.shape)
+        self.version += 1
+
+    def add_trail(self, trail):
+        """
+        Add the time spent at each position of a Trail recorded since the last call to the 'time' layer. A sample
+        is held until the next one, so the time a decimated trail spent standing still is counted too. The latest
+        sample is counted when the next one comes in.
+        """
+        if trail.total < self._trail_seen:  # the trail was cleared
+            self._trail_seen = 0
+        start = max(self._trail_seen - 1, trail.first)
+        samples = trail.since(start)
+        if len(samples) > 1:
+            self.add(samples[:-1, 0], samples[:-1, 1], np.diff(samples[:, 2]), 'time')
+        self._trail_seen = trail.total
+
+    def normalized(self, layer='time'):
+        """
+        :return: the layer scaled to [0, 1] by its largest cell
+        """
+        values = self.layers[layer]
+        peak = values.max()
+        return values / peak if peak > 0 else np.zeros(self.shape)
+
+    def clear(self):
+        for values in self.layers.values():
+            values.fill(0)
+        self._trail_seen = 0
+        self.version += 1
+
+    def save(self, path):
+        """
+        Save the layers, e.g. at the end of a match, to a .npz file.
+        """
+        np.savez_compressed(path, cell_size=self.cell_size, size=(self.width, self.length),
+                            **{'layer_' + name: values for name, values in self.layers.items()})
+
+    @classmethod
+    def load(cls, path):
+        """
+        :return: a Heatmap saved by save
+        """
+        with np.load(path) as data:
+            width, length = data['size']
+            heatmap = cls(width, length, float(data['cell_size']))
+            for name in data.files:
+                if name.startswith('layer_'):
+                    heatmap.layers[name[len('layer_'):]] = data[name]
+        return heatmap
+
+
+__all__ = ['Heatmap']
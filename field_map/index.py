@@ -0,0 +1,151 @@
+import math
+from collections import defaultdict
+
+
+class GridIndex:
+    """
+    Uniform grid over bounding boxes. Every key is stored in each cell its box overlaps, so inserting,
+    moving and removing a key only touches those cells and a query only looks at the cells it covers.
+    Results are candidates: their boxes overlap, their shapes still have to be checked.
+    """
+
+    def __init__(self, cell_size):
+        assert cell_size > 0, 'The cell size must be positive'
+        self.cell_size = cell_size
+        self._cells = defaultdict(set)
+        self._bounds = {}  # key -> (minx, miny, maxx, maxy)
+        self._cell_ranges = {}  # key -> (i0, j0, i1, j1), the cells the key is stored in
+
+    def __len__(self):
+        return len(self._bounds)
+
+    def __contains__(self, key):
+        return key in self._bounds
+
+    def _cell_range(self, bounds):
+        minx, miny, maxx, maxy = bounds
+        size = self.cell_size
+        return math.floor(minx / size), math.floor(miny / size), math.floor(maxx / size), math.floor(maxy / size)
+
+    def insert(self, key, bounds):
+        """
+        :param bounds: (minx, miny, maxx, maxy), as given by shapely's bounds
+        """
+        if key in self._bounds:
+            self.remove(key)
+        cell_range = self._cell_range(bounds)
+        i0, j0, i1, j1 = cell_range
+        cells = self._cells
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                cells[i, j].add(key)
+        self._bounds[key] = tuple(bounds)
+        self._cell_ranges[key] = cell_range
+
+    def insert_many(self, keys, bounds, cell_ranges=None):
+        """
+        Insert many keys at once, e.g. from a saved index.
+        :param bounds: (k, 4) array-like of the bounds of each key
+        :param cell_ranges: optional. (k, 4) array-like of (i0, j0, i1, j1) for each key, the cells to store it in,
+            as computed for this cell size. Computed from bounds if not given.
+        """
+        bounds = bounds.tolist() if hasattr(bounds, 'tolist') else bounds
+        if cell_ranges is None:
+            cell_ranges = [self._cell_range(box) for box in bounds]
+        elif hasattr(cell_ranges, 'tolist'):
+            cell_ranges = cell_ranges.tolist()
+        cells = self._cells
+        for key, box, cell_range in zip(keys, bounds, cell_ranges):
+            if key in self._bounds:
+                self.remove(key)
+            i0, j0, i1, j1 = cell_range
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    cells[i, j].add(key)
+            self._bounds[key] = tuple(box)
+            self._cell_ranges[key] = tuple(cell_range)
+
+    def update(self, key, bounds):
+        if self._cell_ranges.get(key) == self._cell_range(bounds):
+            self._bounds[key] = tuple(bounds)  # it moved within the same cells
+        else:
+            self.insert(key, bounds)
+
+    def remove(self, key):
+        del self._bounds[key]
+        i0, j0, i1, j1 = self._cell_ranges.pop(key)
+        cells = self._cells
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                cell = cells[i, j]
+                cell.discard(key)
+                if not cell:
+                    del cells[i, j]
+
+    def clear(self):
+        self._cells.clear()
+        self._bounds.clear()
+        self._cell_ranges.clear()
+
+    def bounds(self, key):
+        return self._bounds[key]
+
+    def query(self, bounds):
+        """
+        :return: set of keys whose bounding box overlaps bounds
+        """
+        minx, miny, maxx, maxy = bounds
+        i0, j0, i1, j1 = self._cell_range(bounds)
+        found = set()
+        cells = self._cells
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(cells):
+            # The area is bigger than the occupied part of the grid, so walk the occupied cells instead
+            candidates = set().union(*cells.values())
+        else:
+            candidates = set()
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    cell = cells.get((i, j))
+                    if cell:
+                        candidates |= cell
+        for key in candidates:
+            kminx, kminy, kmaxx, kmaxy = self._bounds[key]
+            if kminx <= maxx and minx <= kmaxx and kminy <= maxy and miny <= kmaxy:
+                found.add(key)
+        return found
+
+    def rings(self, bounds):
+        """
+        Walk the grid outwards from bounds, one ring of cells at a time.
+
+        :return: iterator over (keys, distance): the keys first seen in the ring, and a lower bound on the
+            distance from bounds to anything in a later ring
+        """
+        if not self._bounds:
+            return
+        i0, j0, i1, j1 = self._cell_range(bounds)
+        occupied = list(self._cells)
+        lo_i = min(i for i, _ in occupied)
+        hi_i = max(i for i, _ in occupied)
+        lo_j = min(j for _, j in occupied)
+        hi_j = max(j for _, j in occupied)
+        seen = set()
+        cells = self._cells
+        ring = 0
+        while True:
+            keys = []
+            for i in range(i0 - ring, i1 + ring + 1):
+                edge = i in (i0 - ring, i1 + ring)
+                for j in (range(j0 - ring, j1 + ring + 1) if edge else (j0 - ring, j1 + ring)):
+                    for key in cells.get((i, j), ()):
+                        if key not in seen:
+                            seen.add(key)
+                            keys.append(key)
+            # anything outside the rings walked so far is at least a whole ring of cells away
+            yield keys, ring * self.cell_size
+            if i0 - ring <= lo_i and i1 + ring >= hi_i and j0 - ring <= lo_j and j1 + ring >= hi_j:
+                return
+            ring += 1
+
+
+__all__ = ['GridIndex']
@@ -0,0 +1,178 @@
+"""
+Field layouts on disk: the structures of a season's field, with their spatial index and raster precomputed, in one
+file that loads without parsing.
+
+    python -m field_map.layout FILE                       describe a layout
+    python -m field_map.layout FILE --scenario 'deep space'  write a benchmark scenario as a layout
+
+A layout file is
+
+    8 bytes     magic, b'FMAPLAYT'
+    uint32      format version
+    uint32      header length
+    header      JSON: the map's scale and size, the names of the structures, the spatial index cell size, the
+                raster resolution, and for every array its dtype, shape and offset in the file
+    arrays      each starting on an 8 byte boundary, little endian:
+                vertices     float64 (n, 2), the vertices of all the structures one after the other
+                offsets      int64 (k + 1,), structure i is vertices[offsets[i]:offsets[i + 1]]
+                bounds       float64 (k, 4), (minx, miny, maxx, maxy) of each structure
+                cell_ranges  int64 (k, 4), the spatial index cells each structure is stored in
+                raster       uint16 (rows, cols), how many structures cover each grid cell, see OccupancyGrid
+
+Loading maps the file and makes arrays straight out of it, so only the JSON header is parsed.
+"""
+import argparse
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from field_map.grid import OccupancyGrid
+from field_map.index import GridIndex
+
+MAGIC = b'FMAPLAYT'
+VERSION = 1
+_PREAMBLE = struct.Struct('<8sII')  # magic, version, header length
+ARRAYS = ('vertices', 'offsets', 'bounds', 'cell_ranges', 'raster')
+
+
+class LayoutError(ValueError):
+    pass
+
+
+class Layout:
+    """
+    A field layout loaded from a file. The arrays are read-only views of the mapped file.
+    """
+
+    def __init__(self, header, arrays, path=None):
+        self.path = path
+        self.version = header['version']
+        self.scale = header['scale']
+        self.width = header['width']
+        self.length = header['length']
+        self.names = header['names']
+        self.cell_size = header['cell_size']
+        self.resolution = header['resolution']
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.names)
+
+    def points(self, i):
+        """
+        :return: (k, 2) array of the vertices of structure i
+        """
+        return self.vertices[self.offsets[i]:self.offsets[i + 1]]
+
+    def __repr__(self):
+        return '<Layout %s, %d structures, %d vertices>' % (self.path, len(self), len(self.vertices))
+
+
+def load_layout(path):
+    """
+    :raise LayoutError: if the file is not a layout, or of a format version this does not read
+    :return: a Layout
+    """
+    with open(path, 'rb') as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # an empty file cannot be mapped
+            raise LayoutError('%s is not a field layout' % path)
+    if len(buffer) < _PREAMBLE.size:
+        raise LayoutError('%s is not a field layout' % path)
+    magic, version, header_length = _PREAMBLE.unpack_from(buffer)
+    if magic != MAGIC:
+        raise LayoutError('%s is not a field layout' % path)
+    if version != VERSION:
+        raise LayoutError('%s has layout format version %d, only version %d can be read' % (path, version, VERSION))
+    header = json.loads(bytes(buffer[_PREAMBLE.size:_PREAMBLE.size + header_length]).decode('utf-8'))
+    arrays = {}
+    for name in ARRAYS:
+        dtype, shape, offset = header['arrays'][name]
+        count = int(np.prod(shape))
+        if offset + count * np.dtype(dtype).itemsize > len(buffer):
+            raise LayoutError('%s is truncated' % path)
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+    header['version'] = version
+    return Layout(header, arrays, path)
+
+
+def save_layout(field_map, path, resolution=None):
+    """
+    Write the structures of a field map to a layout file.
+    :param resolution: optional. Resolution of the raster in map units, defaults to an inch. Maps loading the layout
+        get their occupancy grid of that resolution without rasterizing.
+    """
+    from field_map.map import FieldStructure
+
+    if resolution is None:
+        resolution = field_map.scale
+    structures = [(key, obj) for key, obj in field_map._objects.items() if isinstance(obj, FieldStructure)]
+    names = [key if isinstance(key, str) else 'structure %d' % i for i, (key, _) in enumerate(structures)]
+    if len(set(names)) != len(names):
+        raise ValueError('Structure names must be unique')
+    rings = [np.asarray(obj.points, dtype=np.float64).reshape(-1, 2) for _, obj in structures]
+    index = GridIndex(field_map._index.cell_size)
+    grid = OccupancyGrid(field_map.width, field_map.length, resolution)
+    grid.add_static({name: obj.points for name, (_, obj) in zip(names, structures)}, cache_dir=None)
+    arrays = {
+        'vertices': np.concatenate(rings) if rings else np.zeros((0, 2)),
+        'offsets': np.cumsum([0] + [len(ring) for ring in rings], dtype=np.int64),
+        'bounds': np.array([obj.bounds for _, obj in structures], dtype=np.float64).reshape(-1, 4),
+        'cell_ranges': np.array([index._cell_range(obj.bounds) for _, obj in structures],
+                                dtype=np.int64).reshape(-1, 4),
+        'raster': grid.counts,
+    }
+    header = {'scale': field_map.scale, 'width': field_map.width, 'length': field_map.length, 'names': names,
+              'cell_size': index.cell_size, 'resolution': resolution, 'arrays': {}}
+
+    # The offsets depend on the header's length, which depends on the offsets, so lay out the arrays after a header
+    # with room to spare: a header with offsets of the final width is no longer than one with 20 digit offsets.
+    for name in ARRAYS:
+        header['arrays'][name] = [arrays[name].dtype.newbyteorder('<').str, arrays[name].shape, 10 ** 19]
+    offset = _align(_PREAMBLE.size + len(json.dumps(header).encode('utf-8')))
+    for name in ARRAYS:
+        header['arrays'][name][2] = offset
+        offset = _align(offset + arrays[name].nbytes)
+    encoded = json.dumps(header).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        for name in ARRAYS:
+            f.write(b'\0' * (header['arrays'][name][2] - f.tell()))
+            f.write(np.ascontiguousarray(arrays[name], dtype=header['arrays'][name][0]).tobytes())
+
+
+def _align(offset):
+    return (offset + 7) // 8 * 8
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Describe or write a field layout file')
+    parser.add_argument('path')
+    parser.add_argument('--scenario', help='write this benchmark scenario to path')
+    args = parser.parse_args()
+
+    if args.scenario is not None:
+        from field_map.benchmark import SCENARIOS
+        from field_map.map import FieldMap
+
+        field_map = FieldMap()
+        SCENARIOS[args.scenario](field_map)
+        save_layout(field_map, args.path)
+    layout = load_layout(args.path)
+    print('%s: format version %d, %g by %g map units at %g per inch' % (args.path, layout.version, layout.length,
+                                                                        layout.width, layout.scale))
+    for i, name in enumerate(layout.names):
+        print('  %-20s %3d vertices' % (name, len(layout.points(i))))
+
+
+__all__ = ['Layout', 'LayoutError', 'load_layout', 'save_layout']
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,15 @@
 from field_map.abc import BaseMap, Polygon, BaseRobot
 import time
 
+import numpy as np
+from shapely.ops import unary_union
+from shapely.prepared import prep
+
+from field_map.collision import Obstacles, check_poses
+from field_map.distance import DistanceField
+from field_map.grid import CACHE_DIR, OccupancyGrid
+from field_map.layout import load_layout
+
 
 class FieldObject(Polygon):
     def __init__(self, *points, expires_in=5):
@@ -11,19 +20,20 @@ class FieldObject(Polygon):
         super().__init__(*points)
         self.expires_at = time.time() + expires_in
     
-    def __getattribute__(self, attr): # is this really necessary?
-        if attr not in ('is_expired','expires_at','_expires_in'):
-            self.expires_at = time.time() + super().__getattribute__('_expires_in') # poke the expiration time
-        return super().__getattribute__(attr)
+    def observe(self, now=None):
+        """
+        Mark the object as seen again, pushing its expiration back.
+        :param now: optional. The time it was seen, defaults to now.
+        """
+        self.expires_at = (time.time() if now is None else now) + self._expires_in
     
     @property
     def is_expired(self):
-        print(self.expires_at)
-        return time.time()>self.expires_at
+        return time.time() > self.expires_at
 
 class FieldStructure(Polygon):
-    def __init__(self, *points):
-        super().__init__(*points)
+    def __init__(self, *points, vertices=None, bounds=None):
+        super().__init__(*points, vertices=vertices, bounds=bounds)
 
 
 class FieldMap(BaseMap):
@@ -31,12 +41,179 @@ class FieldMap(BaseMap):
     A field map is just a 2d coordinate system. The origin is at bottom-left. The map contains no negative coordinate
     """
     
-    def __init__(self, scale=1):
+    def __init__(self, scale=None, layout=None):
+        """
+        :param scale: optional. Scale of the map, in units per inch. Defaults to 1, or the layout's.
+        :param layout: optional. Path of a field layout file, or a Layout, to take the field's size and structures
+            from. See field_map.layout.
+        """
+        if isinstance(layout, str):
+            layout = load_layout(layout)
+        if layout is not None:
+            if scale is not None and scale != layout.scale:
+                raise ValueError('The layout is at scale %g, not %g' % (layout.scale, scale))
+            scale = layout.scale
+            super().__init__(layout.width, layout.length, layout.cell_size)
+        else:
+            scale = 1 if scale is None else scale
+            super().__init__(scale * 27 * 12, scale * 54 * 12)
+            # the field is 27 by 54 feet
+        self.scale = scale
+        self._grids = {}  # resolution -> OccupancyGrid kept up to date with the map
+        self._distance_fields = {}  # (resolution, max_distance) -> DistanceField
+        self.version = 0  # counts changes to the objects, so views can tell when to redraw
+        self.static_version = 0  # counts changes to the field structures only
+        self._prepared = {}  # key -> prepared geometry of a FieldStructure, built when first tested
+        self._static = None  # (union, prepared union) of all the FieldStructures, None until needed
+        self._vertices = {}  # key -> vertex array of a FieldStructure, for check_poses
+        self._rasters = {}  # resolution -> raster of the structures from the layout, for occupancy
+        if layout is not None:
+            self._load_layout(layout)
+    
+    def _load_layout(self, layout):
+        """
+        Add the structures of a layout, using its index and raster instead of computing them. The structures are
+        made straight from the mapped vertex arrays and bounds, and only turn their vertices into Python pairs when
+        something reads their points.
+        """
+        for i, name in enumerate(layout.names):
+            vertices = layout.points(i)
+            self._objects[name] = FieldStructure(vertices=vertices, bounds=layout.bounds[i].tolist())
+            self._vertices[name] = vertices
+        self._index.insert_many(layout.names, layout.bounds, layout.cell_ranges)
+        self._rasters[layout.resolution] = layout.raster
+        self.version += 1
+        self.static_version += 1
+    
+    def _object_added(self, key, obj):
+        self.version += 1
+        if isinstance(obj, FieldStructure):
+            self._static = None
+            self._rasters.clear()
+            self.static_version += 1
+        if not isinstance(obj, BaseRobot):
+            for grid in self._grids.values():
+                grid.add(key, obj.points)
+    
+    def _object_removed(self, key, obj):
+        self.version += 1
+        if isinstance(obj, FieldStructure):
+            self._prepared.pop(key, None)
+            self._vertices.pop(key, None)
+            self._static = None
+            self._rasters.clear()
+            self.static_version += 1
+        if not isinstance(obj, BaseRobot):
+            for grid in self._grids.values():
+                grid.remove(key, obj.points)
+    
+    def occupancy(self, resolution=None, cache_dir=CACHE_DIR):
+        """
+        Get an occupancy grid of the map. It is built the first time and from then on updated as objects are added,
+        removed and expire, one object at a time.
+        :param resolution: optional. Size of a cell in map units, defaults to an inch.
+        :param cache_dir: where the raster of the field structures is cached between runs, by default next to this
+            package. None to not cache.
+        :return: an OccupancyGrid
+        """
+        if resolution is None:
+            resolution = self.scale
+        grid = self._grids.get(resolution)
+        if grid is None:
+            grid = OccupancyGrid(self.width, self.length, resolution)
+            grid.add_static({key: obj.points for key, obj in self._objects.items() if isinstance(obj, FieldStructure)},
+                            cache_dir, self._rasters.get(resolution))
+            for key, obj in self._objects.items():
+                if not isinstance(obj, (FieldStructure, BaseRobot)) and not obj.is_expired:
+                    grid.add(key, obj.points)
+            self._grids[resolution] = grid
+        return grid
+    
+    def distance_field(self, resolution=None, max_distance=None):
+        """
+        Get a signed distance field of the map: how far each point is from the nearest obstacle or field edge,
+        negative inside obstacles. It follows changes to the map, recomputing only around what changed.
+        :param resolution: optional. Size of a cell in map units, defaults to an inch.
+        :param max_distance: optional. Distances are exact up to this, in map units, defaults to 5 feet.
+        :return: a DistanceField
+        """
+        if resolution is None:
+            resolution = self.scale
+        if max_distance is None:
+            max_distance = self.scale * 5 * 12
+        field = self._distance_fields.get((resolution, max_distance))
+        if field is None:
+            field = self._distance_fields[resolution, max_distance] = DistanceField(self.occupancy(resolution),
+                                                                                    max_distance)
+        return field
+    
+    def _geometry(self, key, obj):
+        if not isinstance(obj, FieldStructure):
+            return obj
+        prepared = self._prepared.get(key)
+        if prepared is None:
+            prepared = self._prepared[key] = prep(obj)
+        return prepared
+    
+    @property
+    def structures(self):
+        """
+        :return: the union of all field structures, as one geometry. Cached until a structure is added or removed.
+        """
+        return self._static_union()[0]
+    
+    def _static_union(self):
+        if self._static is None:
+            union = unary_union([obj for obj in self if isinstance(obj, FieldStructure)])
+            self._static = union, prep(union)
+        return self._static
+    
+    def intersects_structure(self, other):
+        """
+        :return: True if other touches any field structure. Faster than intersect when only the fixed field matters.
+        """
+        other = other.polygon if isinstance(other, BaseRobot) else other
+        return self._static_union()[1].intersects(other)
+    
+    def inside_structure(self, other):
+        """
+        :return: True if other lies entirely within the field structures
+        """
+        other = other.polygon if isinstance(other, BaseRobot) else other
+        return self._static_union()[1].contains(other)
+    
+    def check_poses(self, x, y, heading, robot, max_clearance=None):
         """
-        :param scale: scale of the map, in units per inch
+        Check many candidate robot poses at once.
+        :param x, y, heading: arrays of poses. heading in radians, counterclockwise from the x axis.
+        :param robot: the BaseRobot whose footprint to check. It is centered on each pose, its length along the heading.
+        :param max_clearance: optional. Only obstacles this close to the poses are considered, which is much faster
+            when the poses are near each other. Clearances are then capped at max_clearance.
+        :return: (collides, clearance): a boolean array, True where the robot would hit something or leave the field,
+            and the distance from each pose's footprint to the nearest obstacle or field edge, 0 where it collides.
         """
-        super().__init__(scale * 27 * 12, scale * 54 * 12)
-        # the field is 27 by 54 feet
+        x, y, heading = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64) for a in (x, y, heading)))
+        if max_clearance is None:
+            keys = list(self._objects)
+        else:
+            reach = np.hypot(robot.length, robot.width) / 2 + max_clearance
+            keys = self._index.query((x.min() - reach, y.min() - reach, x.max() + reach, y.max() + reach))
+        rings = []
+        for key in keys:
+            obj = self._objects[key]
+            if isinstance(obj, BaseRobot) or obj.is_expired:
+                continue  # the robot itself, not an obstacle
+            vertices = self._vertices.get(key)
+            if vertices is None:
+                vertices = np.array(obj.points, dtype=np.float64)
+                if isinstance(obj, FieldStructure):
+                    self._vertices[key] = vertices
+            rings.append(vertices)
+        collides, clearance = check_poses(x, y, heading, robot.length, robot.width, Obstacles(rings),
+                                          (self.length, self.width))
+        if max_clearance is not None:
+            np.minimum(clearance, max_clearance, out=clearance)
+        return collides.reshape(x.shape), clearance.reshape(x.shape)
     
     def __repr__(self):
         return '<Map instance>'
@@ -0,0 +1,461 @@
+import heapq
+import math
+import time
+
+import numpy as np
+
+SQRT2 = math.sqrt(2)
+NEIGHBORS = ((0, 1, 1), (1, 0, 1), (0, -1, 1), (-1, 0, 1),
+             (1, 1, SQRT2), (1, -1, SQRT2), (-1, 1, SQRT2), (-1, -1, SQRT2))  # (drow, dcol, length in steps)
+
+
+class Plan:
+    """
+    A path found by a Planner.
+    """
+
+    def __init__(self, path, complete, elapsed, method, reused=False):
+        """
+        :param path: (k, 2) array of waypoints from the start, in map units
+        :param complete: whether the path reaches the goal. If the budget ran out first, the path leads as close to
+            the goal as the planner got.
+        :param elapsed: planning time, in seconds
+        :param reused: whether the previous plan was reused, possibly with a repaired section
+        """
+        self.path = path
+        self.complete = complete
+        self.elapsed = elapsed
+        self.method = method
+        self.reused = reused
+
+    @property
+    def length(self):
+        return float(np.hypot(*np.diff(self.path, axis=0).T).sum()) if len(self.path) > 1 else 0.
+
+    def __repr__(self):
+        return '<Plan %s %d waypoints, %.1f long, %s, %.1f ms%s>' % (
+            self.method, len(self.path), self.length, 'complete' if self.complete else 'partial', self.elapsed * 1000,
+            ', reused' if self.reused else '')
+
+
+class Planner:
+    """
+    Plans paths for a robot across a FieldMap, within a time budget.
+
+    The robot is treated as a disk around its footprint, and a point is free when the map's distance field puts it
+    at least that radius away from every obstacle and field edge. Obstacle changes reach the planner through the
+    distance field, so it never needs to be rebuilt. Bringing the field up to date counts against the planning budget:
+    what is left of it when the budget runs out is finished by the next plan, and the plan is made on the field as it
+    is, with the cells not yet recomputed as they were before the change.
+    """
+    SHORTCUT_SHARE = 0.2  # of the budget kept for straightening the path found
+    FALLBACK_SHARE = 0.3  # of the budget RRT* leaves for A*, should it not reach the goal
+
+    def __init__(self, field_map, robot, step=None, margin=0):
+        """
+        :param field_map: a FieldMap
+        :param robot: the BaseRobot to plan for
+        :param step: optional. Spacing of the A* lattice, and a sixteenth of the longest RRT* edge, in map units.
+            Defaults to 6 inches.
+        :param margin: extra clearance to keep from obstacles, in map units
+        """
+        self.map = field_map
+        self.step = step if step is not None else 6 * field_map.scale
+        self.radius = math.hypot(robot.length, robot.width) / 2 + margin
+        self.distance = field_map.distance_field(max_distance=max(5 * 12 * field_map.scale, 2 * self.radius))
+        self.shape = (int(field_map.width // self.step), int(field_map.length // self.step))
+        self.last = None  # (goal, Plan) of the previous complete plan
+        self._lattice_cache = None  # (distance field version, lattice)
+        self._lattice_arrays = None  # (free, middles) as arrays, to update the lattice in place
+        self._planning = False  # while planning, the distance field is only updated at the start, within the budget
+
+    # Geometry
+
+    def _point(self, row, col):
+        return (col + 0.5) * self.step, (row + 0.5) * self.step
+
+    def _node(self, point):
+        rows, cols = self.shape
+        return (min(max(int(point[1] // self.step), 0), rows - 1),
+                min(max(int(point[0] // self.step), 0), cols - 1))
+
+    def _distance(self, x, y):
+        return self.distance.distance(x, y, update=not self._planning)
+
+    def is_free(self, x, y):
+        """
+        :return: boolean array, whether the robot fits at each point
+        """
+        return self._distance(x, y) >= self.radius
+
+    def segments_free(self, starts, ends):
+        """
+        :param starts, ends: (k, 2) arrays of segment end points
+        :return: boolean array, whether the robot can travel along each segment
+        """
+        starts, ends = np.asarray(starts, dtype=np.float64), np.asarray(ends, dtype=np.float64)
+        free = np.zeros(len(starts), dtype=bool)
+        # Distance changes at most as fast as position, so samples spacing apart also clear everything between them
+        # when they clear the radius by half the spacing. Samples a few steps apart settle the segments well away
+        # from obstacles, and those through one, and only the rest are sampled half a step apart, which keeps the
+        # extra margin small.
+        unsure = np.arange(len(starts))
+        for spacing in (self.step * 4, self.step / 2):
+            if not len(unsure):
+                break
+            closest, slack = self._closest(starts[unsure], ends[unsure], spacing)
+            clear = closest >= self.radius + slack
+            free[unsure[clear]] = True
+            unsure = unsure[~clear & (closest >= self.radius)]
+        return free
+
+    def _closest(self, starts, ends, spacing):
+        """
+        :return: (closest, slack): the least distance to an obstacle sampled along each segment, and half the
+            spacing of its samples, which is at most spacing / 2
+        """
+        lengths = np.hypot(*(ends - starts).T)
+        counts = np.maximum(np.ceil(lengths / spacing), 1)  # intervals per segment, so each is sampled the same way
+        t = np.minimum(np.arange(int(counts.max()) + 1)[:, None] / counts, 1)[..., None]  # (samples, k, 1)
+        points = starts + t * (ends - starts)  # (samples, k, 2)
+        return self._distance(points[..., 0], points[..., 1]).min(axis=0), lengths / counts / 2
+
+    def path_free(self, path):
+        return bool(self.segments_free(path[:-1], path[1:]).all())
+
+    # Planning
+
+    def plan(self, start, goal, budget=0.02, method='astar'):
+        """
+        Find a path from start to goal.
+
+        If the previous plan led to the same goal and is still clear, it is reused from the waypoint nearest start.
+        If obstacles have moved onto it, only the blocked section is planned again.
+
+        :param start, goal: (x, y) in map units
+        :param budget: seconds the planner may take. The best path found so far is returned when it runs out.
+        :param method: 'astar' for A* over a lattice, 'rrt*' for a sampling planner that falls back to A* if it has
+            not reached the goal in time. The Plan's method says which found the path.
+        :return: a Plan
+        """
+        started = time.perf_counter()
+        deadline = started + budget
+        reserve = budget * self.SHORTCUT_SHARE
+        start, goal = np.asarray(start, dtype=np.float64), np.asarray(goal, dtype=np.float64)
+        self._planning = True
+        try:
+            current = self.distance.update(deadline - reserve)
+            if self.last is not None and np.allclose(self.last[0], goal):
+                plan = self._reuse(start, self.last[1], deadline, reserve, method)
+                if plan is not None:
+                    plan.elapsed = time.perf_counter() - started
+                    self.last = (goal, plan) if current else None
+                    return plan
+            path, complete, method = self._search(start, goal, deadline, reserve, method)
+        finally:
+            self._planning = False
+        plan = Plan(path, complete, time.perf_counter() - started, method)
+        self.last = (goal, plan) if complete and current else None
+        return plan
+
+    def _search(self, start, goal, deadline, reserve, method):
+        """
+        Search until reserve seconds before the deadline, and straighten the path found in the rest of the time.
+        RRT* leaves part of the search time to A* over the lattice, which takes over if RRT* has not reached the
+        goal, as in cluttered fields where the way through is a narrow passage that sampling rarely finds.
+        :return: (path, complete, method), method being the planner that found the path
+        """
+        if method == 'astar':
+            path, complete = self.astar(start, goal, deadline - reserve)
+        elif method == 'rrt*':
+            fallback = (deadline - time.perf_counter()) * self.FALLBACK_SHARE
+            path, complete = self.rrt_star(start, goal, deadline - reserve - fallback)
+            if not complete:
+                # Inflating the heuristic keeps A* within what is left, shortcut takes out most of the extra length
+                path, complete = self.astar(start, goal, deadline - reserve, weight=2)
+                method = 'astar'
+        else:
+            raise ValueError('Unknown planning method %r' % method)
+        return self.shortcut(path, deadline), complete, method
+
+    def _reuse(self, start, previous, deadline, reserve, method):
+        path = previous.path
+        nearest = int(np.argmin(np.hypot(*(path - start).T)))
+        if nearest + 1 < len(path) and self.segments_free([start], [path[nearest + 1]])[0]:
+            nearest += 1  # already past the nearest waypoint
+        path = np.vstack((start, path[nearest:]))
+        free = self.segments_free(path[:-1], path[1:])
+        if free.all():
+            return Plan(path, True, 0, previous.method, reused=True)
+        # Replan from the waypoint before the first blocked segment to the first clear waypoint after the last one
+        blocked = np.flatnonzero(~free)
+        first, last = blocked[0], blocked[-1] + 1
+        while last < len(path) - 1 and not self.is_free(*path[last]):
+            last += 1
+        detour, complete, method = self._search(path[first], path[last], deadline, reserve, method)
+        if not complete:
+            return None
+        return Plan(np.vstack((path[:first], detour, path[last + 1:])), True, 0, method, reused=True)
+
+    def shortcut(self, path, deadline):
+        """
+        Straighten a path by skipping every waypoint that the robot can go past in a straight line.
+        """
+        if len(path) < 3:
+            return path
+        kept = [0]
+        i = 0
+        while i < len(path) - 1 and time.perf_counter() < deadline:
+            # the furthest waypoint reachable from waypoint i, testing all candidates at once
+            reachable = np.flatnonzero(self.segments_free(np.repeat(path[i:i + 1], len(path) - i - 1, axis=0),
+                                                          path[i + 1:]))
+            furthest = i + 1 + (reachable[-1] if len(reachable) else 0)
+            kept.append(furthest)
+            i = furthest
+        if i < len(path) - 1:
+            kept.extend(range(i + 1, len(path)))  # out of time, keep the rest as it is
+        return path[kept]
+
+    def astar(self, start, goal, deadline, weight=1):
+        """
+        A* over an 8-connected lattice of free points step apart. The start and goal connect to the lattice points
+        around them that the robot can go straight to.
+
+        :param weight: inflates the heuristic. Above 1, fewer nodes are expanded, for a path up to weight times longer.
+        :return: (path, complete). If the deadline passes first, the path leads to the point nearest the goal found.
+        """
+        rows, cols = self.shape
+        width = cols + 2
+        free, moves = self._lattice()
+        sources = self._connectors(start)
+        if not sources:  # boxed in, nowhere to go in a straight line
+            return np.array([tuple(start)]), False
+        targets = bytearray(len(free))
+        for node, _ in self._connectors(goal):
+            targets[node] = 1
+        goal_row, goal_col = self._node(goal)
+        row, col = np.mgrid[-1:rows + 1, -1:cols + 1]
+        drow, dcol = np.abs(row - goal_row), np.abs(col - goal_col)
+        heuristic = ((np.maximum(drow, dcol) + (SQRT2 - 1) * np.minimum(drow, dcol)) * weight).ravel().tolist()
+
+        cost = [math.inf] * len(free)
+        parent = [-1] * len(free)
+        closed = bytearray(len(free))
+        queue = []
+        for node, length in sources:
+            cost[node] = length
+            heapq.heappush(queue, (length + heuristic[node], node))
+        best, best_h = sources[0][0], math.inf
+        expanded = 0
+        complete = False
+        while queue:
+            _, node = heapq.heappop(queue)
+            if closed[node]:
+                continue
+            closed[node] = 1
+            if targets[node]:
+                best, complete = node, True
+                break
+            if heuristic[node] < best_h:
+                best, best_h = node, heuristic[node]
+            expanded += 1
+            if expanded % 256 == 0 and time.perf_counter() > deadline:
+                break
+            g = cost[node]
+            for offset, length, edge_free in moves:
+                neighbor = node + offset
+                if not edge_free[node] or closed[neighbor] or not free[neighbor] and not targets[neighbor]:
+                    continue
+                new_cost = g + length
+                if new_cost < cost[neighbor]:
+                    cost[neighbor] = new_cost
+                    parent[neighbor] = node
+                    heapq.heappush(queue, (new_cost + heuristic[neighbor], neighbor))
+
+        points = []
+        while best >= 0:
+            r, c = divmod(best, width)
+            points.append(self._point(r - 1, c - 1))
+            best = parent[best]
+        points.reverse()
+        # the lattice points at either end stay in, shortcut drops them where the robot can go straight
+        return np.array([tuple(start)] + points + ([tuple(goal)] if complete else [])), complete
+
+    def _connectors(self, point):
+        """
+        :return: list of (node, length in steps) of the lattice nodes up to two steps from point's nearest that the
+            robot can go straight to from point, nearest first
+        """
+        rows, cols = self.shape
+        row, col = self._node(point)
+        r, c = np.mgrid[max(row - 2, 0):min(row + 3, rows), max(col - 2, 0):min(col + 3, cols)]
+        r, c = r.ravel(), c.ravel()
+        nodes = np.column_stack(self._point(r, c))
+        clear = self.segments_free(np.repeat(np.asarray(point, dtype=np.float64)[None], len(nodes), axis=0), nodes)
+        lengths = np.hypot(*(nodes - point).T) / self.step
+        order = np.argsort(lengths)
+        return [((r[i] + 1) * (cols + 2) + c[i] + 1, float(lengths[i])) for i in order if clear[i]]
+
+    def _lattice(self):
+        """
+        :return: (free, moves) for astar, over the lattice padded with a ring of blocked nodes so that neighbors
+            never need bounds checks. free says which nodes the robot fits at. moves lists (offset, length, edge_free)
+            for each direction, edge_free saying from which nodes the robot can make that move. Cached until the
+            distance field changes, and then only the nodes around the changes are done again.
+        """
+        version = self.distance.version
+        if self._lattice_cache is not None and self._lattice_cache[0] == version:
+            return self._lattice_cache[1]
+        changes = self.distance.changed_since(self._lattice_cache[0]) if self._lattice_cache is not None else None
+        if changes is None:
+            rows, cols = self.shape
+            free, middles = self._lattice_nodes(slice(0, rows + 2), slice(0, cols + 2))
+            self._lattice_arrays = free, middles
+            lattice = free.ravel().tolist(), [(drow * (cols + 2) + dcol, length, middle.ravel().tolist())
+                                              for (drow, dcol, length), middle in zip(NEIGHBORS, middles)]
+        else:
+            lattice = self._lattice_cache[1]
+            for rows, cols in changes:
+                self._update_lattice(lattice, rows, cols)
+        self._lattice_cache = version, lattice
+        return lattice
+
+    def _lattice_nodes(self, rows, cols):
+        """
+        :param rows, cols: slices of the padded lattice
+        :return: (free, middles) over them: whether the robot fits at each node, and for each of NEIGHBORS whether it
+            can make that move from each node
+        """
+        all_rows, all_cols = self.shape[0] + 2, self.shape[1] + 2
+        row, col = np.mgrid[rows, cols]
+        x, y = self._point(row - 1, col - 1)
+        # Sampling each edge at its ends and middle leaves no point further than a quarter diagonal step from a sample
+        required = self.radius + self.step * SQRT2 / 4
+        inner = (row > 0) & (row < all_rows - 1) & (col > 0) & (col < all_cols - 1)
+        free = (self._distance(x, y) >= required) & inner
+        middles = [(self._distance(x + dcol * self.step / 2, y + drow * self.step / 2) >= required) & inner
+                   for drow, dcol, _ in NEIGHBORS]
+        return free, middles
+
+    def _update_lattice(self, lattice, rows, cols):
+        """
+        Redo the nodes whose samples interpolate between distance field cells in rows, cols.
+        """
+        scale = self.distance.resolution / self.step
+        # a sample interpolates between the cells either side of it, and the samples are up to half a step from a node
+        lo = lambda index: max(int(math.floor((index - 1) * scale - 1)) + 1, 0)
+        hi = lambda index, size: min(int(math.ceil((index + 1) * scale + 1)) + 2, size)
+        all_rows, all_cols = self.shape[0] + 2, self.shape[1] + 2
+        node_rows = slice(lo(rows.start), hi(rows.stop, all_rows))
+        node_cols = slice(lo(cols.start), hi(cols.stop, all_cols))
+        if node_rows.start >= node_rows.stop or node_cols.start >= node_cols.stop:
+            return
+        free, middles = self._lattice_nodes(node_rows, node_cols)
+        free_list, moves = lattice
+        arrays = [(self._lattice_arrays[0], free, free_list)] + [
+            (whole, part, edge_free) for whole, part, (_, _, edge_free) in zip(self._lattice_arrays[1], middles, moves)]
+        for whole, part, values in arrays:
+            whole[node_rows, node_cols] = part
+            for i, r in enumerate(range(node_rows.start, node_rows.stop)):
+                values[r * all_cols + node_cols.start:r * all_cols + node_cols.stop] = part[i].tolist()
+
+    def rrt_star(self, start, goal, deadline, goal_bias=0.1, seed=None, batch=16):
+        """
+        RRT*: grow a tree of free points from start by sampling the field, rewiring it towards shorter paths as it
+        grows. Keeps sampling until the deadline to improve the path.
+
+        Samples are drawn batch at a time, and the nearest tree points to each and the segments from them are checked
+        for the whole batch at once. The samples are then added one by one, each connecting through whichever of its
+        nearest points gives the cheapest path and rewiring the others through itself. New points that are the nearest
+        to the goal yet also try to go straight to it.
+
+        :return: (path, complete). If the goal was not reached, the path leads to the tree point nearest the goal.
+        """
+        rng = np.random.RandomState(seed)
+        capacity = 4096
+        points = np.empty((capacity, 2))
+        parents = np.full(capacity, -1)
+        costs = np.empty(capacity)
+        points[0], costs[0] = start, 0
+        count = 1
+        goal_parent, goal_cost = -1, math.inf
+        closest = float(np.hypot(*(goal - start)))
+        size = np.array((self.map.length, self.map.width), dtype=np.float64)
+        edge = self.step * 16
+        while time.perf_counter() < deadline and count + batch <= capacity:
+            draws = rng.random_sample((batch, 3))
+            samples = np.where(draws[:, :1] < goal_bias, goal, draws[:, 1:] * size)
+            distances = np.hypot(*np.moveaxis(samples[:, None] - points[None, :count], 2, 0))  # (batch, count)
+            nearest = np.argmin(distances, axis=1)
+            furthest = distances[np.arange(batch), nearest]
+            steer = furthest > edge
+            if steer.any():
+                towards = points[nearest[steer]]
+                samples[steer] = towards + (samples[steer] - towards) * (edge / furthest[steer])[:, None]
+                distances[steer] = np.hypot(*np.moveaxis(samples[steer, None] - points[None, :count], 2, 0))
+            # The k nearest points of each free sample, k growing with the log of the tree size as in k-nearest RRT*
+            free = self.is_free(samples[:, 0], samples[:, 1])
+            if not free.any():
+                continue
+            samples, distances = samples[free], distances[free]
+            k = min(count, int(math.ceil(math.e * math.log(count + 1))))
+            if k < count:
+                near = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            else:
+                near = np.broadcast_to(np.arange(count), distances.shape)
+            lengths = np.take_along_axis(distances, near, axis=1)
+            clear = self.segments_free(points[near.ravel()], np.repeat(samples, k, axis=0)).reshape(near.shape)
+            added = []
+            for i in range(len(samples)):
+                around, around_clear, around_lengths = near[i], clear[i], lengths[i]
+                if not around_clear.any():
+                    continue
+                candidates = np.where(around_clear, costs[around] + around_lengths, np.inf)
+                choice = int(np.argmin(candidates))
+                new = count
+                points[new], parents[new], costs[new] = samples[i], around[choice], candidates[choice]
+                count += 1
+                added.append(new)
+                better = around_clear & (costs[new] + around_lengths < costs[around])
+                for other, length in zip(around[better], around_lengths[better]):
+                    parents[other] = new
+                    self._propagate(other, costs[new] + length - costs[other], parents, costs, count)
+            if not added:
+                continue
+            added = np.array(added)
+            to_goal = np.hypot(*(goal - points[added]).T)
+            trying = ((to_goal <= edge) | (to_goal < closest)) & (costs[added] + to_goal < goal_cost)
+            closest = min(closest, float(to_goal.min()))
+            if trying.any():
+                reach = np.where(self.segments_free(points[added[trying]], np.repeat(goal[None], trying.sum(), axis=0)),
+                                 costs[added[trying]] + to_goal[trying], np.inf)
+                if reach.min() < goal_cost:
+                    goal_parent, goal_cost = int(added[trying][np.argmin(reach)]), float(reach.min())
+        if goal_parent >= 0:
+            node, tail, complete = goal_parent, [goal], True
+        else:
+            node, tail, complete = int(np.argmin(np.hypot(*(points[:count] - goal).T))), [], False
+        path = []
+        while node >= 0:
+            path.append(points[node])
+            node = parents[node]
+        path.reverse()
+        return np.array(path + tail), complete
+
+    @staticmethod
+    def _propagate(node, delta, parents, costs, count):
+        """
+        Apply a change of cost to node and everything below it in the tree.
+        """
+        changed = np.zeros(count, dtype=bool)
+        changed[node] = True
+        costs[node] += delta
+        while True:
+            children = np.flatnonzero(~changed & changed[np.maximum(parents[:count], 0)] & (parents[:count] >= 0))
+            if not len(children):
+                return
+            changed[children] = True
+            costs[children] += delta
+
+
+__all__ = ['Plan', 'Planner']
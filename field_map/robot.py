@@ -1,11 +1,95 @@
+import math
+
 from field_map.abc import BaseRobot
 
 class Robot(BaseRobot):
     """
     Represents an actual robot on the field. Communicates with roboRIO via netweorktable
     """
+    __slots__ = ()
 
 class SimulatedRobot(BaseRobot):
     """
-    Represents a simulated robot.
+    Represents a simulated robot: a tank drive, steered by setting the speeds of its left and right wheels.
+
+    Each call to step advances it by a fixed time step. The wheels accelerate towards the speeds set by drive no
+    faster than max_acceleration, and the robot follows the arc they describe. A step that would hit something on
+    the field map, or leave the field, is not taken and stops the wheels, like bumpers would.
     """
+    __slots__ = ('field_map', 'track', 'max_speed', 'max_acceleration', 'left', 'right', 'target',
+                 'collisions', 'collided', 'odometer')
+
+    def __init__(self, width, length, x=None, y=None, heading=math.pi / 2, field_map=None, max_speed=150,
+                 max_acceleration=200, track=None):
+        """
+        :param field_map: optional. The FieldMap to collide with.
+        :param max_speed: of a wheel, in map units per second
+        :param max_acceleration: of a wheel, in map units per second squared
+        :param track: optional. Distance between the left and right wheels, defaults to the width.
+        """
+        super().__init__(width, length, x, y, heading)
+        self.field_map = field_map
+        self.track = width if track is None else track
+        self.max_speed = max_speed
+        self.max_acceleration = max_acceleration
+        self.left = self.right = 0.  # current wheel speeds
+        self.target = (0., 0.)  # wheel speeds set by drive
+        self.collisions = 0
+        self.collided = False  # whether the last step hit something
+        self.odometer = 0.  # distance traveled by the center
+
+    def drive(self, left, right):
+        """
+        Set the wheel speeds to accelerate towards, in map units per second. They are limited to max_speed.
+        """
+        self.target = (min(max(left, -self.max_speed), self.max_speed),
+                       min(max(right, -self.max_speed), self.max_speed))
+
+    def arcade(self, speed, turn):
+        """
+        Drive by forward speed, in map units per second, and turn rate, in radians per second counterclockwise.
+        If a wheel would go faster than max_speed, the speed gives way to the turn.
+        """
+        half = turn * self.track / 2
+        speed = min(max(speed, -self.max_speed + abs(half)), self.max_speed - abs(half))
+        self.drive(speed - half, speed + half)
+
+    @property
+    def velocity(self):
+        """
+        :return: (speed, turn rate) of the robot, in map units per second and radians per second
+        """
+        return (self.left + self.right) / 2, (self.right - self.left) / self.track
+
+    def step(self, dt):
+        """
+        Advance the simulation by dt seconds.
+        :return: whether the robot collided
+        """
+        change = self.max_acceleration * dt
+        self.left += min(max(self.target[0] - self.left, -change), change)
+        self.right += min(max(self.target[1] - self.right, -change), change)
+        speed, turn = self.velocity
+        if not speed and not turn:
+            self.collided = False
+            return False
+
+        x, y, heading = self.pose
+        if abs(turn * dt) < 1e-9:
+            nx, ny = x + speed * dt * math.cos(heading), y + speed * dt * math.sin(heading)
+        else:  # exactly along the arc
+            radius = speed / turn
+            nx = x + radius * (math.sin(heading + turn * dt) - math.sin(heading))
+            ny = y - radius * (math.cos(heading + turn * dt) - math.cos(heading))
+        heading = (heading + turn * dt + math.pi) % (2 * math.pi) - math.pi
+        self.collided = False
+        if self.field_map is not None:
+            collides, _ = self.field_map.check_poses(nx, ny, heading, self, max_clearance=abs(speed) * dt + 1)
+            self.collided = bool(collides)
+        if self.collided:
+            self.collisions += 1
+            self.left = self.right = 0.
+            return True
+        self.odometer += abs(speed) * dt
+        self.set_pose(nx, ny, heading)
+        return False
@@ -0,0 +1,232 @@
+"""
+Runs SimulatedRobots on a FieldMap, headless and as fast as possible, or in step with a clock.
+
+    python -m field_map.simulation --matches 8 --processes 4
+
+simulates matches where the robot drives a planned path across the benchmark scenarios, one process per match,
+and reports how fast they ran compared to real time.
+"""
+import argparse
+import math
+import multiprocessing
+import random
+import time
+
+import numpy as np
+
+from field_map.benchmark import ROBOT_SIZE, SCENARIOS
+from field_map.map import FieldMap
+from field_map.planner import Planner
+from field_map.robot import SimulatedRobot
+
+
+class Simulation:
+    """
+    Steps a SimulatedRobot with a fixed time step, so a run goes the same however fast it is computed.
+
+    A controller, called before every step, decides how the robot drives. run advances as fast as the computer
+    allows, advance keeps in step with a clock such as the dashboard's, catching up with as many steps as have
+    come due.
+    """
+
+    def __init__(self, robot, dt=0.02, controller=None, name=None):
+        """
+        :param robot: a SimulatedRobot
+        :param dt: the time step, in seconds
+        :param controller: optional. Called with the simulation before every step.
+        :param name: optional. If the robot is on its field map under this name, the map is told after every step
+            that it moved.
+        """
+        self.robot = robot
+        self.dt = dt
+        self.controller = controller
+        self.name = name
+        self.time = 0.  # simulated seconds
+        self.steps = 0
+        self._clock = None  # clock time advance last caught up to
+
+    def step(self):
+        """
+        :return: whether the robot collided
+        """
+        if self.controller is not None:
+            self.controller(self)
+        collided = self.robot.step(self.dt)
+        self.steps += 1
+        self.time = self.steps * self.dt  # not summed, so it does not drift
+        if self.name is not None and self.robot.field_map is not None:
+            self.robot.field_map.update_object(self.name, self.robot)
+        return collided
+
+    def run(self, duration, until=None):
+        """
+        Simulate duration seconds headless, as fast as possible.
+        :param until: optional. Called with the simulation after every step, stops the run when it returns True.
+        :return: simulated seconds run
+        """
+        started = self.time
+        for _ in range(int(round(duration / self.dt))):
+            self.step()
+            if until is not None and until(self):
+                break
+        return self.time - started
+
+    def advance(self, now, max_steps=50):
+        """
+        Catch up with a clock: take the steps that have come due since the last call.
+        :param now: clock time, in seconds
+        :param max_steps: steps to take at most, so a stalled clock does not make the next call take long. The
+            simulation then falls behind the clock instead.
+        :return: steps taken
+        """
+        if self._clock is None:
+            self._clock = now
+        due = min(int((now - self._clock) / self.dt), max_steps)
+        for _ in range(due):
+            self.step()
+        self._clock = now if due == max_steps else self._clock + due * self.dt
+        return due
+
+
+class PathFollower:
+    """
+    A controller that plans a path to a goal and follows it: it turns towards a point lookahead further along the
+    path, turning in place when that point is well off to the side. The path is planned again every replan
+    seconds, which mostly reuses the previous plan. After a collision, or when it finds itself closer to an obstacle
+    than the planner allows, it moves straight away from it for back_off seconds and plans again from there.
+    """
+
+    def __init__(self, planner, goal, method='astar', budget=0.02, lookahead=18, replan=0.5, tolerance=6,
+                 back_off=0.3, corner_speed=30):
+        self.planner = planner
+        self.goal = np.asarray(goal, dtype=np.float64)
+        self.method = method
+        self.budget = budget
+        self.lookahead = lookahead
+        self.replan = replan
+        self.tolerance = tolerance
+        self.back_off = back_off
+        self.corner_speed = corner_speed
+        self.escaping_until = None
+        self.path = None
+        self.planned_at = None
+        self.plans = 0
+        self.planning_time = 0.
+
+    def reached(self, simulation):
+        x, y, _ = simulation.robot.pose
+        return math.hypot(x - self.goal[0], y - self.goal[1]) <= self.tolerance
+
+    def __call__(self, simulation):
+        robot = simulation.robot
+        x, y, heading = robot.pose
+        if robot.collided or not self.planner.is_free(x, y):
+            self.escaping_until = simulation.time + self.back_off
+        if self.escaping_until is not None:
+            if simulation.time < self.escaping_until:
+                # Too close to something to turn without hitting it, so move straight away from it, forwards or
+                # backwards, whichever the distance field says is away
+                dx, dy = map(float, self.planner.distance.gradient(x, y))
+                away = dx * math.cos(heading) + dy * math.sin(heading)
+                robot.arcade(math.copysign(robot.max_speed / 3, away), 0)
+                return
+            self.escaping_until = self.path = None
+        if self.path is None or simulation.time - self.planned_at >= self.replan:
+            plan = self.planner.plan((x, y), self.goal, self.budget, self.method)
+            self.path, self.planned_at = plan.path, simulation.time
+            self.plans += 1
+            self.planning_time += plan.elapsed
+        if self.reached(simulation) or len(self.path) < 2:
+            robot.drive(0, 0)
+            return
+
+        # the point lookahead along the path from its nearest point to the robot
+        starts, ends = self.path[:-1], self.path[1:]
+        along = ends - starts
+        lengths = np.maximum(np.hypot(*along.T), 1e-9)
+        t = np.clip(((x - starts[:, 0]) * along[:, 0] + (y - starts[:, 1]) * along[:, 1]) / lengths ** 2, 0, 1)
+        nearest = np.argmin(np.hypot(starts[:, 0] + t * along[:, 0] - x, starts[:, 1] + t * along[:, 1] - y))
+        remaining = self.lookahead + t[nearest] * lengths[nearest]
+        i = nearest
+        while i < len(lengths) - 1 and remaining > lengths[i]:
+            remaining -= lengths[i]
+            i += 1
+        target = starts[i] + along[i] * min(remaining / lengths[i], 1)
+
+        error = (math.atan2(target[1] - y, target[0] - x) - heading + math.pi) % (2 * math.pi) - math.pi
+        # brake in time to take the next waypoint at corner_speed, and to stop at the last
+        corner = ends[nearest]
+        distance = math.hypot(corner[0] - x, corner[1] - y)
+        end_speed = self.corner_speed if nearest < len(lengths) - 1 else 0
+        speed = min(robot.max_speed, math.sqrt(end_speed ** 2 + 2 * robot.max_acceleration * distance))
+        # and in time to stop before getting closer to an obstacle than the planner allows
+        clearance = max(float(self.planner.distance.distance(x, y)) - self.planner.radius, 0)
+        dx, dy = map(float, self.planner.distance.gradient(x, y))
+        approach = -(dx * math.cos(heading) + dy * math.sin(heading))
+        if approach > 0:
+            speed = min(speed, math.sqrt(2 * robot.max_acceleration * clearance) / approach)
+        robot.arcade(speed * math.cos(error) ** 2 if abs(error) < math.pi / 6 else 0, 3 * error)
+
+
+def simulate_match(scenario='deep space', method='astar', budget=0.02, duration=150, dt=0.02, seed=None):
+    """
+    Drive a SimulatedRobot from the start to the goal of one of the benchmark scenarios. The start is moved
+    around a little by seed.
+    :return: dict of results
+    """
+    rng = random.Random(seed)
+    field_map = FieldMap()
+    start, goal = SCENARIOS[scenario](field_map)
+    x, y = start[0] + rng.uniform(-12, 12), start[1] + rng.uniform(-12, 12)
+    robot = SimulatedRobot(*ROBOT_SIZE, x, y, rng.uniform(-math.pi, math.pi), field_map=field_map)
+    follower = PathFollower(Planner(field_map, robot), goal, method, budget)
+    simulation = Simulation(robot, dt, follower)
+    started = time.perf_counter()
+    simulated = simulation.run(duration, until=follower.reached)
+    elapsed = time.perf_counter() - started
+    return {'scenario': scenario, 'method': method, 'seed': seed, 'reached': follower.reached(simulation),
+            'time': simulated, 'distance': robot.odometer, 'collisions': robot.collisions, 'plans': follower.plans,
+            'planning': follower.planning_time, 'elapsed': elapsed, 'speedup': simulated / elapsed}
+
+
+def _simulate(kwargs):
+    return simulate_match(**kwargs)
+
+
+def run_matches(matches, processes=None):
+    """
+    Simulate matches in parallel, one process per match at a time.
+    :param matches: list of dicts of simulate_match arguments
+    :param processes: optional. Defaults to the number of CPUs.
+    :return: list of results, in the order of matches
+    """
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(_simulate, matches, chunksize=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate matches of a robot following planned paths')
+    parser.add_argument('--matches', type=int, default=len(SCENARIOS))
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--method', default='astar', choices=('astar', 'rrt*'))
+    parser.add_argument('--budget', type=float, default=0.02, help='planning time budget, in seconds')
+    args = parser.parse_args()
+
+    scenarios = list(SCENARIOS)
+    matches = [{'scenario': scenarios[i % len(scenarios)], 'method': args.method, 'budget': args.budget, 'seed': i}
+               for i in range(args.matches)]
+    started = time.perf_counter()
+    results = run_matches(matches, args.processes)
+    elapsed = time.perf_counter() - started
+    print('%-12s %4s %8s %9s %10s %6s %8s' % ('scenario', 'seed', 'reached', 'time (s)', 'collisions', 'plans',
+                                              'speedup'))
+    for result in results:
+        print('%-12s %4d %8s %9.1f %10d %6d %7.0fx' % (result['scenario'], result['seed'],
+                                                       'yes' if result['reached'] else 'no', result['time'],
+                                                       result['collisions'], result['plans'], result['speedup']))
+    simulated = sum(result['time'] for result in results)
+    print('simulated %.0f s in %.1f s, %.0fx real time' % (simulated, elapsed, simulated / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import time
+
+import numpy as np
+
+
+class Trail:
+    """
+    Where a robot has been, as a ring buffer of positions. Samples closer than min_distance to the last kept one
+    are not stored, so a robot standing still or crawling costs nothing, and a full match fits without wrapping.
+
+    Every kept sample gets a serial number. Consumers remember the serial they have seen up to and ask for what came
+    after it, which is how the minimap extends its trail path by only the new tail.
+    """
+
+    def __init__(self, capacity=8192, min_distance=1):
+        """
+        :param capacity: samples kept. Once full, the oldest ones are overwritten. The default holds a 150 second
+            match at 50 Hz even without decimation.
+        :param min_distance: in map units. Samples closer than this to the last kept one are dropped.
+        """
+        self.capacity = capacity
+        self.min_distance = min_distance
+        self.samples = np.empty((capacity, 3), dtype=np.float64)  # x, y, time
+        self.total = 0  # serial number of the next sample kept
+        self.head = None  # (x, y) of the latest sample, kept or not
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def first(self):
+        """
+        :return: serial number of the oldest sample still held
+        """
+        return max(self.total - self.capacity, 0)
+
+    def record(self, x, y, t=None):
+        """
+        Add a sample.
+        :return: whether it was kept
+        """
+        self.head = (x, y)
+        if self.total:
+            last_x, last_y, _ = self.samples[(self.total - 1) % self.capacity]
+            if (x - last_x) ** 2 + (y - last_y) ** 2 < self.min_distance ** 2:
+                return False
+        self.samples[self.total % self.capacity] = x, y, time.time() if t is None else t
+        self.total += 1
+        return True
+
+    def since(self, serial):
+        """
+        :param serial: a serial number, e.g. the total seen last time
+        :return: (x, y, time) rows of the samples kept from serial on, oldest first. Samples overwritten since are
+            left out.
+        """
+        start = max(serial, self.first)
+        if start >= self.total:
+            return self.samples[:0]
+        i, j = start % self.capacity, self.total % self.capacity
+        if i < j:
+            return self.samples[i:j]
+        return np.concatenate((self.samples[i:], self.samples[:j]))
+
+    @property
+    def points(self):
+        """
+        :return: (x, y) rows of all the samples held, oldest first
+        """
+        return self.since(0)[:, :2]
+
+    def clear(self):
+        self.total = 0
+        self.head = None
+
+
+__all__ = ['Trail']
@@ -1,4 +1,8 @@
 from .streams import *
+from .log_model import *
+from .log_file import *
 from .minimap import *
 from .camera_feed import *
-
+from .networktables import *
+from .telemetry import *
+from .compass import *
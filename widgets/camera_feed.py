@@ -2,13 +2,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import errno
 import json
+import select
+import selectors
 import socket
 import struct
 import sys
 import threading
 import time
 import os
+import random
 import traceback
 import signal
 import numpy as np
@@ -40,14 +44,23 @@ from PySide2.QtWidgets import (
     QMessageBox
 )
 
+from .telemetry import TelemetrySeries, TelemetryStore
+
 IMAGE_BUFFER_SIZE = 1024
 
 REMOTE_IP_ADDR_SPACE='10.74.7'
-REMOTE_IP_ADDR = '10.74.7.14'
+REMOTE_IP_ADDR = '10.74.7.14'  # replaced by the last known good address from configs.json, if any
+
+DISCOVERY_PORT = 5799
+DISCOVERY_IDENTIFIER = b'7407-vision-server'
+
+PROTOCOL_VERSION = 2
 
 FRAME_START_IDENTIFIER = b'\n_\x92\xc3\x9c>\xbe\xfe\xc1\x98'
 DEBUG = True
 
+STATUS_RETENTION = 180  # seconds of camera status kept for the graphs, a match and then some
+
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
 pg.setConfigOption('background', 'w')
@@ -60,6 +73,14 @@ class Signals(QObject):
     frameResize = Signal(int)
 
 
+class ConnectionSignals(QObject):
+    stateChanged = Signal(str)
+    attemptFailed = Signal(int, float)  # attempt number, seconds until the next attempt
+    addressFound = Signal(str)
+    configApplied = Signal(int, float)  # camera id, apply latency in ms (negative if never acknowledged)
+    linkHealth = Signal(float, float, int)  # round trip time (ms), jitter (ms), consecutive missed heartbeats
+
+
 class SingletonMeta(type):
     def __call__(cls, *args, **kwargs):
         if not hasattr(cls, '_obj'):
@@ -219,11 +240,7 @@ class FeedReceiver(threading.Thread):
                     else:
                         setattr(FrameDropMonitor(), 'cam%d' % self.camera_id, 1)
                 except socket.timeout:
-                    if self.initial_connection_succeeded:
-                        if Configuration().lock.acquire(False):
-                            Configuration().lock.release() # Another thread issued reconnection already
-                        else:
-                            Configuration().reconnect()
+                    pass  # Link loss is detected by the heartbeat in Configuration
                 except:
                     print(traceback.format_exc(), file=sys.stderr)
                     setattr(FrameDropMonitor(), 'cam%d' % self.camera_id, 1)
@@ -285,179 +302,486 @@ class CameraFeed(QWidget):
         self.video_frame.pixmap().save(fn,'JPEG',100)
         
 
+def set_linger(sock):
+    if os.name == 'nt':  # Reset TCP connections instead of waiting for ACK from peer
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('hh', 1, 0))
+    else:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+
+
+def probe_addresses(addresses, port=5800, timeout=0.5):
+    """
+    Attempts a TCP connection to every address at once.
+    :param addresses: the IP addresses to probe
+    :param port: the port to connect to
+    :param timeout: seconds to wait for all of them, in total
+    :return: the addresses that accepted the connection, in the order given
+    """
+    selector = selectors.DefaultSelector()
+    socks = []
+    found = set()
+    try:
+        for address in addresses:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            socks.append(sock)
+            sock.setblocking(False)
+            set_linger(sock)
+            err = sock.connect_ex((address, port))
+            if err == 0:
+                found.add(address)
+            elif err in (errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, 'WSAEWOULDBLOCK', None)):
+                selector.register(sock, selectors.EVENT_WRITE, address)
+        deadline = time.time() + timeout
+        while selector.get_map():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                selector.unregister(key.fileobj)
+                if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    found.add(key.data)
+    finally:
+        selector.close()
+        for sock in socks:
+            sock.close()
+    return [address for address in addresses if address in found]
+
+
+class DiscoveryListener(threading.Thread):
+    """
+    Listens for the UDP beacon broadcast by the vision server and reports the address it came from.
+    The beacon is optional: if the port cannot be bound, the listener quietly stops.
+    """
+
+    def __init__(self, callback):
+        super().__init__(name='DiscoveryListener', daemon=True)
+        self.callback = callback
+
+    def run(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            try:
+                sock.bind(('0.0.0.0', DISCOVERY_PORT))
+            except OSError as e:
+                print('Discovery beacon unavailable: %s' % e)
+                return
+            while True:
+                try:
+                    data, (address, _) = sock.recvfrom(64)
+                except OSError:
+                    return
+                if data.startswith(DISCOVERY_IDENTIFIER):
+                    self.callback(address)
+
+
 class Configuration(metaclass=SingletonMeta):
+    """
+    Owns the TCP control link to the vision server.
+
+    The link is driven by a small state machine on a background thread, so neither the GUI nor the feed
+    receivers ever wait on the network. Failed attempts are retried with exponential backoff and jitter.
+    State changes are posted through ``signals`` and therefore handled on the GUI thread.
+
+    Camera settings use a versioned protocol. Every message is ``|``-terminated JSON of the form
+    ``{"version": 2, "seq": n, "cameras": {"cam0": {"quality": 40}}}`` holding only the keys that changed
+    (the first message on a new link holds all of them). The server answers with
+    ``{"version": 2, "ack": n, "cameras": {...}}`` carrying the settings it actually applied. Only one
+    message is in flight at a time; changes made meanwhile are coalesced into the next one.
+
+    While connected, ``{"version": 2, "ping": n}`` is sent every ``heartbeat_interval`` seconds and the server
+    echoes ``{"version": 2, "pong": n}``. The link is considered lost when no pong is heard for
+    ``heartbeat_deadline`` seconds, counting from the connection, or when ``max_missed_heartbeats`` pings in a row
+    go unanswered. This is the only place reconnects are started from.
+    """
+    DISCONNECTED = 'disconnected'
+    CONNECTING = 'connecting'
+    CONNECTED = 'connected'
+    RECONNECTING = 'reconnecting'
+    CLOSED = 'closed'
+
+    BACKOFF_INITIAL = 0.1  # seconds
+    BACKOFF_FACTOR = 2
+    BACKOFF_MAX = 5
+
+    COALESCE_WINDOW = 0.03  # seconds to wait for more changes before sending
+    ACK_TIMEOUT = 1
+    HEARTBEAT_INTERVAL = 0.05
+    HEARTBEAT_DEADLINE = 0.2
+    MAX_MISSED_HEARTBEATS = 4
+
     def __init__(self, n_camera, camera_panel:CameraPanel):
         self.n_camera = n_camera
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock = None
         self.lock = threading.Lock()
         self.configs = CONFIGURATIONS['cameras']
-        self.sock.bind(('0.0.0.0', 5800))
-        self.sock.settimeout(1)
-        print("TCP socket bound to port 5800")
-        self.is_connected = False
+        self.state = self.DISCONNECTED
         self.camera_panel=camera_panel
         self.continue_scan=False
-    
+        self.scanning = False
+        self.signals = ConnectionSignals()
+        self.applied = {}  # camera settings as acknowledged by the server
+        self._sent = {}
+        self._dirty = set()
+        self._dirty_since = 0
+        self._in_flight = None  # (seq, time sent, cameras)
+        self._seq = 0
+        self.heartbeat_interval = self.HEARTBEAT_INTERVAL
+        self.heartbeat_deadline = self.HEARTBEAT_DEADLINE
+        self.max_missed_heartbeats = self.MAX_MISSED_HEARTBEATS
+        self.rtt = 0  # smoothed, in ms
+        self.jitter = 0
+        self.missed_heartbeats = 0
+        self._pings = {}  # ping number -> time sent
+        self._ping_seq = 0
+        self._last_rtt = None
+        self._last_heard = 0  # when the last pong arrived, or the link was made
+        self._wake = threading.Event()
+        self._waker = socket.socketpair()  # lets other threads interrupt the select in _service
+        self._waker[1].setblocking(False)
+        self._worker = threading.Thread(target=self._run, name='Configuration', daemon=True)
+        self._worker.start()
+        DiscoveryListener(self.useAddress).start()
+        # The cached address is dialed first; make sure it is still right before anyone clicks Connect
+        threading.Thread(target=self._verifyAddress, name='VerifyAddress', daemon=True).start()
+
+    @property
+    def is_connected(self):
+        return self.state == self.CONNECTED
+
     def connect(self):
-        self.lock.acquire()
+        """
+        Start connecting in the background. Returns immediately; watch ``signals.stateChanged`` for the result.
+        """
+        self._transition(self.CONNECTING, self.DISCONNECTED)
+
+    def reconnect(self):
+        """
+        Drop the current link and redial in the background. Safe to call from any thread, any number of times.
+        """
+        self._transition(self.RECONNECTING, self.CONNECTED)
+
+    def _transition(self, state, *sources):
+        with self.lock:
+            if sources and self.state not in sources:
+                return False
+            self.state = state
+            if state != self.CONNECTED and self.sock is not None:
+                self.sock.close()
+                self.sock = None
+        self.signals.stateChanged.emit(state)
+        self._notify()
+        return True
+
+    def _notify(self):
+        self._wake.set()
+        try:
+            self._waker[1].send(b'\0')
+        except OSError:  # the buffer is full, so a wakeup is pending anyway
+            pass
+
+    def _backoff(self, attempt):
+        # the exponent is capped, long past reaching BACKOFF_MAX, so hours of failed attempts do not overflow
+        delay = min(self.BACKOFF_MAX, self.BACKOFF_INITIAL * self.BACKOFF_FACTOR ** min(attempt, 16))
+        return random.uniform(delay / 2, delay)  # jitter spreads out the redials of several dashboards after an outage
+
+    def _run(self):
+        attempt = 0
+        while True:
+            self._wake.clear()
+            state = self.state
+            if state == self.CLOSED:
+                return
+            if state == self.CONNECTED:
+                self._service()
+                continue
+            if state != self.CONNECTING and state != self.RECONNECTING:
+                self._wake.wait()
+                continue
+            if self._dial(state):
+                attempt = 0
+                continue
+            delay = self._backoff(attempt)
+            attempt += 1
+            self.signals.attemptFailed.emit(attempt, delay)
+            self._wake.wait(delay)
+
+    def _dial(self, state):
         print("Connecting to %s:5800..." % REMOTE_IP_ADDR, end='')
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(1)
         try:
-            self.sock.connect((REMOTE_IP_ADDR, 5800))
-            #self.sock.recv(4)
+            sock.bind(('0.0.0.0', 5800))
+            sock.connect((REMOTE_IP_ADDR, 5800))
             t1 = time.time()
-            self.sock.send(struct.pack('dd', t1, time.time()))
-        except (socket.timeout, ConnectionRefusedError, OSError) as e:
-            if e.errno==56: # all three exception types have errno attribute
-                # connection already established
-                print('connected')
-                return True
+            sock.send(struct.pack('dd', t1, time.time()))
+            set_linger(sock)
+        except OSError as e:  # socket.timeout and ConnectionRefusedError are both OSError
             print("failed: %s" % e)
-            self.sock.close() # Reset the socket
-            self.sock=socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.settimeout(1)
-            self.sock.bind(('0.0.0.0', 5800))
-            self.lock.release()
+            sock.close()
             return False
-        else:
-            print("connected")
-        if os.name == 'nt':  # Reset TCP connections instead of waiting for ACK from peer
-            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('hh', 1, 0))
-        else:
-            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
-        self.sock.send(json.dumps(self.configs).encode()+b'|')
-        self.is_connected = True
-        self.lock.release()
+        with self.lock:
+            if self.state != state:  # closed or redirected while we were dialing
+                sock.close()
+                return False
+            self.sock = sock
+            self.state = self.CONNECTED
+            self._last_heard = time.time()  # the heartbeat deadline runs from here until the first pong
+            # The server starts from scratch on every connection, so resend everything
+            self._sent = {}
+            self._dirty = set(self.configs)
+            self._dirty_since = 0
+            self._in_flight = None
+        print("connected")
+        if CONFIGURATIONS.get('remote_address') != REMOTE_IP_ADDR:  # the last known good address, for the next start
+            CONFIGURATIONS['remote_address'] = REMOTE_IP_ADDR
+            save_configurations()
+        self.signals.stateChanged.emit(self.CONNECTED)
         return True
 
-    def reconnect(self):
-        if self.lock.acquire(False):
+    def _service(self):
+        """
+        Runs on the worker thread while connected: sends pending changes and handles the server's replies.
+        """
+        sock = self.sock
+        buffer = b''
+        self._pings.clear()
+        self._last_rtt = None
+        self.missed_heartbeats = 0
+        next_ping = time.time()
+        while sock is not None and self.state == self.CONNECTED:
             try:
-                self.sock.recv(1)
-            except (ConnectionResetError,socket.timeout):
-                self.sock.close()
+                now = time.time()
+                if now >= next_ping:
+                    self._heartbeat(sock, now)
+                    next_ping = now + self.heartbeat_interval
+                timeout = self._flush(sock)
+                timeout = next_ping - now if timeout is None else min(timeout, next_ping - now)
+                readable, _, _ = select.select([sock, self._waker[0]], [], [], timeout)
+                if self._waker[0] in readable:
+                    self._waker[0].recv(64)
+                if sock not in readable:
+                    continue
+                data = sock.recv(4096)
+                if not data:
+                    raise ConnectionResetError('Connection closed by the server')
+            except (OSError, ValueError) as e:  # ValueError: the socket was closed by another thread
+                if self.state == self.CONNECTED:
+                    print('Control link lost: %s' % e, file=sys.stderr)
+                    self.reconnect()
+                return
+            buffer += data
+            *messages, buffer = buffer.split(b'|')
+            for message in messages:
+                try:
+                    self._handle(json.loads(message.decode()))
+                except ValueError:
+                    print('Malformed message from server: %r' % message, file=sys.stderr)
+
+    def _heartbeat(self, sock, now):
+        missed = [ping for ping, sent_at in self._pings.items() if now - sent_at > self.heartbeat_deadline]
+        if missed:
+            for ping in missed:
+                del self._pings[ping]
+            self.missed_heartbeats += len(missed)
+            self.signals.linkHealth.emit(self.rtt, self.jitter, self.missed_heartbeats)
+        if now - self._last_heard > self.heartbeat_deadline:
+            raise TimeoutError('No heartbeat for %d ms' % ((now - self._last_heard) * 1000))
+        if self.missed_heartbeats >= self.max_missed_heartbeats:
+            raise TimeoutError('%d heartbeats in a row missed' % self.missed_heartbeats)
+        self._ping_seq += 1
+        self._pings[self._ping_seq] = now
+        sock.sendall(json.dumps({'version': PROTOCOL_VERSION, 'ping': self._ping_seq}).encode()+b'|')
+
+    def _flush(self, sock):
+        """
+        Send the coalesced changes if nothing is waiting for an acknowledgement.
+        :return: seconds until this needs to be called again, or None to wait for new changes or replies
+        """
+        now = time.time()
+        with self.lock:
+            if self._in_flight is not None:
+                seq, sent_at, cameras = self._in_flight
+                if now - sent_at < self.ACK_TIMEOUT:
+                    return sent_at + self.ACK_TIMEOUT - now
+                print('Configuration %d was not acknowledged' % seq, file=sys.stderr)
+                # The server may not have applied any of it, so forget what was sent and send these cameras again in
+                # full, rather than leave them differing from the dashboard
+                if not self._dirty:
+                    self._dirty_since = now
+                for cam in cameras:
+                    self._sent.pop(cam, None)
+                    self._dirty.add(cam)
+                    self.signals.configApplied.emit(int(cam[3:]), -1)
+                self._in_flight = None
+            if not self._dirty:
+                return None
+            if now < self._dirty_since + self.COALESCE_WINDOW:
+                return self._dirty_since + self.COALESCE_WINDOW - now
+            delta = {}
+            for cam in self._dirty:
+                sent = self._sent.setdefault(cam, {})
+                changed = {key: value for key, value in self.configs[cam].items() if sent.get(key) != value}
+                if changed:
+                    delta[cam] = changed
+                    sent.update(changed)
+            self._dirty.clear()
+            if not delta:
+                return None
+            self._seq += 1
+            self._in_flight = (self._seq, now, tuple(delta))
+            message = {'version': PROTOCOL_VERSION, 'seq': self._seq, 'cameras': delta}
+        sock.sendall(json.dumps(message).encode()+b'|')
+        return self.ACK_TIMEOUT
+
+    def _handle(self, message):
+        if 'pong' in message:
+            now = time.time()
+            sent_at = self._pings.pop(message['pong'], None)
+            if sent_at is None:
+                return  # already counted as missed
+            self._last_heard = now
+            self.missed_heartbeats = 0
+            rtt = (now - sent_at) * 1000
+            if self._last_rtt is None:
+                self.rtt = rtt
+            else:
+                self.rtt += (rtt - self.rtt) / 8  # same smoothing as TCP
+                self.jitter += (abs(rtt - self._last_rtt) - self.jitter) / 16  # RFC 3550 interarrival jitter
+            self._last_rtt = rtt
+            self.signals.linkHealth.emit(self.rtt, self.jitter, self.missed_heartbeats)
+        elif 'ack' in message:
+            with self.lock:
+                if self._in_flight is None or self._in_flight[0] != message['ack']:
+                    return  # acknowledgement of a message we already gave up on
+                _, sent_at, cameras = self._in_flight
+                self._in_flight = None
+            latency = (time.time() - sent_at) * 1000
+            for cam, settings in message.get('cameras', {}).items():
+                self.applied[cam] = settings
+            for cam in cameras:
+                self.signals.configApplied.emit(int(cam[3:]), latency)
+            self._notify()  # changes may have piled up while we were waiting
 
-                self.camera_panel.reconnecting.show()
-                self.camera_panel.total_traffic.hide()
-                self.sock=socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.sock.settimeout(1)
-                self.sock.bind(('0.0.0.0', 5800))
-                self.lock.release()
-                while not self.connect():
-                    self.camera_panel.reconnecting.setText(self.camera_panel.reconnecting.text()+'.')
-                    time.sleep(0.1)
-                self.camera_panel.reconnecting.setText("Disconnected. Trying to reconnect")
-                self.camera_panel.reconnecting.hide()
-                self.camera_panel.total_traffic.show()
-            except:
-                print(traceback.format_exc(),file=sys.stderr)
-                self.lock.release()
-    
     def update_config(self, cam_num, resolution, quality):
-        try:
-            self.configs['cam%d' % cam_num] = {'resolution': resolution, 'quality': quality}
-            self.lock.acquire()
-            self.sock.send(json.dumps(self.configs).encode()+b'|')
-        finally:
-            self.lock.release()
+        """
+        Queue new settings for a camera. Returns immediately; the worker sends the keys that changed.
+        """
+        cam = 'cam%d' % cam_num
+        with self.lock:
+            self.configs[cam] = {'resolution': resolution, 'quality': quality}
+            if not self._dirty:
+                self._dirty_since = time.time()
+            self._dirty.add(cam)
+        self._notify()
 
     def change_settings(self, cam_num, cam_res, cam_qual):
-        d = {'cam' + str(cam_num): {"cam_res": cam_res, "cam_qual": cam_qual}}
-        self.sock.sendall(json.dumps(d).encode())
+        self.update_config(cam_num, cam_res, cam_qual)
 
     def close(self):
-        if self.is_connected:
-            self.lock.acquire()
-            self.sock.close()
-            configs_file = open("configs.json", 'w+')
-            configs_file.write(json.dumps({'cameras': self.configs}))
-            configs_file.close()
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            was_connected = self.state == self.CONNECTED
+        self._transition(self.CLOSED)
+        save_configurations()
+        if was_connected:
             print("TCP Connection closed", flush=True)
             # Flush the stdout buffer because it's likely to be the last thing printed
-            self.is_connected = False
-            self.lock.release()
 
-    def scan(self):
+    def useAddress(self, address):
+        """
+        Switch to a newly discovered address and remember it for the next start. Safe to call from any thread.
+        """
         global REMOTE_IP_ADDR
-        if not self.is_connected:
-            if self.lock.acquire(False):
-                try:
-                    self.sock.close()
-                    for ip in range(int(REMOTE_IP_ADDR.split('.')[-1])+1 if self.continue_scan else 2,64):
-                        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        if os.name == 'nt':  # Reset TCP connections instead of waiting for ACK from peer
-                            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('hh', 1, 0))
-                        else:
-                            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
-                        sock.settimeout(0.5)
-                        sock.bind(('0.0.0.0', 5800))
-                        try:
-                            print(f'\rScanning {REMOTE_IP_ADDR_SPACE}.{ip}', end='')
-                            sock.connect((f'{REMOTE_IP_ADDR_SPACE}.{ip}', 5800))
-                        except KeyboardInterrupt:
-                            raise
-                        except (IOError, OSError):
-                            pass
-                        else:
-                            print(f'\rAddress found {REMOTE_IP_ADDR_SPACE}.{ip}')
-                            REMOTE_IP_ADDR = f'{REMOTE_IP_ADDR_SPACE}.{ip}'
-                            self.continue_scan=True
-                            break
-                        finally:
-                            sock.close()
-                    else:
-                        print('\nScan finished. Not found.')
-                finally:
-                    self.sock=socket.socket(socket.AF_INET,socket.SOCK_STREAM)
-                    self.sock.bind(('0.0.0.0', 5800))
-                    self.sock.settimeout(1)
-                    self.lock.release()
-                
+        if address == REMOTE_IP_ADDR or self.is_connected:
+            return
+        print('Address found %s' % address)
+        REMOTE_IP_ADDR = address
+        CONFIGURATIONS['remote_address'] = address
+        save_configurations()
+        self.signals.addressFound.emit(address)
+        self._wake.set()  # skip the rest of the backoff if we are dialing
+
+    def _verifyAddress(self):
+        if not probe_addresses([REMOTE_IP_ADDR]) and self._startScan():
+            self._scan()
+
+    def scan(self):
+        """
+        Probe the whole address space in the background. Successive scans move on to the next server found.
+        """
+        if self._startScan():
+            threading.Thread(target=self._scan, name='Scan', daemon=True).start()
+
+    def _startScan(self):
+        """
+        :return: whether a scan may start, in which case the caller runs _scan, which clears scanning when done
+        """
+        with self.lock:
+            if self.scanning or self.is_connected:
+                return False
+            self.scanning = True
+            return True
+
+    def _scan(self):
+        try:
+            print('Scanning %s.2-63' % REMOTE_IP_ADDR_SPACE)
+            found = probe_addresses(['%s.%d' % (REMOTE_IP_ADDR_SPACE, ip) for ip in range(2, 64)])
+            if not found:
+                print('Scan finished. Not found.')
+                return
+            address = found[0]
+            if self.continue_scan and REMOTE_IP_ADDR in found:  # move on to the next server, wrapping around
+                address = found[(found.index(REMOTE_IP_ADDR) + 1) % len(found)]
+            self.continue_scan = True
+            self.useAddress(address)
+        finally:
+            self.scanning = False
+
 
 class StatusPlotItem(pg.PlotItem):
-    def __init__(self, *args, arr_size=9000, **kwargs):
+    HISTORY = 20  # seconds shown
+
+    def __init__(self, *args, series=None, **kwargs):
+        """
+        :param series: optional. The TelemetrySeries to plot and record values to, e.g. one of a shared
+            TelemetryStore. Defaults to a series of its own.
+        """
         super().__init__(*args, **kwargs)
-        self.arr_size = arr_size
+        self.series = TelemetrySeries('status') if series is None else series
         self.setClipToView(True)
-        self.setDownsampling(mode='subsample')
         self.setLabel('bottom', 'Time')
         self.curve = self.plot()
-        self.__x = np.full((self.arr_size,), np.inf, dtype=np.float)
-        self.__y = np.zeros((self.arr_size,), dtype=np.short)
-        self.index = 0
         self.time_started = None
+        self.settled = None  # time of the 11th value, the first few are very not accurate
         self.getViewBox().setAutoVisible(True,True)
         for axis in self.axes.values():
             axis['item'].enableAutoSIPrefix(False)
 
     @property
     def value(self):
-        return self.__y[-1]
+        latest = self.series.latest
+        return 0 if latest is None else latest[1]
 
     @value.setter
     def value(self, v):
         if self.time_started is None:
             self.time_started = time.time()
         current_time = time.time() - self.time_started
-        self.__y[self.index] = v
-        self.__x[self.index] = current_time
-        self.index += 1
+        self.series.append(current_time, v)
+        if self.settled is None and self.series.total > 10:
+            self.settled = current_time
         self.setLimits(xMin=current_time - 18, xMax=current_time+2)
-        if self.index == self.arr_size:  # expends the array
-            print('%s: Array Resizing'%round(current_time,2))
-            self.arr_size += 3600  # 30 FPS for 120 seconds
-            new_x = np.full((self.arr_size,), np.inf, dtype=np.float)
-            new_x[:self.__x.shape[0]] = self.__x
-            new_y = np.zeros((self.arr_size,), dtype=np.ushort)
-            new_y[:self.__y.shape[0]] = self.__y
-            self.__x = new_x
-            self.__y = new_y
-            # self.index=0
 
     def update(self):
-        if self.index>20:
-            self.curve.setData(self.__x[10:], self.__y[10:]) # The first few data points are very not accurate
-        else:
-            self.curve.setData(self.__x, self.__y)
+        latest = self.series.latest
+        if latest is None:
+            return
+        end = latest[0]
+        start = end - self.HISTORY
+        if self.settled is not None and self.series.total > 20:
+            start = max(start, self.settled)
+        # at most two points per pixel, however long the history or fast the rate
+        self.curve.setData(*self.series.downsample(start, end, max(int(self.getViewBox().width()), 1)))
 
 class Camera(QWidget):
     modes = (
@@ -469,9 +793,10 @@ class Camera(QWidget):
         ('Optimize for video quality',480,30)
     )
 
-    def __init__(self, id, app:QApplication, *args, **kwargs):
+    def __init__(self, id, app:QApplication, *args, store=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.id = id
+        self.store = TelemetryStore(retention=STATUS_RETENTION) if store is None else store
         self.image_quality = CONFIGURATIONS['cameras']['cam%d' % id]['quality']
         self.image_resolution = CONFIGURATIONS['cameras']['cam%d' % id]['resolution']
 
@@ -484,7 +809,7 @@ class Camera(QWidget):
 
         self.status_frame = QFrame()
         self.status_frame.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
-        self.status_frame.setMinimumSize(250, 340)
+        self.status_frame.setMinimumSize(250, 370)
         self.status = QScrollArea()
         self.status.setWidget(self.status_frame)
         self.initStatus()
@@ -555,6 +880,10 @@ class Camera(QWidget):
         self.status_layout.addWidget(QLabel("Traffic"), 6, 0)
         self.status_layout.addWidget(self.traffic, 6, 1)
 
+        self.apply_latency = QLabel('-')
+        self.status_layout.addWidget(QLabel("Apply Latency"), 13, 0)
+        self.status_layout.addWidget(self.apply_latency, 13, 1)
+
         self.mode_selection = QComboBox()
         self.mode_selection.wheelEvent=self.status.wheelEvent # Monkey patch it so the selection doesn't change
         self.mode_selection.setEnabled(False)
@@ -620,38 +949,42 @@ class Camera(QWidget):
 
 
     def updateConfiguration(self):
-        try:
-            Configuration().update_config(self.id, self.resolution_slider.value(), self.quality_slider.value())
-        except (ConnectionResetError,BrokenPipeError):
-            Configuration().reconnect()
+        self.apply_latency.setText('pending')
+        Configuration().update_config(self.id, self.resolution_slider.value(), self.quality_slider.value())
+
+    def updateApplyLatency(self, latency):
+        if latency < 0:
+            self.apply_latency.setText('no ack')
+        else:
+            self.apply_latency.setText('{: <4} ms'.format(str(round(latency, 2))))
 
     def initGraphs(self):
-        self.traffic_plot = StatusPlotItem()
+        self.traffic_plot = StatusPlotItem(series=self.store.series('cam%d/traffic' % self.id))
         self.traffic_plot.setTitle("Traffic")
         self.traffic_plot.setLabel("left", 'Data Transmitted', 'KB/s')
         self.traffic_graphs.addItem(self.traffic_plot, row=0, col=0)
 
-        self.network_plot = StatusPlotItem()
+        self.network_plot = StatusPlotItem(series=self.store.series('cam%d/network' % self.id))
         self.network_plot.setTitle("Network Time")
         self.network_plot.setLabel("left", "Latency (ms)", )
         self.network_graphs.addItem(self.network_plot, row=0, col=2)
 
-        self.client_time_plot = StatusPlotItem()
+        self.client_time_plot = StatusPlotItem(series=self.store.series('cam%d/client_time' % self.id))
         self.client_time_plot.setTitle("Client Time")
         self.client_time_plot.setLabel("left", "Latency (ms)", )
         self.network_graphs.addItem(self.client_time_plot, row=0, col=1)
 
-        self.total_time_plot = StatusPlotItem()
+        self.total_time_plot = StatusPlotItem(series=self.store.series('cam%d/total_time' % self.id))
         self.total_time_plot.setTitle("Total Latency")
         self.total_time_plot.setLabel("left", "Latency (ms)", )
         self.network_graphs.addItem(self.total_time_plot, row=0, col=0)
 
-        self.frame_rate_plot = StatusPlotItem()
+        self.frame_rate_plot = StatusPlotItem(series=self.store.series('cam%d/frame_rate' % self.id))
         self.frame_rate_plot.setLabel('left', 'Frame Per Second')
         self.frame_rate_plot.setTitle("Frame Rate")
         self.frame_rate_graphs.addItem(self.frame_rate_plot, row=0, col=0)
 
-        self.frame_drop_plot = StatusPlotItem()
+        self.frame_drop_plot = StatusPlotItem(series=self.store.series('cam%d/frame_drop' % self.id))
         self.frame_rate_plot.setLabel('left', 'Frame Per Second')
         self.frame_drop_plot.setTitle('Frame Drop')
         self.frame_rate_graphs.addItem(self.frame_drop_plot, row=0, col=1)
@@ -695,7 +1028,10 @@ class Camera(QWidget):
 
 class CameraPanel(QWidget):
     __obj=None
-    def __init__(self, n_camera, app:QApplication, *args, **kwargs):
+    def __init__(self, n_camera, app:QApplication, *args, store=None, **kwargs):
+        """
+        :param store: optional. The TelemetryStore to record the cameras' status to, as 'cam<n>/traffic' and so on.
+        """
         if CameraPanel.__obj is not None:
             raise type('InstanceExists',(Exception,),{})('A CameraPanel instance has already been constructed.')
         CameraPanel.__obj=self
@@ -705,6 +1041,10 @@ class CameraPanel(QWidget):
         self.setLayout(self.box)
         
         Configuration(n_camera,self)
+        Configuration().signals.stateChanged.connect(self.updateConnectionState)
+        Configuration().signals.attemptFailed.connect(self.updateConnectionAttempt)
+        Configuration().signals.configApplied.connect(self.updateApplyLatency)
+        Configuration().signals.linkHealth.connect(self.updateLinkHealth)
         TrafficMonitor(n_camera)
         FrameRateMonitor(n_camera)
         FrameDropMonitor(n_camera)
@@ -714,6 +1054,8 @@ class CameraPanel(QWidget):
         self.reconnecting=QLabel("Disconnected. Trying to reconnect")
         self.reconnecting.setWordWrap(True)
         self.total_traffic=QLabel("0.000 KB/s")
+        self.link_health=QLabel()
+        self.link_health.setSizePolicy(QSizePolicy.Maximum,QSizePolicy.Expanding)
         self.restart_remote=QPushButton("Restart Remote")
         self.restart_remote.setSizePolicy(QSizePolicy.Maximum,QSizePolicy.Expanding)
         self.restart_remote.clicked.connect(self.restartRemote)
@@ -731,12 +1073,14 @@ class CameraPanel(QWidget):
         self.top_grid.addWidget(self.connectButton,0,1)
         self.top_grid.addWidget(self.reconnecting,0,1)
         self.top_grid.addWidget(self.total_traffic,0,1)
-        self.top_grid.addWidget(self.restart_remote,0,2)
+        self.top_grid.addWidget(self.link_health,0,2)
+        self.top_grid.addWidget(self.restart_remote,0,3)
         self.top_grid.addWidget(self.scan,0,0)
         
         
         self.total_traffic.hide()
         self.reconnecting.hide()
+        self.link_health.hide()
 
         self.box.addWidget(self.top_frame)
 
@@ -745,8 +1089,9 @@ class CameraPanel(QWidget):
         self.timer.timeout.connect(self.updateTraffic)
         self.timer.start(100)
 
+        self.store = TelemetryStore(retention=STATUS_RETENTION) if store is None else store
         for i in range(n_camera):
-            self.cameras.append(Camera(i,app))
+            self.cameras.append(Camera(i,app,store=self.store))
     
         
         main_splitter = QSplitter(Qt.Horizontal)
@@ -771,16 +1116,44 @@ class CameraPanel(QWidget):
 
     def connectRemote(self):
         """
-        This function blocks until TCP connection succeeds.
-        Call with caution
+        Starts connecting in the background. The panel is updated by updateConnectionState once the link is up.
         """
-        if Configuration().connect():
-            self.connectButton.hide()
+        self.connectButton.setEnabled(False)
+        self.connectButton.setText("Connecting...")
+        Configuration().connect()
+
+    def updateConnectionState(self, state):
+        if state == Configuration.CONNECTED:
+            self.reconnecting.hide()
+            self.reconnecting.setText("Disconnected. Trying to reconnect")
             self.total_traffic.show()
-            for cam in self.cameras:
-                cam.startReceiving()
-                cam.mode_selection.setEnabled(True)
-                cam.updateMode(cam.mode_selection.currentIndex())
+            if not self.connectButton.isHidden():  # first connection
+                self.connectButton.hide()
+                for cam in self.cameras:
+                    cam.startReceiving()
+                    cam.mode_selection.setEnabled(True)
+                    cam.updateMode(cam.mode_selection.currentIndex())
+        elif state == Configuration.RECONNECTING:
+            self.total_traffic.hide()
+            self.link_health.hide()
+            self.reconnecting.show()
+
+    def updateLinkHealth(self, rtt, jitter, missed):
+        self.link_health.show()
+        text = 'RTT {:<4} ms ± {:<4} ms'.format(round(rtt, 1), round(jitter, 1))
+        if missed:
+            text += ' ({} missed)'.format(missed)
+        self.link_health.setText(text)
+
+    def updateConnectionAttempt(self, attempt, delay):
+        if not self.connectButton.isHidden():
+            self.connectButton.setText("Connecting... (attempt %d)" % (attempt + 1))
+        else:
+            self.reconnecting.setText("Disconnected. Retrying in %.1f s (attempt %d)" % (delay, attempt + 1))
+
+    def updateApplyLatency(self, cam_num, latency):
+        if cam_num < len(self.cameras):
+            self.cameras[cam_num].updateApplyLatency(latency)
 
     def restartRemote(self):
         os.system(f'ssh root@{REMOTE_IP_ADDR} systemctl restart vision-server.service')
@@ -833,6 +1206,15 @@ except (FileNotFoundError, ValueError):
         }
     }
 
+REMOTE_IP_ADDR = CONFIGURATIONS.get('remote_address', REMOTE_IP_ADDR)
+
+
+def save_configurations():
+    configs_file = open("configs.json", 'w+')
+    configs_file.write(json.dumps(CONFIGURATIONS))
+    configs_file.close()
+
+
 __all__=['CameraPanel']
 
 if __name__ == '__main__':
@@ -863,7 +1245,7 @@ if __name__ == '__main__':
     #sys.stderr=err
     w.show()
     
-    #use camera_panel.cameras[i].camera_feed.saveImage(name=None)
+    #use gui(camera_panel.cameras[i].camera_feed.saveImage, name=None)
     
     try:
         app.exec_()
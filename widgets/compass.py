@@ -4,30 +4,66 @@ from PySide2.QtGui import *
 from PySide2.QtWidgets import *
 
 class CompassWidget(QWidget):
+    """
+    A compass showing a heading in degrees, clockwise from north.
+
+    The dial, its ticks and labels only change with the size and palette, so it is drawn once into a pixmap and each
+    repaint just copies it and draws the needle over it. Angles may be set at any rate, e.g. straight from a gyro: they
+    are held until the next display frame and only the latest is shown, so a 100 Hz feed repaints at most once a
+    frame and emits angleChanged at most once a frame.
+    """
 
     angleChanged = Signal(float)
 
+    NEEDLE = QPolygon([QPoint(-10, 0), QPoint(0, -45), QPoint(10, 0),
+                       QPoint(0, 45), QPoint(-10, 0)])
+    NEEDLE_TIP = QPolygon([QPoint(-5, -25), QPoint(0, -45), QPoint(5, -25),
+                           QPoint(0, -30), QPoint(-5, -25)])
+
     def __init__(self, parent = None):
 
         QWidget.__init__(self, parent)
 
         self._angle = 0.0
+        self._pending = None  # latest angle set since the last frame
         self._margins = 10
         self._pointText = {0: "N", 45: "NE", 90: "E", 135: "SE", 180: "S",
                            225: "SW", 270: "W", 315: "NW"}
+        self.dial = None
+        self.dialKey = None  # what the dial was drawn for
+        self.frameTimer = QTimer(self)
+        self.frameTimer.setSingleShot(True)
+        self.frameTimer.timeout.connect(self.applyAngle)
 
     def paintEvent(self, event):
 
         painter = QPainter()
         painter.begin(self)
+        painter.drawPixmap(0, 0, self.renderDial())
         painter.setRenderHint(QPainter.Antialiasing)
-
-        painter.fillRect(event.rect(), self.palette().brush(QPalette.Window))
-        self.drawMarkings(painter)
         self.drawNeedle(painter)
 
         painter.end()
 
+    def renderDial(self):
+        """
+        :return: the background and markings, drawn again only when the size or palette changed
+        """
+        ratio = self.devicePixelRatioF()
+        key = (self.size(), ratio, self.palette().cacheKey())
+        if self.dial is None or self.dialKey != key:
+            self.dial = QPixmap(self.size() * ratio)
+            self.dial.setDevicePixelRatio(ratio)
+            self.dialKey = key
+            painter = QPainter(self.dial)
+            try:
+                painter.fillRect(self.rect(), self.palette().brush(QPalette.Window))
+                painter.setRenderHint(QPainter.Antialiasing)
+                self.drawMarkings(painter)
+            finally:
+                painter.end()
+        return self.dial
+
     def drawMarkings(self, painter):
 
         painter.save()
@@ -69,18 +105,10 @@ class CompassWidget(QWidget):
 
         painter.setPen(QPen(Qt.NoPen))
         painter.setBrush(self.palette().brush(QPalette.Shadow))
-
-        painter.drawPolygon(
-            QPolygon([QPoint(-10, 0), QPoint(0, -45), QPoint(10, 0),
-                      QPoint(0, 45), QPoint(-10, 0)])
-            )
+        painter.drawPolygon(self.NEEDLE)
 
         painter.setBrush(self.palette().brush(QPalette.Highlight))
-
-        painter.drawPolygon(
-            QPolygon([QPoint(-5, -25), QPoint(0, -45), QPoint(5, -25),
-                      QPoint(0, -30), QPoint(-5, -25)])
-            )
+        painter.drawPolygon(self.NEEDLE_TIP)
 
         painter.restore()
 
@@ -92,13 +120,32 @@ class CompassWidget(QWidget):
         return self._angle
 
     def setAngle(self, angle):
-
-        if angle != self._angle:
+        """
+        Show angle from the next display frame on. Angles set before then replace it.
+        """
+        self._pending = angle
+        if not self.frameTimer.isActive():
+            self.frameTimer.start(self.frameInterval())
+
+    def applyAngle(self):
+        angle, self._pending = self._pending, None
+        if angle is not None and angle != self._angle:
             self._angle = angle
             self.angleChanged.emit(angle)
             self.update()
 
-    angle = property(float, angle, setAngle)
+    def frameInterval(self):
+        """
+        :return: ms between frames of the screen the compass is on, 60 Hz if unknown
+        """
+        screen = self.screen() if hasattr(self, 'screen') else QGuiApplication.primaryScreen()
+        rate = screen.refreshRate() if screen is not None else 0
+        return int(1000 / (rate if rate > 0 else 60))
+
+    angle = Property(float, angle, setAngle, notify=angleChanged)
+
+
+__all__ = ['CompassWidget']
 
 '''
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+import datetime
+import glob
+import gzip
+import io
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# what reading a file whose last frame was cut short raises: gzip's EOFError, or zstandard's ZstdError
+TRUNCATED_ERRORS = (EOFError,) if zstandard is None else (EOFError, zstandard.ZstdError)
+
+from .log_model import LEVEL_NAMES
+
+EXTENSIONS = {'gzip': '.log.gz', 'zstd': '.log.zst'}
+
+
+class LogWriter(threading.Thread):
+    """
+    Writes console lines to disk on a background thread.
+
+    Lines are queued without blocking. Every flush_interval seconds the queued lines are compressed into
+    one frame (a gzip member or a zstd frame) and appended to the current file. Concatenated frames are
+    still one valid file. A new file is started once the current one reaches max_bytes or is max_age
+    seconds old, and only the newest max_files files are kept.
+
+    Each line is stored as ``timestamp<TAB>level<TAB>source<TAB>message``.
+    """
+
+    def __init__(self, directory='logs', prefix='console', compression=None, max_bytes=8 * 1024 * 1024,
+                 max_age=3600, max_files=100, flush_interval=0.5):
+        """
+        :param compression: 'gzip' or 'zstd'. Defaults to zstd when the zstandard package is installed.
+        """
+        super().__init__(name='LogWriter', daemon=True)
+        if compression is None:
+            compression = 'zstd' if zstandard is not None else 'gzip'
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError('zstd compression requires the zstandard package')
+        if compression not in EXTENSIONS:
+            raise ValueError('Unknown compression %r' % compression)
+        self.directory = directory
+        self.prefix = prefix
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self.queue = deque()
+        self.file = None
+        self.path = None
+        self._opened_at = 0
+        self._closing = threading.Event()
+        self._compressor = zstandard.ZstdCompressor() if compression == 'zstd' else None
+        os.makedirs(directory, exist_ok=True)
+        self.start()
+
+    def write(self, message, level, source, timestamp):
+        self.queue.append((message, level, source, timestamp))  # deque.append is atomic, so no lock is needed
+
+    def extend(self, lines):
+        """
+        :param lines: iterable of (message, level, source, timestamp), as passed to LogModel.append
+        """
+        self.queue.extend(lines)
+
+    def run(self):
+        try:
+            while not self._closing.wait(self.flush_interval):
+                self.flush()
+        finally:
+            self.flush()
+            if self.file is not None:
+                self.file.close()
+
+    def flush(self):
+        queue = self.queue
+        lines = [queue.popleft() for _ in range(len(queue))]
+        if not lines:
+            return
+        text = ''.join(['%.3f\t%s\t%s\t%s\n' % (timestamp, LEVEL_NAMES[level], source, message)
+                        for message, level, source, timestamp in lines]).encode('utf-8', 'replace')
+        if self._compressor is not None:
+            frame = self._compressor.compress(text)
+        else:
+            frame = gzip.compress(text, compresslevel=6)
+        try:
+            if self.file is None or self.file.tell() >= self.max_bytes or \
+                    time.time() - self._opened_at >= self.max_age:
+                self._rotate()
+            self.file.write(frame)
+            self.file.flush()
+        except OSError as e:
+            # Don't print: the console is probably what we are writing, and this would loop forever
+            if sys.__stderr__ is not None:
+                sys.__stderr__.write('Log file unavailable: %s\n' % e)
+
+    def _rotate(self):
+        if self.file is not None:
+            self.file.close()
+        name = '%s-%s%s' % (self.prefix, datetime.datetime.now().strftime('%Y-%m-%dT%H-%M-%S.%f'),
+                            EXTENSIONS[self.compression])
+        self.path = os.path.join(self.directory, name)
+        self.file = open(self.path, 'ab')
+        self._opened_at = time.time()
+        for path in log_files(self.directory, self.prefix)[:-self.max_files]:
+            os.remove(path)
+
+    def close(self):
+        """
+        Write out everything still queued and stop the thread.
+        """
+        self._closing.set()
+        self.join()
+
+
+def log_files(directory='logs', prefix='console'):
+    """
+    :return: the log files in directory, oldest first
+    """
+    paths = []
+    for extension in EXTENSIONS.values():
+        paths.extend(glob.glob(os.path.join(directory, glob.escape(prefix) + '-*' + extension)))
+    return sorted(paths, key=os.path.basename)  # the names start with a sortable timestamp
+
+
+def read_lines(path):
+    """
+    :return: iterator over (timestamp, level, source, message) in the file, oldest first
+    """
+    if path.endswith(EXTENSIONS['zstd']):
+        if zstandard is None:
+            raise ValueError('Reading %s requires the zstandard package' % path)
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True,
+                                                          closefd=True)
+    else:
+        raw = gzip.open(path, 'rb')
+    with io.TextIOWrapper(raw, encoding='utf-8', errors='replace', newline='\n') as file:
+        try:
+            for line in file:
+                timestamp, level, source, message = line.rstrip('\n').split('\t', 3)
+                yield float(timestamp), level, source, message
+        except TRUNCATED_ERRORS:
+            pass  # the last frame of a file that is still being written, or of a crashed session
+
+
+def tail(n=100, directory='logs', prefix='console'):
+    """
+    :return: the last n lines logged, oldest first. Only the newest files that are needed are read.
+    """
+    chunks = []
+    found = 0
+    for path in reversed(log_files(directory, prefix)):
+        chunk = deque(read_lines(path), maxlen=n)
+        chunks.append(chunk)
+        found += len(chunk)
+        if found >= n:
+            break
+    lines = [line for chunk in reversed(chunks) for line in chunk]
+    return lines[-n:] if n else []
+
+
+def grep(pattern, directory='logs', prefix='console', level=None, since=None, until=None):
+    """
+    :param pattern: a regular expression searched for in each message
+    :param level: if given, only lines at this level or above, e.g. 'Warning'
+    :param since: if given, only lines logged at or after this unix time
+    :param until: if given, only lines logged before this unix time
+    :return: iterator over matching (timestamp, level, source, message)
+    """
+    search = re.compile(pattern).search
+    minimum = LEVEL_NAMES.index(level) if level is not None else 0
+    files = log_files(directory, prefix)
+    for i, path in enumerate(files):
+        if since is not None and i + 1 < len(files) and _started_at(files[i + 1], prefix) <= since:
+            continue  # everything in this file was logged before the next one was started
+        if until is not None and _started_at(path, prefix) >= until:
+            break
+        for line in read_lines(path):
+            timestamp, line_level, _, message = line
+            if since is not None and timestamp < since or until is not None and timestamp >= until:
+                continue
+            if LEVEL_NAMES.index(line_level) >= minimum and search(message):
+                yield line
+
+
+def _started_at(path, prefix):
+    stamp = os.path.basename(path)[len(prefix) + 1:].split('.log')[0]
+    return datetime.datetime.strptime(stamp, '%Y-%m-%dT%H-%M-%S.%f').timestamp()
+
+
+__all__ = ['LogWriter', 'grep', 'tail']
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Read dashboard console logs. Run it as a module from the repository '
+                                                 'root: python -m widgets.log_file')
+    parser.add_argument('--directory', default='logs')
+    parser.add_argument('--prefix', default='console')
+    commands = parser.add_subparsers(dest='command')
+    tail_parser = commands.add_parser('tail')
+    tail_parser.add_argument('-n', type=int, default=100)
+    grep_parser = commands.add_parser('grep')
+    grep_parser.add_argument('pattern')
+    grep_parser.add_argument('--level', choices=LEVEL_NAMES)
+    args = parser.parse_args()
+
+    if args.command == 'grep':
+        found = grep(args.pattern, args.directory, args.prefix, args.level)
+    else:
+        found = tail(getattr(args, 'n', 100), args.directory, args.prefix)
+    for timestamp, level, source, message in found:
+        print('%s %-7s %-16s %s' % (datetime.datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-3],
+                                     level, source, message))
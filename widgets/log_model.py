@@ -0,0 +1,216 @@
+import time
+from bisect import bisect_left
+
+import numpy as np
+from PySide2.QtCore import QAbstractListModel, QModelIndex, Qt, QTimer
+from PySide2.QtGui import QColor
+
+DEBUG, INFO, WARNING, ERROR = range(4)
+LEVEL_NAMES = ('Debug', 'Info', 'Warning', 'Error')
+
+
+class LogStore:
+    """
+    Ring buffer of console lines. Messages live in a plain list, level, source and timestamp in NumPy columns.
+    Lines are addressed by their absolute index, which keeps growing; the oldest ones are overwritten once
+    capacity is reached.
+    """
+    CAPACITY = 1000000
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.messages = [''] * capacity
+        self.levels = np.zeros(capacity, dtype=np.uint8)
+        self.sources = np.zeros(capacity, dtype=np.uint16)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.source_names = []
+        self._source_ids = {}
+        self.total = 0  # lines ever appended
+
+    @property
+    def first(self):
+        """
+        :return: absolute index of the oldest line still stored
+        """
+        return max(0, self.total - self.capacity)
+
+    def __len__(self):
+        return self.total - self.first
+
+    def append(self, message, level, source, timestamp):
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            source_id = self._source_ids[source] = len(self.source_names)
+            self.source_names.append(source)
+        slot = self.total % self.capacity
+        self.messages[slot] = message
+        self.levels[slot] = level
+        self.sources[slot] = source_id
+        self.timestamps[slot] = timestamp
+        self.total += 1
+
+    def clear(self):
+        self.total = 0
+
+    def message(self, index):
+        return self.messages[index % self.capacity]
+
+    def level(self, index):
+        return int(self.levels[index % self.capacity])
+
+    def source(self, index):
+        return self.source_names[self.sources[index % self.capacity]]
+
+    def timestamp(self, index):
+        return float(self.timestamps[index % self.capacity])
+
+    def match(self, start, stop, text='', level=DEBUG):
+        """
+        :return: absolute indices in [start, stop) whose level is at least level and whose message contains text
+        """
+        indices = np.arange(start, stop)
+        if level > DEBUG:
+            indices = indices[self.levels[indices % self.capacity] >= level]
+        if not text:
+            return indices.tolist()
+        messages, capacity = self.messages, self.capacity
+        return [i for i in indices.tolist() if text in messages[i % capacity]]
+
+
+class LogModel(QAbstractListModel):
+    """
+    List model over a LogStore. Only the visible rows are ever asked for, so the view stays fast no matter
+    how many lines are stored.
+
+    With a filter set, the model keeps a sorted index of matching lines. New lines are matched as they
+    arrive. Narrowing the filter only re-checks the current matches. Any other change rescans the store in
+    chunks on a timer, so even a million lines never block the GUI for long.
+    """
+    SCAN_CHUNK = 100000
+    COLORS = {DEBUG: QColor('grey'), WARNING: QColor(200, 120, 0), ERROR: QColor('red')}
+
+    def __init__(self, store=None, parent=None):
+        super().__init__(parent)
+        self.store = store if store is not None else LogStore()
+        self.text = ''
+        self.level = DEBUG
+        self._base = self.store.first  # unfiltered: absolute index of row 0
+        self._rows = len(self.store)
+        self._matches = None  # filtered: absolute indices of the rows
+        self._scanned = self.store.total  # lines below this have been matched against the filter
+        self._scan_timer = QTimer(self)
+        self._scan_timer.timeout.connect(self._scanChunk)
+
+    @property
+    def is_filtered(self):
+        return bool(self.text) or self.level > DEBUG
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._rows if self._matches is None else len(self._matches)
+
+    def lineIndex(self, row):
+        """
+        :return: the absolute index in the store of the line shown in row
+        """
+        return self._base + row if self._matches is None else self._matches[row]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        line = self.lineIndex(index.row())
+        if role == Qt.DisplayRole:
+            return self.store.message(line)
+        if role == Qt.ForegroundRole:
+            return self.COLORS.get(self.store.level(line))
+        if role == Qt.ToolTipRole:
+            timestamp = self.store.timestamp(line)
+            return '%s.%03d  %s  %s' % (time.strftime('%H:%M:%S', time.localtime(timestamp)),
+                                        timestamp % 1 * 1000, LEVEL_NAMES[self.store.level(line)],
+                                        self.store.source(line))
+        return None
+
+    def append(self, lines):
+        """
+        :param lines: iterable of (message, level, source, timestamp)
+        """
+        for line in lines:
+            self.store.append(*line)
+        self._evict()
+        if self._matches is None:
+            new = self.store.total - self._base - self._rows
+            if new:
+                self.beginInsertRows(QModelIndex(), self._rows, self._rows + new - 1)
+                self._rows += new
+                self.endInsertRows()
+        elif not self._scan_timer.isActive():  # a rescan in progress will reach the new lines by itself
+            self._scan(self.store.total)
+
+    def _evict(self):
+        first = self.store.first
+        self._scanned = max(self._scanned, first)
+        if self._matches is None:
+            evicted = min(first - self._base, self._rows)
+            if evicted > 0:
+                self.beginRemoveRows(QModelIndex(), 0, evicted - 1)
+                self._rows -= evicted
+                self.endRemoveRows()
+            self._base = first
+        else:
+            evicted = bisect_left(self._matches, first)
+            if evicted:
+                self.beginRemoveRows(QModelIndex(), 0, evicted - 1)
+                del self._matches[:evicted]
+                self.endRemoveRows()
+
+    def _scan(self, stop):
+        matches = self.store.match(self._scanned, stop, self.text, self.level)
+        self._scanned = stop
+        if matches:
+            self.beginInsertRows(QModelIndex(), len(self._matches), len(self._matches) + len(matches) - 1)
+            self._matches.extend(matches)
+            self.endInsertRows()
+
+    def _scanChunk(self):
+        self._scan(min(self._scanned + self.SCAN_CHUNK, self.store.total))
+        if self._scanned >= self.store.total:
+            self._scan_timer.stop()
+
+    def setFilter(self, text='', level=DEBUG):
+        if text == self.text and level == self.level:
+            return
+        narrower = text.find(self.text) != -1 and level >= self.level
+        old_text, old_level = self.text, self.level
+        self.text, self.level = text, level
+        self.beginResetModel()
+        if not self.is_filtered:
+            self._scan_timer.stop()
+            self._matches = None
+            self._base = self.store.first
+            self._rows = len(self.store)
+        elif narrower and (old_text or old_level > DEBUG) and not self._scan_timer.isActive():
+            # Every line matching the new filter matches the old one, so only the current matches need checking
+            matches = np.array(self._matches, dtype=np.int64)
+            matches = matches[self.store.levels[matches % self.store.capacity] >= level].tolist()
+            messages, capacity = self.store.messages, self.store.capacity
+            self._matches = [i for i in matches if text in messages[i % capacity]]
+        else:
+            self._matches = []
+            self._scanned = self.store.first
+            self._scan_timer.start(0)
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.store.clear()
+        self._base = 0
+        self._rows = 0
+        self._scanned = 0
+        if self._matches is not None:
+            self._matches = []
+        self._scan_timer.stop()
+        self.endResetModel()
+
+
+__all__ = ['LogStore', 'LogModel']
@@ -1,8 +1,34 @@
-from PySide2.QtWidgets import QWidget, QDesktopWidget
-from PySide2.QtGui import QPainter,QColor,QFont
-from field_map.map import FieldMap
+import math
+import time
+
+import numpy as np
+from PySide2.QtCore import QPointF, QRect, QRectF, QTimer, Qt
+from PySide2.QtWidgets import QSlider, QWidget, QDesktopWidget
+from PySide2.QtGui import QPainter, QPainterPath, QColor, QFont, QFontMetrics, QImage, QPen, QPixmap, QPolygonF, \
+    QTransform
+from field_map.abc import BaseRobot
+from field_map.heatmap import Heatmap
+from field_map.map import FieldMap, FieldStructure
+from field_map.trail import Trail
 
 class Minimap(QWidget):
+    STRUCTURE_COLOR = QColor(120, 120, 120)
+    OBSTACLE_COLOR = QColor(230, 140, 0, 180)
+    ROBOT_COLOR = QColor(30, 90, 200)
+    TRAIL_COLOR = QColor(30, 90, 200, 140)
+    MAX_ZOOM = 20
+    MIN_FEATURE = 2  # obstacles smaller than this many pixels are not drawn
+    LABEL_ZOOM = 2  # object names are drawn from this zoom on
+    TICK_SPACINGS = (1, 2, 6, 12, 24, 60, 120)  # inches between axis ticks, the smallest that is far enough apart wins
+    MIN_TICK_GAP = 40  # pixels
+    HEATMAP_CELL = 6  # inches
+    # from transparent through red to yellow, as ARGB32, indexed by heat from 0 to 255
+    _heat = np.linspace(0, 1, 256)
+    HEATMAP_COLORS = ((np.minimum(_heat * 8, 0.7) * 255).astype(np.uint32) << 24
+                      | (np.clip(_heat * 2 + 0.3, 0, 1) * 255).astype(np.uint32) << 16
+                      | (np.clip(_heat * 2 - 1, 0, 1) * 255).astype(np.uint32) << 8)
+    del _heat
+
     def __init__(self):
         super().__init__()
         self.map = FieldMap()
@@ -15,42 +41,382 @@ class Minimap(QWidget):
         self.height = self.map.width * self.scale
         self.setFixedSize(self.width, self.height)
         self.zoom = 1
-    
+        self.pan = QPointF(0, 0)  # the map point shown at the bottom-left corner
+        self.dragStart = None  # (mouse position, pan) while dragging
+        self.background = None  # the field and its structures in the current view, drawn once into a pixmap
+        self.backgroundKey = None
+        self.mapVersion = self.map.version
+        self.hoverRect = QRect()  # where the coordinate readout was last drawn
+        self.polygons = {}  # name -> (object, QPolygonF)
+        self.trail = Trail(min_distance=self.map.scale)  # fed with the robot's position, see recordPose
+        self.trailPath = QPainterPath()
+        self.trailStart = 0  # serial numbers of the trail samples the path starts at and extends to
+        self.trailEnd = 0
+        self.trailHead = None  # the trail's head when last painted
+        self.trailLayer = None  # the trail path drawn for the current view, extended as samples come in
+        self.trailLayerKey = None
+        self.heatmap = Heatmap(self.map.width, self.map.length, self.HEATMAP_CELL * self.map.scale)
+        self.showHeatmap = False
+        self.heatmapLayer = 'time'  # which of the heatmap's layers is shown
+        self.heatmapCache = None  # (heatmap version, layer, QImage)
+        self.simulation = None  # a Simulation run in step with the sweep timer, see simulate
+        self.simulationCollisions = 0
+        self.zoomSlider = QSlider(Qt.Horizontal, self)
+        self.zoomSlider.setRange(10, self.MAX_ZOOM * 10)
+        self.zoomSlider.setFixedWidth(120)
+        self.zoomSlider.move(self.width - 130, 10)
+        self.zoomSlider.setToolTip('Zoom')
+        self.zoomSlider.valueChanged.connect(self.zoomSliderMoved)
+        self.expiryTimer = QTimer(self)
+        self.expiryTimer.timeout.connect(self.sweepMap)
+        self.expiryTimer.start(100)  # the expiry resolution of the map
+
+    def sweepMap(self):
+        if self.simulation is not None:
+            self.simulation.advance(time.monotonic())
+            robot = self.simulation.robot
+            x, y, _ = robot.pose
+            self.recordPose(x, y, collided=robot.collisions > self.simulationCollisions)
+            self.simulationCollisions = robot.collisions
+        self.map.tick()
+        heat = self.heatmap.version
+        self.heatmap.add_trail(self.trail)
+        if self.map.version != self.mapVersion or self.trail.head != self.trailHead or \
+                self.showHeatmap and self.heatmap.version != heat:
+            self.mapVersion = self.map.version
+            self.update()
+
+    def simulate(self, simulation):
+        """
+        Run a Simulation in step with the dashboard's clock, leaving a trail. Its robot should drive on this
+        minimap's map, and be on it under the simulation's name to be drawn.
+        """
+        self.simulation = simulation
+        self.simulationCollisions = simulation.robot.collisions
+
+    def recordPose(self, x, y, t=None, collided=False):
+        """
+        Add a position to the robot's trail, and so to the heatmap. It is drawn with the next sweep.
+        :param collided: whether the robot collided there, which is also counted in the heatmap
+        """
+        self.trail.record(x, y, t)
+        if collided:
+            self.heatmap.add(x, y, layer='collisions')
+
+    def setHeatmap(self, show, layer=None):
+        """
+        Show or hide the heatmap, optionally switching to another of its layers.
+        """
+        self.showHeatmap = show
+        if layer is not None:
+            self.heatmapLayer = layer
+        self.update()
+
+    def heatmapImage(self):
+        """
+        :return: QImage of the shown heatmap layer, one pixel per cell, with row 0 the bottom of the field. It is
+            colored again only when the heatmap changes.
+        """
+        heatmap = self.heatmap
+        if self.heatmapCache is None or self.heatmapCache[:2] != (heatmap.version, self.heatmapLayer):
+            heat = (heatmap.normalized(self.heatmapLayer) * 255).astype(np.uint8)
+            pixels = np.ascontiguousarray(self.HEATMAP_COLORS[heat])
+            rows, cols = pixels.shape
+            image = QImage(pixels.tobytes(), cols, rows, cols * 4, QImage.Format_ARGB32).copy()
+            self.heatmapCache = heatmap.version, self.heatmapLayer, image
+        return self.heatmapCache[2]
+
+    def exportHeatmap(self, path):
+        """
+        Save the shown heatmap layer as an image, the way the minimap shows it, e.g. at the end of a match. Use
+        heatmap.save to keep the numbers.
+        :return: whether it was saved
+        """
+        return self.heatmapImage().mirrored().save(path)
+
+    def updateTrailPath(self):
+        """
+        Extend the trail path with the samples recorded since the last call. The path is only built again from
+        scratch when the trail was cleared, or when enough old samples were overwritten to be worth dropping.
+        :return: a path of just the new segments, or None if the whole path was built again
+        """
+        trail = self.trail
+        tail = QPainterPath()
+        if trail.total < self.trailEnd or trail.first - self.trailStart > trail.capacity // 8:
+            tail = None
+            self.trailPath = QPainterPath()
+            self.trailStart = self.trailEnd = trail.first
+        elif self.trailPath.elementCount():
+            tail.moveTo(self.trailPath.currentPosition())
+        for x, y, _ in trail.since(self.trailEnd):
+            if self.trailPath.elementCount():
+                self.trailPath.lineTo(x, y)
+            else:
+                self.trailPath.moveTo(x, y)
+            if tail is not None:
+                if tail.elementCount():
+                    tail.lineTo(x, y)
+                else:
+                    tail.moveTo(x, y)
+        self.trailEnd = trail.total
+        return tail
+
+    # Viewport
+
+    def mapTransform(self):
+        """
+        :return: QTransform from map coordinates to widget coordinates. The map's origin is bottom-left.
+        """
+        scale = self.scale * self.zoom
+        return QTransform(scale, 0, 0, -scale, -scale * self.pan.x(), self.height + scale * self.pan.y())
+
+    def toMap(self, x, y):
+        """
+        :return: the map point under the widget point (x, y)
+        """
+        return self.mapTransform().inverted()[0].map(QPointF(x, y))
+
+    def visibleBounds(self, rect=None):
+        """
+        :return: (minx, miny, maxx, maxy) of the map area shown in rect, the whole widget by default
+        """
+        area = self.mapTransform().inverted()[0].mapRect(QRectF(rect if rect is not None else self.rect()))
+        return area.left(), area.top(), area.right(), area.bottom()
+
+    def setView(self, zoom, pan):
+        zoom = min(max(zoom, 1), self.MAX_ZOOM)
+        # keep the field filling the widget
+        x = min(max(pan.x(), 0), self.map.length * (1 - 1 / zoom))
+        y = min(max(pan.y(), 0), self.map.width * (1 - 1 / zoom))
+        self.zoom, self.pan = zoom, QPointF(x, y)
+        self.zoomSlider.blockSignals(True)
+        self.zoomSlider.setValue(round(zoom * 10))
+        self.zoomSlider.blockSignals(False)
+        self.update()
+
+    def zoomAt(self, zoom, x, y):
+        """
+        Zoom keeping the map point under the widget point (x, y) in place.
+        """
+        anchor = self.toMap(x, y)
+        zoom = min(max(zoom, 1), self.MAX_ZOOM)
+        scale = self.scale * zoom
+        self.setView(zoom, QPointF(anchor.x() - x / scale, anchor.y() - (self.height - y) / scale))
+
+    def zoomSliderMoved(self, value):
+        self.zoomAt(value / 10, self.width / 2, self.height / 2)
+
+    def wheelEvent(self, event):
+        self.zoomAt(self.zoom * 1.0015 ** event.angleDelta().y(), event.x(), event.y())
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.dragStart = event.pos(), self.pan
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.dragStart = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.setView(1, QPointF(0, 0))
+
+    # Painting
+
     def paintEvent(self, event):
         qp = QPainter()
         qp.begin(self)
         try:
-            self.paintMap(qp)
+            self.paintMap(qp, event.rect())
         finally:
             qp.end()
-    
+
+    def resizeEvent(self, event):
+        self.background = None
+        super().resizeEvent(event)
+
     def mouseMoveEvent(self, event):
         self.hover_x = event.x()
         self.hover_y = event.y()
-        self.repaint()
-    
+        if self.dragStart is not None:
+            position, pan = self.dragStart
+            scale = self.scale * self.zoom
+            self.setView(self.zoom, QPointF(pan.x() - (event.x() - position.x()) / scale,
+                                            pan.y() + (event.y() - position.y()) / scale))
+        self.updateHover()
+
     def enterEvent(self, event):
         self.showCoordinate = True
-    
+
     def leaveEvent(self, event):
         self.showCoordinate = False
-        self.repaint()
-    
-    def paintMap(self, qp):
-        rect = self.rect()
-        qp.setBrush(QColor(255, 255, 255))
-        assert rect.x() == 0
-        assert rect.y() == 0
-        scaled_origin_x = rect.x()
-        scaled_origin_y = rect.y()
-        qp.drawRect(scaled_origin_x, scaled_origin_y, self.width, self.height)
-        
-        if self.showCoordinate:
-            if self.hover_x < self.width and self.hover_y < scaled_origin_y + self.height:
+        self.updateHover()
+
+    def hoverText(self):
+        point = self.toMap(self.hover_x, self.hover_y)
+        return f"{round(point.x(),2)},{round(point.y(),2)}"
+
+    def updateHover(self):
+        """
+        Repaint only where the coordinate readout was and will be.
+        """
+        old = self.hoverRect
+        if self.showCoordinate and self.hover_x < self.width and self.hover_y < self.height:
+            size = QFont().pointSize()
+            self.hoverRect = QFontMetrics(self.font()).boundingRect(self.hoverText()).translated(size, size * 2) \
+                .adjusted(-2, -2, 2, 2)
+        else:
+            self.hoverRect = QRect()
+        self.update(old.united(self.hoverRect))
+
+    def visibleObjects(self, rect):
+        """
+        :return: (name, object) for the objects in the part of the map shown in rect that are big enough to see
+        """
+        minimum = self.MIN_FEATURE / (self.scale * self.zoom)
+        found = []
+        for name, obj in self.map.query(self.visibleBounds(rect)):
+            minx, miny, maxx, maxy = obj.bounds
+            if maxx - minx >= minimum or maxy - miny >= minimum or isinstance(obj, BaseRobot):
+                found.append((name, obj))
+        return found
+
+    def polygon(self, name, obj):
+        """
+        :return: a QPolygonF of obj, cached as long as the map holds obj under name
+        """
+        cached = self.polygons.get(name)
+        if cached is None or cached[0] is not obj:
+            names = self.map.names()
+            if len(self.polygons) > 2 * len(names) + 100:
+                self.polygons = {key: value for key, value in self.polygons.items() if key in names}
+            cached = self.polygons[name] = obj, QPolygonF([QPointF(x, y) for x, y in obj.points])
+        return cached[1]
+
+    def renderBackground(self):
+        """
+        Draw the field and the structures in view, which only change when the view or the map's structures do.
+        """
+        self.background = QPixmap(self.size())
+        self.backgroundKey = (self.map.static_version, self.zoom, self.pan)
+        qp = QPainter(self.background)
+        try:
+            qp.setBrush(QColor(255, 255, 255))
+            qp.drawRect(0, 0, self.width - 1, self.height - 1)
+            qp.setRenderHint(QPainter.Antialiasing)
+            qp.setTransform(self.mapTransform())
+            qp.setPen(Qt.NoPen)
+            qp.setBrush(self.STRUCTURE_COLOR)
+            for _, obj in self.visibleObjects(self.rect()):
+                if isinstance(obj, FieldStructure):
+                    qp.drawPolygon(QPolygonF([QPointF(x, y) for x, y in obj.points]))
+        finally:
+            qp.end()
+
+    def paintMap(self, qp, rect):
+        assert self.rect().x() == 0
+        assert self.rect().y() == 0
+        if self.background is None or self.backgroundKey != (self.map.static_version, self.zoom, self.pan):
+            self.renderBackground()
+        qp.drawPixmap(rect, self.background, rect)
+
+        # Overlays: everything that moves or expires, redrawn over the cached background. Only what is in the
+        # repainted area is looked at.
+        visible = self.visibleObjects(rect)
+        transform = self.mapTransform()
+        qp.save()
+        qp.setRenderHint(QPainter.Antialiasing)
+        qp.setTransform(transform)
+        if self.showHeatmap:
+            # the flip of the map transform puts the image's first row, the bottom of the field, at the bottom
+            qp.drawImage(QRectF(0, 0, self.heatmap.shape[1] * self.heatmap.cell_size,
+                                self.heatmap.shape[0] * self.heatmap.cell_size), self.heatmapImage())
+        qp.setPen(Qt.NoPen)
+        robots = []
+        qp.setBrush(self.OBSTACLE_COLOR)
+        for name, obj in visible:
+            if isinstance(obj, BaseRobot):
+                robots.append(obj)
+            elif not isinstance(obj, FieldStructure):
+                qp.drawPolygon(self.polygon(name, obj))
+        self.paintTrail(qp, rect)
+        qp.setPen(Qt.NoPen)
+        qp.setBrush(self.ROBOT_COLOR)
+        for robot in robots:  # they move, so their polygons are not cached
+            qp.drawPolygon(QPolygonF([QPointF(x, y) for x, y in robot.points]))
+        qp.restore()
+        if self.zoom >= self.LABEL_ZOOM:
+            for name, obj in visible:
+                if isinstance(name, str):  # unnamed objects are keyed by their id
+                    minx, miny, maxx, maxy = obj.bounds
+                    qp.drawText(transform.map(QPointF((minx + maxx) / 2, maxy)) + QPointF(2, -2), name)
+
+        self.paintAxes(qp, transform)
+
+        if self.showCoordinate and rect.intersects(self.hoverRect):
+            if self.hover_x < self.width and self.hover_y < self.height:
                 qp.drawText(QFont().pointSize(), QFont().pointSize() * 2,  # 1em offset from both sides
-                            f"{round(self.hover_x/self.scale,2)},{round((rect.height()-self.hover_y)/self.scale,2)}")
-        
-        # TODO: draw axis
-        # TODO: implement zoom slide bar
+                            self.hoverText())
+
+    def trailPen(self):
+        pen = QPen(self.TRAIL_COLOR, 2)
+        pen.setCosmetic(True)  # the same width at any zoom
+        return pen
+
+    def paintTrail(self, qp, rect):
+        """
+        The robot's trail: a layer holding the path drawn so far, where only the new segments are drawn each frame,
+        and a line from the end of the path to the latest position. The layer is drawn again from the cached path
+        when the view changes.
+        """
+        tail = self.updateTrailPath()
+        self.trailHead = self.trail.head
+        if self.trailHead is None:
+            return
+        key = (self.zoom, self.pan, self.size())
+        if self.trailLayer is None or self.trailLayerKey != key or tail is None:
+            self.trailLayer = QPixmap(self.size())
+            self.trailLayer.fill(Qt.transparent)
+            self.trailLayerKey = key
+            tail = self.trailPath
+        if tail.elementCount() > 1:
+            layer = QPainter(self.trailLayer)
+            try:
+                layer.setRenderHint(QPainter.Antialiasing)
+                layer.setTransform(self.mapTransform())
+                layer.setPen(self.trailPen())
+                layer.drawPath(tail)
+            finally:
+                layer.end()
+        qp.save()
+        qp.resetTransform()
+        qp.drawPixmap(rect, self.trailLayer, rect)
+        qp.restore()
+        if self.trailPath.elementCount():
+            qp.setPen(self.trailPen())
+            qp.drawLine(self.trailPath.currentPosition(), QPointF(*self.trailHead))
+
+    def paintAxes(self, qp, transform):
+        """
+        Ticks along the bottom and left edges, spaced by the zoom level, labeled in feet.
+        """
+        scale = self.scale * self.zoom * self.map.scale  # pixels per inch
+        spacing = next((s for s in self.TICK_SPACINGS if s * scale >= self.MIN_TICK_GAP), self.TICK_SPACINGS[-1])
+        step = spacing * self.map.scale
+        minx, miny, maxx, maxy = self.visibleBounds()
+        metrics = QFontMetrics(self.font())
+        for i in range(math.ceil(minx / step), math.floor(maxx / step) + 1):
+            x = transform.map(QPointF(i * step, 0)).x()
+            qp.drawLine(QPointF(x, self.height), QPointF(x, self.height - 5))
+            label = self.tickLabel(i * spacing)
+            qp.drawText(QPointF(x - metrics.width(label) / 2, self.height - 7), label)
+        for i in range(math.ceil(miny / step), math.floor(maxy / step) + 1):
+            y = transform.map(QPointF(0, i * step)).y()
+            qp.drawLine(QPointF(0, y), QPointF(5, y))
+            qp.drawText(QPointF(7, y + metrics.ascent() / 2), self.tickLabel(i * spacing))
+
+    @staticmethod
+    def tickLabel(inches):
+        feet, inches = divmod(inches, 12)
+        return f"{feet}'" if not inches else f"{feet}'{inches}\""
 
 __all__=['Minimap']
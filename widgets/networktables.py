@@ -0,0 +1,695 @@
+import random
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+from PySide2.QtCore import QObject, QTimer, Signal
+
+NT_PORT = 1735
+PROTOCOL_REVISION = 0x0300  # NetworkTables 3.0
+ROBORIO_ADDR = '10.74.7.2'
+
+GYRO_KEY = '/SmartDashboard/gyro'  # heading in degrees, clockwise
+POSE_KEYS = ('/SmartDashboard/x', '/SmartDashboard/y', '/SmartDashboard/heading')  # map units and radians
+
+# Message types
+KEEP_ALIVE = 0x00
+CLIENT_HELLO = 0x01
+PROTOCOL_UNSUPPORTED = 0x02
+SERVER_HELLO_COMPLETE = 0x03
+SERVER_HELLO = 0x04
+CLIENT_HELLO_COMPLETE = 0x05
+ENTRY_ASSIGNMENT = 0x10
+ENTRY_UPDATE = 0x11
+FLAGS_UPDATE = 0x12
+ENTRY_DELETE = 0x13
+CLEAR_ALL = 0x14
+RPC_EXECUTE = 0x20
+RPC_RESPONSE = 0x21
+CLEAR_ALL_MAGIC = 0xD06CB27A
+NEW_ENTRY_ID = 0xFFFF  # the id a client assigns entries with, the server picks the real one
+
+# Value types
+BOOLEAN = 0x00
+DOUBLE = 0x01
+STRING = 0x02
+RAW = 0x03
+BOOLEAN_ARRAY = 0x10
+DOUBLE_ARRAY = 0x11
+STRING_ARRAY = 0x12
+RPC_DEFINITION = 0x20
+
+_U8 = struct.Struct('>B')
+_U16 = struct.Struct('>H')
+_U32 = struct.Struct('>I')
+_F64 = struct.Struct('>d')
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+class _Incomplete(Exception):
+    """
+    The buffer ends in the middle of a message.
+    """
+
+
+# Encoding
+
+def _leb128(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _string(text):
+    data = text.encode('utf-8')
+    return _leb128(len(data)) + data
+
+
+def value_type(value):
+    """
+    :return: the NetworkTables type to send a Python value as
+    """
+    if isinstance(value, bool):
+        return BOOLEAN
+    if isinstance(value, (int, float)):
+        return DOUBLE
+    if isinstance(value, str):
+        return STRING
+    if isinstance(value, (bytes, bytearray)):
+        return RAW
+    if isinstance(value, (list, tuple)):
+        if all(isinstance(item, bool) for item in value):
+            return BOOLEAN_ARRAY
+        if all(isinstance(item, (int, float)) for item in value):
+            return DOUBLE_ARRAY
+        if all(isinstance(item, str) for item in value):
+            return STRING_ARRAY
+    raise TypeError('%r cannot be sent over NetworkTables' % (value,))
+
+
+def encode_value(kind, value):
+    if kind == BOOLEAN:
+        return _U8.pack(bool(value))
+    if kind == DOUBLE:
+        return _F64.pack(value)
+    if kind == STRING:
+        return _string(value)
+    if kind in (RAW, RPC_DEFINITION):
+        return _leb128(len(value)) + bytes(value)
+    if kind == BOOLEAN_ARRAY:
+        return _U8.pack(len(value)) + bytes(bool(item) for item in value)
+    if kind == DOUBLE_ARRAY:
+        return _U8.pack(len(value)) + struct.pack('>%dd' % len(value), *value)
+    if kind == STRING_ARRAY:
+        return _U8.pack(len(value)) + b''.join(_string(item) for item in value)
+    raise ProtocolError('Unknown value type 0x%02x' % kind)
+
+
+def client_hello(identity):
+    return _U8.pack(CLIENT_HELLO) + _U16.pack(PROTOCOL_REVISION) + _string(identity)
+
+
+def server_hello(identity, flags=0):
+    return _U8.pack(SERVER_HELLO) + _U8.pack(flags) + _string(identity)
+
+
+def entry_assignment(name, kind, entry_id, seq, value, flags=0):
+    return (_U8.pack(ENTRY_ASSIGNMENT) + _string(name) + _U8.pack(kind) + _U16.pack(entry_id) + _U16.pack(seq)
+            + _U8.pack(flags) + encode_value(kind, value))
+
+
+def entry_update(entry_id, seq, kind, value):
+    return _U8.pack(ENTRY_UPDATE) + _U16.pack(entry_id) + _U16.pack(seq) + _U8.pack(kind) + encode_value(kind, value)
+
+
+# Decoding
+
+def _take(buffer, pos, size):
+    if pos + size > len(buffer):
+        raise _Incomplete()
+    return pos + size
+
+
+def _read_leb128(buffer, pos):
+    result = shift = 0
+    while True:
+        _take(buffer, pos, 1)
+        byte = buffer[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _read_bytes(buffer, pos):
+    size, pos = _read_leb128(buffer, pos)
+    end = _take(buffer, pos, size)
+    return bytes(buffer[pos:end]), end
+
+
+def _read_string(buffer, pos):
+    data, pos = _read_bytes(buffer, pos)
+    return data.decode('utf-8', 'replace'), pos
+
+
+def _read(fmt, buffer, pos):
+    end = _take(buffer, pos, fmt.size)
+    return fmt.unpack_from(buffer, pos)[0], end
+
+
+def decode_value(kind, buffer, pos):
+    """
+    :return: (value, position after it)
+    """
+    if kind == BOOLEAN:
+        value, pos = _read(_U8, buffer, pos)
+        return bool(value), pos
+    if kind == DOUBLE:
+        return _read(_F64, buffer, pos)
+    if kind == STRING:
+        return _read_string(buffer, pos)
+    if kind in (RAW, RPC_DEFINITION):
+        return _read_bytes(buffer, pos)
+    if kind in (BOOLEAN_ARRAY, DOUBLE_ARRAY, STRING_ARRAY):
+        count, pos = _read(_U8, buffer, pos)
+        if kind == BOOLEAN_ARRAY:
+            end = _take(buffer, pos, count)
+            return [bool(item) for item in buffer[pos:end]], end
+        if kind == DOUBLE_ARRAY:
+            end = _take(buffer, pos, 8 * count)
+            return list(struct.unpack_from('>%dd' % count, buffer, pos)), end
+        items = []
+        for _ in range(count):
+            item, pos = _read_string(buffer, pos)
+            items.append(item)
+        return items, pos
+    raise ProtocolError('Unknown value type 0x%02x' % kind)
+
+
+def decode_message(buffer, pos=0):
+    """
+    :return: (message, position after it). message is a tuple of the message type and its fields.
+    :raise _Incomplete: if the buffer ends before the message does
+    """
+    kind, pos = _read(_U8, buffer, pos)
+    if kind in (KEEP_ALIVE, SERVER_HELLO_COMPLETE, CLIENT_HELLO_COMPLETE):
+        return (kind,), pos
+    if kind == CLIENT_HELLO:
+        revision, pos = _read(_U16, buffer, pos)
+        identity, pos = _read_string(buffer, pos)
+        return (kind, revision, identity), pos
+    if kind == PROTOCOL_UNSUPPORTED:
+        revision, pos = _read(_U16, buffer, pos)
+        return (kind, revision), pos
+    if kind == SERVER_HELLO:
+        flags, pos = _read(_U8, buffer, pos)
+        identity, pos = _read_string(buffer, pos)
+        return (kind, flags, identity), pos
+    if kind == ENTRY_ASSIGNMENT:
+        name, pos = _read_string(buffer, pos)
+        value_kind, pos = _read(_U8, buffer, pos)
+        entry_id, pos = _read(_U16, buffer, pos)
+        seq, pos = _read(_U16, buffer, pos)
+        flags, pos = _read(_U8, buffer, pos)
+        value, pos = decode_value(value_kind, buffer, pos)
+        return (kind, name, value_kind, entry_id, seq, flags, value), pos
+    if kind == ENTRY_UPDATE:
+        entry_id, pos = _read(_U16, buffer, pos)
+        seq, pos = _read(_U16, buffer, pos)
+        value_kind, pos = _read(_U8, buffer, pos)
+        value, pos = decode_value(value_kind, buffer, pos)
+        return (kind, entry_id, seq, value_kind, value), pos
+    if kind == FLAGS_UPDATE:
+        entry_id, pos = _read(_U16, buffer, pos)
+        flags, pos = _read(_U8, buffer, pos)
+        return (kind, entry_id, flags), pos
+    if kind == ENTRY_DELETE:
+        entry_id, pos = _read(_U16, buffer, pos)
+        return (kind, entry_id), pos
+    if kind == CLEAR_ALL:
+        magic, pos = _read(_U32, buffer, pos)
+        return (kind, magic), pos
+    if kind in (RPC_EXECUTE, RPC_RESPONSE):
+        entry_id, pos = _read(_U16, buffer, pos)
+        call_id, pos = _read(_U16, buffer, pos)
+        data, pos = _read_bytes(buffer, pos)
+        return (kind, entry_id, call_id, data), pos
+    raise ProtocolError('Unknown message type 0x%02x' % kind)
+
+
+def decode_messages(buffer):
+    """
+    :return: (messages, the number of bytes they took). An incomplete message at the end is left for later.
+    """
+    messages, pos = [], 0
+    while pos < len(buffer):
+        try:
+            message, pos_after = decode_message(buffer, pos)
+        except _Incomplete:
+            break
+        messages.append(message)
+        pos = pos_after
+    return messages, pos
+
+
+def _seq_newer(seq, other):
+    """
+    Sequence numbers wrap around at 2 ** 16, so newer means ahead by less than half of that.
+    """
+    return seq != other and (seq - other) % 0x10000 < 0x8000
+
+
+# Client
+
+class ClientSignals(QObject):
+    stateChanged = Signal(str)
+
+
+class NetworkTablesClient:
+    """
+    Keeps a copy of the entries of a NetworkTables 3 server, such as the roboRIO, on a background thread.
+
+    The thread connects, redials with exponential backoff when the link drops, answers the handshake and reads
+    every assignment and update the server sends. Values are coalesced per key: take() returns the latest value of
+    every key that changed since the last call, however many updates arrived meanwhile. Nothing here touches
+    widgets; see TelemetryDispatcher for delivering the changes on the GUI thread.
+
+    Deleted entries are reported with the value None.
+    """
+    DISCONNECTED = 'disconnected'
+    CONNECTING = 'connecting'
+    CONNECTED = 'connected'
+    CLOSED = 'closed'
+
+    BACKOFF_INITIAL = 0.1  # seconds
+    BACKOFF_FACTOR = 2
+    BACKOFF_MAX = 5
+    KEEP_ALIVE_INTERVAL = 1  # seconds without sending anything before a keep alive is sent
+    TIMEOUT = 3  # seconds without hearing from the server before the link counts as lost
+
+    def __init__(self, host=ROBORIO_ADDR, port=NT_PORT, identity='7407 dashboard'):
+        self.host = host
+        self.port = port
+        self.identity = identity
+        self.state = self.DISCONNECTED
+        self.signals = ClientSignals()
+        self.lock = threading.Lock()
+        self.received = 0  # updates received, for comparing with what was delivered
+        self._entries = {}  # name -> [id, type, seq, value], touched by the worker thread only
+        self._names = {}  # id -> name
+        self._pending = {}  # name -> latest value not taken yet
+        self._outgoing = {}  # name -> value put but not sent yet
+        self._waker = socket.socketpair()  # lets put and close interrupt the select in _serve
+        self._waker[1].setblocking(False)
+        self._worker = threading.Thread(target=self._run, name='NetworkTables', daemon=True)
+
+    def start(self):
+        self._worker.start()
+        return self
+
+    def close(self):
+        self._setState(self.CLOSED)
+        self._notify()
+        self._worker.join(1)
+
+    def take(self):
+        """
+        :return: dict of name -> latest value for the entries that changed since the last call
+        """
+        with self.lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def put(self, name, value):
+        """
+        Set an entry on the server. Safe to call from any thread; it is sent when connected.
+        """
+        value_type(value)  # fail here rather than on the worker thread
+        with self.lock:
+            self._outgoing[name] = value
+        self._notify()
+
+    def _notify(self):
+        try:
+            self._waker[1].send(b'\0')
+        except OSError:  # the buffer is full, so a wakeup is pending anyway
+            pass
+
+    def _setState(self, state):
+        with self.lock:
+            if self.state == self.CLOSED or self.state == state:
+                return
+            self.state = state
+        self.signals.stateChanged.emit(state)
+
+    def _run(self):
+        attempt = 0
+        while self.state != self.CLOSED:
+            self._setState(self.CONNECTING)
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=1)
+            except OSError:
+                delay = min(self.BACKOFF_MAX, self.BACKOFF_INITIAL * self.BACKOFF_FACTOR ** attempt)
+                attempt = min(attempt + 1, 16)  # BACKOFF_MAX is reached long before, and the power cannot overflow
+                self._setState(self.DISCONNECTED)
+                self._sleep(random.uniform(delay / 2, delay))
+                continue
+            attempt = 0
+            try:
+                self._serve(sock)
+            except (OSError, ProtocolError) as e:
+                if self.state != self.CLOSED:
+                    print('NetworkTables link lost: %s' % e, file=sys.stderr)
+            finally:
+                sock.close()
+                self._setState(self.DISCONNECTED)
+
+    def _sleep(self, delay):
+        """
+        Wait before dialing again. Writes wake the waker too, so it is drained and only close cuts the wait short.
+        """
+        until = time.time() + delay
+        while self.state != self.CLOSED:
+            remaining = until - time.time()
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([self._waker[0]], [], [], remaining)
+            if readable:
+                self._waker[0].recv(4096)
+
+    def _serve(self, sock):
+        sock.settimeout(None)
+        sock.sendall(client_hello(self.identity))
+        # The server lists its entries afresh on every connection
+        self._entries.clear()
+        self._names.clear()
+        buffer = bytearray()
+        last_sent = last_heard = time.time()
+        while self.state != self.CLOSED:
+            timeout = max(0, min(last_sent + self.KEEP_ALIVE_INTERVAL, last_heard + self.TIMEOUT) - time.time())
+            readable, _, _ = select.select([sock, self._waker[0]], [], [], timeout)
+            now = time.time()
+            if self._waker[0] in readable:
+                self._waker[0].recv(4096)
+            if sock in readable:
+                data = sock.recv(65536)
+                if not data:
+                    raise ConnectionResetError('Connection closed by the server')
+                buffer += data
+                last_heard = now
+                messages, used = decode_messages(buffer)
+                del buffer[:used]
+                for message in messages:
+                    reply = self._handle(message)
+                    if reply:
+                        sock.sendall(reply)
+                        last_sent = now
+            elif now - last_heard >= self.TIMEOUT:
+                raise TimeoutError('Nothing heard from the server for %g s' % self.TIMEOUT)
+            if self.state == self.CONNECTED and self._outgoing:
+                sock.sendall(self._flushOutgoing())
+                last_sent = now
+            if now - last_sent >= self.KEEP_ALIVE_INTERVAL:
+                sock.sendall(_U8.pack(KEEP_ALIVE))
+                last_sent = now
+
+    def _handle(self, message):
+        """
+        :return: bytes to send back, if any
+        """
+        kind = message[0]
+        if kind == ENTRY_ASSIGNMENT:
+            _, name, value_kind, entry_id, seq, _, value = message
+            old = self._entries.get(name)
+            if old is not None and old[0] != entry_id:
+                self._names.pop(old[0], None)
+            self._entries[name] = [entry_id, value_kind, seq, value]
+            self._names[entry_id] = name
+            self._changed(name, value)
+        elif kind == ENTRY_UPDATE:
+            _, entry_id, seq, value_kind, value = message
+            name = self._names.get(entry_id)
+            entry = self._entries.get(name)
+            if entry is not None and entry[1] == value_kind and _seq_newer(seq, entry[2]):
+                entry[2:] = seq, value
+                self._changed(name, value)
+        elif kind == ENTRY_DELETE:
+            name = self._names.pop(message[1], None)
+            if name is not None:
+                del self._entries[name]
+                self._changed(name, None)
+        elif kind == CLEAR_ALL:
+            if message[1] == CLEAR_ALL_MAGIC:
+                for name in self._entries:
+                    self._changed(name, None)
+                self._entries.clear()
+                self._names.clear()
+        elif kind == SERVER_HELLO_COMPLETE:
+            self._setState(self.CONNECTED)
+            return _U8.pack(CLIENT_HELLO_COMPLETE)
+        elif kind == PROTOCOL_UNSUPPORTED:
+            raise ProtocolError('The server only speaks NetworkTables revision 0x%04x' % message[1])
+        return None
+
+    def _changed(self, name, value):
+        with self.lock:
+            self._pending[name] = value
+            self.received += 1
+
+    def _flushOutgoing(self):
+        with self.lock:
+            outgoing, self._outgoing = self._outgoing, {}
+        data = bytearray()
+        for name, value in outgoing.items():
+            kind = value_type(value)
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] != NEW_ENTRY_ID and entry[1] == kind:
+                entry[2:] = (entry[2] + 1) % 0x10000, value
+                data += entry_update(entry[0], entry[2], kind, value)
+            else:
+                data += entry_assignment(name, kind, NEW_ENTRY_ID, 0, value)
+        return bytes(data)
+
+
+class TelemetryDispatcher(QObject):
+    """
+    Delivers the changes a NetworkTablesClient has seen to widgets on the GUI thread, in one batch per frame.
+
+    Every frame tick the client's coalesced changes are taken at once, and each subscriber is called at most once
+    with all of its keys that changed. A gyro published at 100 Hz therefore costs its widget one update per frame,
+    whatever the rate.
+    """
+    FRAME_INTERVAL = 33  # ms
+
+    def __init__(self, client, interval=FRAME_INTERVAL, parent=None):
+        super().__init__(parent)
+        self.client = client
+        self.delivered = 0  # values handed to subscribers
+        self._exact = {}  # key -> list of callbacks
+        self._prefixes = []  # (prefix, callback)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.dispatch)
+        self.timer.start(interval)
+
+    def subscribe(self, key, callback):
+        """
+        :param key: an entry name, or a prefix ending in '/' for every entry under it
+        :param callback: called with a dict of name -> value of the subscribed entries that changed
+        """
+        if key.endswith('/'):
+            self._prefixes.append((key, callback))
+        else:
+            self._exact.setdefault(key, []).append(callback)
+
+    def unsubscribe(self, callback):
+        for key in list(self._exact):
+            self._exact[key] = [other for other in self._exact[key] if other != callback]
+            if not self._exact[key]:
+                del self._exact[key]
+        self._prefixes = [(prefix, other) for prefix, other in self._prefixes if other != callback]
+
+    def dispatch(self):
+        batch = self.client.take()
+        if not batch:
+            return
+        calls = {}  # callback -> the values it gets, in subscription order
+        for name, value in batch.items():
+            for callback in self._exact.get(name, ()):
+                calls.setdefault(callback, {})[name] = value
+            for prefix, callback in self._prefixes:
+                if name.startswith(prefix):
+                    calls.setdefault(callback, {})[name] = value
+        for callback, values in calls.items():
+            self.delivered += len(values)
+            callback(values)
+
+
+# Stand-in server
+
+class StandInServer:
+    """
+    A small NetworkTables 3 server, for running the dashboard without a robot and for tests.
+
+    It accepts any number of clients, and keeps and forwards entries like the roboRIO does: set() changes an entry
+    and sends it to every client, and entries clients assign or update are stored and passed on to the others.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, identity='stand-in'):
+        """
+        :param port: 0 to pick a free one, see the port attribute
+        """
+        self.identity = identity
+        self.lock = threading.Lock()
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((host, port))
+        self._listener.listen()
+        self.host, self.port = self._listener.getsockname()
+        self._entries = {}  # name -> [id, type, seq, value]
+        self._names = {}  # id -> name
+        self._next_id = 0
+        self._clients = {}  # socket -> received bytes not parsed yet
+        self._closed = False
+        self._waker = socket.socketpair()
+        self._waker[1].setblocking(False)
+        self._worker = threading.Thread(target=self._run, name='StandInServer', daemon=True)
+
+    def start(self):
+        self._worker.start()
+        return self
+
+    def close(self):
+        self._closed = True
+        self._waker[1].send(b'\0')
+        self._worker.join(1)
+
+    def get(self, name, default=None):
+        with self.lock:
+            entry = self._entries.get(name)
+        return entry[3] if entry is not None else default
+
+    def set(self, name, value):
+        """
+        Set an entry and send it to every client. Safe to call from any thread.
+        """
+        kind = value_type(value)
+        with self.lock:
+            data = self._store(name, kind, value)
+            clients = list(self._clients)
+        self._broadcast(clients, data)
+
+    def delete(self, name):
+        with self.lock:
+            entry = self._entries.pop(name, None)
+            if entry is None:
+                return
+            del self._names[entry[0]]
+            clients = list(self._clients)
+        self._broadcast(clients, _U8.pack(ENTRY_DELETE) + _U16.pack(entry[0]))
+
+    def _store(self, name, kind, value):
+        """
+        :return: the message telling clients about it
+        """
+        entry = self._entries.get(name)
+        if entry is None or entry[1] != kind:
+            if entry is not None:
+                entry_id = entry[0]
+            else:
+                entry_id, self._next_id = self._next_id, self._next_id + 1
+            self._entries[name] = entry = [entry_id, kind, 0, value]
+            self._names[entry_id] = name
+            return entry_assignment(name, kind, entry_id, 0, value)
+        entry[2:] = (entry[2] + 1) % 0x10000, value
+        return entry_update(entry[0], entry[2], kind, value)
+
+    @staticmethod
+    def _broadcast(clients, data, skip=None):
+        for sock in clients:
+            if sock is not skip:
+                try:
+                    sock.sendall(data)
+                except OSError:
+                    pass  # the worker drops it on its next read
+
+    def _run(self):
+        try:
+            while not self._closed:
+                readable, _, _ = select.select([self._listener, self._waker[0]] + list(self._clients), [], [],
+                                               NetworkTablesClient.KEEP_ALIVE_INTERVAL)
+                if not readable:
+                    with self.lock:
+                        clients = list(self._clients)
+                    self._broadcast(clients, _U8.pack(KEEP_ALIVE))
+                for sock in readable:
+                    if sock is self._waker[0]:
+                        sock.recv(64)
+                    elif sock is self._listener:
+                        client, _ = self._listener.accept()
+                        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                        with self.lock:
+                            self._clients[client] = bytearray()
+                    else:
+                        self._read(sock)
+        finally:
+            with self.lock:
+                for sock in self._clients:
+                    sock.close()
+                self._clients.clear()
+            self._listener.close()
+
+    def _read(self, sock):
+        try:
+            data = sock.recv(65536)
+        except OSError:
+            data = b''
+        if not data:
+            with self.lock:
+                del self._clients[sock]
+            sock.close()
+            return
+        buffer = self._clients[sock]
+        buffer += data
+        messages, used = decode_messages(buffer)
+        del buffer[:used]
+        for message in messages:
+            kind = message[0]
+            if kind == CLIENT_HELLO:
+                if message[1] != PROTOCOL_REVISION:
+                    sock.sendall(_U8.pack(PROTOCOL_UNSUPPORTED) + _U16.pack(PROTOCOL_REVISION))
+                    continue
+                with self.lock:
+                    hello = server_hello(self.identity) + b''.join(
+                        entry_assignment(name, kind, entry_id, seq, value)
+                        for name, (entry_id, kind, seq, value) in self._entries.items())
+                sock.sendall(hello + _U8.pack(SERVER_HELLO_COMPLETE))
+            elif kind == ENTRY_ASSIGNMENT:
+                _, name, value_kind, _, _, _, value = message
+                with self.lock:
+                    data = self._store(name, value_kind, value)
+                    clients = list(self._clients)
+                self._broadcast(clients, data)  # the sender learns the id from it too
+            elif kind == ENTRY_UPDATE:
+                _, entry_id, _, value_kind, value = message
+                with self.lock:
+                    name = self._names.get(entry_id)
+                    data = self._store(name, value_kind, value) if name is not None else None
+                    clients = list(self._clients)
+                if data is not None:
+                    self._broadcast(clients, data, skip=sock)
+
+
+__all__ = ['NetworkTablesClient', 'TelemetryDispatcher', 'StandInServer', 'ProtocolError', 'GYRO_KEY', 'POSE_KEYS']
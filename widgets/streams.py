@@ -1,40 +1,281 @@
+import ctypes
+import queue
 import sys
+import threading
+import time
 import traceback
 import datetime
+from collections import deque
 
-from PySide2.QtCore import Qt
-from PySide2.QtGui import (QColor, QFont, QPainter, QTextCursor)
-from PySide2.QtWidgets import (QDesktopWidget, QPlainTextEdit, QTextEdit, QWidget)
+from PySide2.QtCore import QObject, Qt, QTimer, Signal
+from PySide2.QtGui import (QColor, QFont, QKeySequence, QPainter, QTextCursor)
+from PySide2.QtWidgets import (QComboBox, QDesktopWidget, QHBoxLayout, QHeaderView, QLineEdit, QPlainTextEdit,
+                               QTableView, QVBoxLayout, QWidget)
 
+from .log_model import DEBUG, ERROR, INFO, LEVEL_NAMES, WARNING, LogModel, LogStore
 
 
-class StreamOutput(QTextEdit):
-    def __init__(self):
+
+class StreamOutput(QWidget):
+    """
+    Console that can be written to from any thread.
+
+    write() only appends to a queue. The GUI thread drains it on a timer, splits the text into lines and
+    appends them to a LogModel in one batch. The view is virtualized and has a substring/level filter,
+    so the console stays responsive with up to max_lines lines.
+    """
+    FLUSH_INTERVAL = 50  # ms
+    MAX_BATCH = 2000  # writes handled per flush, so a flood of output cannot stall the GUI
+    COLOR_LEVELS = {'red': ERROR, 'orange': WARNING, 'grey': DEBUG}
+
+    def __init__(self, max_lines=LogStore.CAPACITY, level=INFO, log_writer=None):
+        """
+        :param log_writer: optional LogWriter that also receives every line, to keep it on disk
+        """
         super().__init__()
-        self.setLineWrapMode(QTextEdit.NoWrap)
-        self.setReadOnly(True)
-        self.setTabStopWidth(4)
+        self.level = level
+        self.log_writer = log_writer
+        self.model = LogModel(LogStore(max_lines), self)
+        # With fixed row heights a table view only ever touches the rows on screen
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setShowGrid(False)
+        self.view.setWordWrap(False)
+        self.view.horizontalHeader().hide()
+        self.view.horizontalHeader().setStretchLastSection(True)
+        self.view.verticalHeader().hide()
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(self.view.fontMetrics().height() + 2)
+        self.view.setSelectionBehavior(QTableView.SelectRows)
+
+        self.filter_text = QLineEdit()
+        self.filter_text.setPlaceholderText('Filter')
+        self.filter_text.textChanged.connect(self.updateFilter)
+        self.filter_level = QComboBox()
+        self.filter_level.addItems(LEVEL_NAMES)
+        self.filter_level.currentIndexChanged.connect(self.updateFilter)
+
+        filter_bar = QHBoxLayout()
+        filter_bar.setContentsMargins(0, 0, 0, 0)
+        filter_bar.addWidget(self.filter_text)
+        filter_bar.addWidget(self.filter_level)
+        box = QVBoxLayout()
+        box.setContentsMargins(0, 0, 0, 0)
+        box.addLayout(filter_bar)
+        box.addWidget(self.view)
+        self.setLayout(box)
+
+        self.queue = deque()
+        self.partial = {}  # thread name -> text written since its last newline
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.flushQueue)
+        self.timer.start(self.FLUSH_INTERVAL)
     
     def write(self, text, color=None):
-        self.moveCursor(QTextCursor.End)
-        # if self.textCursor().columnNumber() == 0:
-        #     self.insertHtml(f"<font color='grey'>{datetime.datetime.now().strftime('%H:%M:%S.%f')}</font> ")
-        text = text.replace('\n', '<br>').replace(' ', '&nbsp;')
-        if color:
-            text = "<font color='%s'>" % color + text + '</font>'
-        self.insertHtml(text)
+        # deque.append is atomic, so no lock is needed
+        self.queue.append((text, self.COLOR_LEVELS.get(color, self.level), threading.current_thread().name,
+                           time.time()))
+    
+    def flushQueue(self, flush_partial=False):
+        queue = self.queue
+        batch = [queue.popleft() for _ in range(min(len(queue), self.MAX_BATCH))]
+        lines = []
+        i = 0
+        while i < len(batch):
+            _, level, source, timestamp = batch[i]
+            j = i + 1
+            while j < len(batch) and batch[j][2] == source and batch[j][1] == level:
+                j += 1  # print() makes several writes per line, join them before splitting
+            text = self.partial.pop(source, '') + ''.join([item[0] for item in batch[i:j]])
+            *complete, rest = text.split('\n')
+            lines.extend([(line, level, source, timestamp) for line in complete])
+            if rest:
+                self.partial[source] = rest
+            i = j
+        if flush_partial:
+            lines.extend((rest, self.level, source, time.time()) for source, rest in self.partial.items())
+            self.partial.clear()
+        if not lines:
+            return
+        scroll_bar = self.view.verticalScrollBar()
+        at_bottom = scroll_bar.value() == scroll_bar.maximum()
+        self.model.append(lines)
+        if self.log_writer is not None:
+            self.log_writer.extend(lines)
+        if at_bottom:
+            self.view.scrollToBottom()
+
+    def updateFilter(self):
+        self.model.setFilter(self.filter_text.text(), self.filter_level.currentIndex())
     
     def flush(self):
         pass
     
     def closeStream(self):
         'write everything back'
+        while self.queue:
+            self.flushQueue()
+        self.flushQueue(flush_partial=True)
 
 class StreamError(StreamOutput):
-    def write(self, text):
-        self.moveCursor(QTextCursor.End)
-        text = text.replace('\n', '<br>').replace(' ', '&nbsp;').replace('\t', '&nbsp;' * 4)
-        self.insertHtml(f"<font color='red'>{text}</font>")
+    def __init__(self, max_lines=LogStore.CAPACITY, level=ERROR, log_writer=None):
+        super().__init__(max_lines, level, log_writer)
+
+    def write(self, text, color=None):
+        super().write(text.replace('\t', ' ' * 4), color)
+
+
+class History:
+    """
+    Bounded command history, oldest first, with prefix search.
+    """
+
+    def __init__(self, maxlen=1000):
+        self.entries = deque(maxlen=maxlen)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def append(self, command):
+        if not self.entries or self.entries[-1] != command:
+            self.entries.append(command)
+
+    def search(self, prefix, start, step=-1):
+        """
+        :param start: index to search from, exclusive. len(self) to start from the newest entry.
+        :param step: -1 to search older entries, 1 for newer ones
+        :return: index of the nearest entry starting with prefix, or None
+        """
+        entries = self.entries
+        i = start + step
+        while 0 <= i < len(entries):
+            if entries[i].startswith(prefix):
+                return i
+            i += step
+        return None
+
+
+class ReplSignals(QObject):
+    finished = Signal()
+
+
+class GuiInvoker(QObject):
+    """
+    Runs functions on the GUI thread for code running on another one, e.g. console commands that touch widgets.
+    Create it on the GUI thread.
+    """
+    invoke = Signal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.invoke.connect(self._run, Qt.QueuedConnection)
+
+    def _run(self, call):
+        call()
+
+    def __call__(self, function, *args, **kwargs):
+        """
+        Call function on the GUI thread and wait for it.
+        :return: what it returned. What it raised is raised here.
+        """
+        if threading.current_thread() is threading.main_thread():
+            return function(*args, **kwargs)
+        done = threading.Event()
+        result = {}
+
+        def call():
+            try:
+                result['value'] = function(*args, **kwargs)
+            except BaseException as e:
+                result['error'] = e
+            finally:
+                done.set()
+
+        self.invoke.emit(call)
+        while not done.wait(0.05):  # short waits, so an interrupt gets through
+            pass
+        if 'error' in result:
+            raise result['error']
+        return result.get('value')
+
+
+class ReplWorker(threading.Thread):
+    """
+    Runs commands typed into a StreamInput one at a time, off the GUI thread.
+    Output goes to sys.stdout as usual, which the console drains from any thread. Widgets must only be touched on the
+    GUI thread, so the namespace gets a helper for that: gui(function, *args) calls function there and returns what it
+    returned, e.g. gui(camera_panel.cameras[0].camera_feed.saveImage).
+    """
+
+    def __init__(self, namespace, plain_text_output=False):
+        super().__init__(name='Repl', daemon=True)
+        self.namespace = namespace
+        self.plainTextOutput = plain_text_output
+        self.commands = queue.Queue()
+        self.signals = ReplSignals()
+        self.gui = GuiInvoker()
+        self.namespace.setdefault('gui', self.gui)
+        self.running = False
+        self.sequence = 0  # of the latest command
+        self.current = None  # sequence of the command running, None between commands
+        self.lock = threading.Lock()
+        self.start()
+
+    def execute(self, command):
+        """
+        :return: the command's sequence number, to interrupt it with
+        """
+        self.running = True
+        self.sequence += 1
+        self.commands.put((self.sequence, command))
+        return self.sequence
+
+    def interrupt(self, sequence):
+        """
+        Raise KeyboardInterrupt in the command numbered sequence, if it is still running. Blocking calls such as
+        socket.recv or time.sleep only see it once they return.
+        """
+        with self.lock:
+            if self.current == sequence:
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self.ident),
+                                                           ctypes.py_object(KeyboardInterrupt))
+
+    def run(self):
+        while True:
+            try:
+                sequence, command = self.commands.get()
+                try:
+                    with self.lock:
+                        self.current = sequence
+                    exec(command, self.namespace)
+                except BaseException:
+                    if self.plainTextOutput:
+                        sys.stdout.write(traceback.format_exc())
+                    else:
+                        sys.stdout.write(traceback.format_exc(), 'red')
+                finally:
+                    self._finish()
+                    # no interrupt can come in from here on
+                    self.running = False
+                    self.signals.finished.emit()
+            except KeyboardInterrupt:  # an interrupt that came in while the traceback was written
+                pass
+
+    def _finish(self):
+        """
+        Stop taking interrupts for the command that ran, and drop one that was raised but not yet delivered.
+        """
+        while True:
+            try:
+                with self.lock:
+                    self.current = None
+                    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self.ident), None)
+                return
+            except KeyboardInterrupt:  # delivered before the lock was taken, try again
+                pass
 
 
 class StreamInput(QPlainTextEdit):
@@ -47,51 +288,64 @@ class StreamInput(QPlainTextEdit):
         self.document().clearUndoRedoStacks()
         self.cursorPositionChanged.connect(self.validateCursorPosition)
         self.lastCursorPosition = 4
-        self.historyNumber = 0
+        self.history = History()
+        self.historyIndex = None  # position while browsing the history, None otherwise
+        self.historyPrefix = ''
         self.overrideCursorValidation = False
         self.plainTextOutput=plain_text_output
+        self.worker = ReplWorker(globals(), plain_text_output)
+        self.commandSequence = None  # of the command running
+        self.worker.signals.finished.connect(self.commandFinished)
     
     def keyPressEvent(self, event):
+        if self.worker.running:
+            if event.key() == Qt.Key_C and event.modifiers() == Qt.ControlModifier:
+                self.worker.interrupt(self.commandSequence)
+            elif event.matches(QKeySequence.Copy):
+                super().keyPressEvent(event)
+            return  # no new input until the current command finishes
         if event.key() == Qt.Key_Return or event.key() == Qt.Key_Enter:
-            last_line = self.toPlainText().split('\n')[-1][4:]
+            last_line = self.document().lastBlock().text()[4:]
+            self.historyIndex = None
             if not last_line.rstrip():
                 self.moveCursor(QTextCursor.End)
                 self.insertPlainText('\n>>> ')
-                self.historyNumber = 0
                 return
-            if self.plainTextOutput:
-                print(f'(exec) {last_line}')
-            else:
-                print(f"<b>(exec)</b> {last_line}")
-            try:
-                exec(last_line, globals())
-            except BaseException as e:
-                if self.plainTextOutput:
-                    sys.stdout.write(traceback.format_exc())
-                else:
-                    tb = traceback.format_exc().replace(' ', '&nbsp;')
-                    sys.stdout.write(f"<br>{tb}", 'red')
-            self.moveCursor(QTextCursor.End)
-            self.insertPlainText('\n>>> ')
-            self.historyNumber = 0
-            self.document().clearUndoRedoStacks()
+            print(f'(exec) {last_line}')
+            self.history.append(last_line)
+            self.commandSequence = self.worker.execute(last_line)
             return
         if event.key() == Qt.Key_Delete or event.key() == Qt.Key_Backspace:
             if self.textCursor().columnNumber() <= 4:
                 return
         if event.key() == Qt.Key_Up:
-            if self.historyNumber < self.document().blockCount() - 1:
-                self.historyNumber += 1
-                self.insertHistory()
+            if self.historyIndex is None:
+                self.historyPrefix = self.document().lastBlock().text()[4:]
+                self.historyIndex = len(self.history)
+            index = self.history.search(self.historyPrefix, self.historyIndex, -1)
+            if index is not None:
+                self.historyIndex = index
+                self.insertHistory(self.history[index])
             return
         
         if event.key() == Qt.Key_Down:
-            if self.historyNumber > 1:
-                self.historyNumber -= 1
-                self.insertHistory()
+            if self.historyIndex is not None:
+                index = self.history.search(self.historyPrefix, self.historyIndex, 1)
+                if index is None:  # back to what was typed before browsing
+                    self.historyIndex = None
+                    self.insertHistory(self.historyPrefix)
+                else:
+                    self.historyIndex = index
+                    self.insertHistory(self.history[index])
             return
         
+        self.historyIndex = None
         super().keyPressEvent(event)
+
+    def commandFinished(self):
+        self.moveCursor(QTextCursor.End)
+        self.insertPlainText('\n>>> ')
+        self.document().clearUndoRedoStacks()
     
     def validateCursorPosition(self):
         cursor = self.textCursor()
@@ -102,13 +356,12 @@ class StreamInput(QPlainTextEdit):
         else:
             self.lastCursorPosition = cursor.position()
     
-    def insertHistory(self):
-        document = self.document()
-        block = document.findBlockByNumber(document.blockCount() - self.historyNumber - 1)
+    def insertHistory(self, command):
         self.overrideCursorValidation = True
+        self.moveCursor(QTextCursor.End)
         self.moveCursor(QTextCursor.StartOfBlock, QTextCursor.KeepAnchor)
         self.textCursor().removeSelectedText()
-        self.insertPlainText(block.text())
+        self.insertPlainText('>>> ' + command)
         self.moveCursor(QTextCursor.End)
         self.overrideCursorValidation = False
 
@@ -0,0 +1,263 @@
+"""
+A store of telemetry time series shared by the widgets: each signal is a column of timestamps and a column of values,
+kept in chunks of preallocated NumPy arrays.
+
+Appending fills the newest chunk in place, and a new chunk is only allocated when it is full, so nothing is ever
+copied to grow a series. Old chunks are dropped whole once they fall out of the retention window. Every chunk but the
+newest is full, which makes finding a sample a binary search over the chunks' first timestamps and another within
+one chunk.
+
+Reads hand out views of the chunks rather than copies, so any number of plots and exporters can read the same data.
+A view stays valid after its chunk is dropped, the chunk is just no longer shared with the store. Series are meant to
+be written from one thread, the GUI thread in the dashboards, e.g. by a TelemetryDispatcher subscription.
+"""
+import bisect
+import numbers
+import time
+
+import numpy as np
+
+CHUNK_SIZE = 4096  # samples per chunk, about 2 minutes at 30 Hz
+
+
+class TelemetrySeries:
+    """
+    One signal: timestamps, which must not decrease, and float values.
+    """
+
+    def __init__(self, key, chunk_size=CHUNK_SIZE, retention=None, max_samples=None):
+        """
+        :param key: name of the signal
+        :param chunk_size: samples per chunk
+        :param retention: optional. Seconds of history to keep behind the newest sample. Chunks entirely older are
+            dropped.
+        :param max_samples: optional. Samples to keep at least, and at most about a chunk more.
+        """
+        self.key = key
+        self.chunk_size = chunk_size
+        self.retention = retention
+        self.max_samples = max_samples
+        self.total = 0  # samples ever appended
+        self._times = []  # chunks of timestamps, oldest first
+        self._values = []
+        self._starts = []  # first timestamp of each chunk, for bisect
+        self._fill = 0  # samples in the newest chunk
+
+    def __len__(self):
+        return max(len(self._times) - 1, 0) * self.chunk_size + self._fill
+
+    def __repr__(self):
+        return '<TelemetrySeries %s, %d samples>' % (self.key, len(self))
+
+    @property
+    def latest(self):
+        """
+        :return: (time, value) of the newest sample, or None if there is none
+        """
+        if not self._times:
+            return None
+        return float(self._times[-1][self._fill - 1]), float(self._values[-1][self._fill - 1])
+
+    def append(self, t, value):
+        if self._times and t < self._times[-1][self._fill - 1]:
+            raise ValueError('%s: sample at %g is older than the newest one' % (self.key, t))
+        if not self._times or self._fill == self.chunk_size:
+            self._newChunk(t)
+        self._times[-1][self._fill] = t
+        self._values[-1][self._fill] = value
+        self._fill += 1
+        self.total += 1
+        self._trim()
+
+    def extend(self, times, values):
+        """
+        Append samples in bulk, copying them into the chunks a slice at a time.
+        :param times, values: 1d arrays of the same length, times not decreasing
+        """
+        times = np.asarray(times, dtype=np.float64)
+        values = np.broadcast_to(np.asarray(values, dtype=np.float64), times.shape)
+        if not len(times):
+            return
+        if np.any(np.diff(times) < 0) or (self._times and times[0] < self._times[-1][self._fill - 1]):
+            raise ValueError('%s: timestamps must not decrease' % self.key)
+        done = 0
+        while done < len(times):
+            if not self._times or self._fill == self.chunk_size:
+                self._newChunk(times[done])
+            n = min(self.chunk_size - self._fill, len(times) - done)
+            self._times[-1][self._fill:self._fill + n] = times[done:done + n]
+            self._values[-1][self._fill:self._fill + n] = values[done:done + n]
+            self._fill += n
+            done += n
+        self.total += len(times)
+        self._trim()
+
+    def _newChunk(self, t):
+        self._times.append(np.empty(self.chunk_size, dtype=np.float64))
+        self._values.append(np.empty(self.chunk_size, dtype=np.float64))
+        self._starts.append(t)
+        self._fill = 0
+
+    def _trim(self):
+        newest = self._times[-1][self._fill - 1]
+        while len(self._times) > 1:
+            expired = self.retention is not None and self._times[0][-1] < newest - self.retention
+            excess = self.max_samples is not None and len(self) - self.chunk_size >= self.max_samples
+            if not (expired or excess):
+                break
+            del self._times[0], self._values[0], self._starts[0]
+
+    def _search(self, t, side):
+        """
+        :return: position among the samples held of the first sample at or after t if side is 'left', after t if
+            side is 'right', like np.searchsorted
+        """
+        if not self._times:
+            return 0
+        find = bisect.bisect_left if side == 'left' else bisect.bisect_right
+        i = max(find(self._starts, t) - 1, 0)
+        size = self._fill if i == len(self._times) - 1 else self.chunk_size
+        return i * self.chunk_size + int(np.searchsorted(self._times[i][:size], t, side))
+
+    def _views(self, start, stop):
+        views = []
+        while start < stop:
+            i, j = divmod(start, self.chunk_size)
+            end = min(stop - i * self.chunk_size, self.chunk_size)
+            views.append((self._times[i][j:end], self._values[i][j:end]))
+            start = i * self.chunk_size + end
+        return views
+
+    def _columns(self, start, stop):
+        views = self._views(start, stop)
+        if not views:
+            return np.zeros(0), np.zeros(0)
+        if len(views) == 1:
+            return views[0]
+        return np.concatenate([t for t, _ in views]), np.concatenate([v for _, v in views])
+
+    def _range(self, t0, t1):
+        start = 0 if t0 is None else self._search(t0, 'left')
+        stop = len(self) if t1 is None else self._search(t1, 'right')
+        return start, max(stop, start)
+
+    def views(self, t0=None, t1=None):
+        """
+        :param t0, t1: optional. The time range, inclusive. Defaults to everything held.
+        :return: list of (times, values) views of the samples in the range, one per chunk it spans. Nothing is copied.
+        """
+        return self._views(*self._range(t0, t1))
+
+    def window(self, t0=None, t1=None):
+        """
+        :param t0, t1: optional. The time range, inclusive. Defaults to everything held.
+        :return: (times, values) of the samples in the range. Views of the chunk if the range is within one, copies
+            if it spans several.
+        """
+        return self._columns(*self._range(t0, t1))
+
+    def resample(self, t0, t1, step, method='previous'):
+        """
+        Sample the series on a regular grid, e.g. to line signals up with each other for export.
+        :param method: 'previous' holds the last sample at or before each grid time, 'linear' interpolates between
+            samples. Grid times before the first sample are NaN either way.
+        :return: (times, values), times being np.arange(t0, t1, step)
+        """
+        grid = np.arange(t0, t1, step)
+        # one sample before t0 too, for the values up to the first sample in the range
+        start, stop = self._range(t0, t1)
+        times, values = self._columns(max(start - 1, 0), stop)
+        if not len(times):
+            return grid, np.full(grid.shape, np.nan)
+        if method == 'linear':
+            result = np.interp(grid, times, values)
+        elif method == 'previous':
+            result = values[np.maximum(np.searchsorted(times, grid, 'right') - 1, 0)]
+        else:
+            raise ValueError('Unknown resampling method %r' % method)
+        result[grid < times[0]] = np.nan
+        return grid, result
+
+    def downsample(self, t0, t1, buckets):
+        """
+        Reduce the samples in a time range to the minimum and maximum of each of buckets equal intervals, for
+        plotting: a plot buckets pixels wide then shows every spike while drawing at most 2 * buckets points.
+        :return: (times, values). Each non-empty bucket contributes its minimum then its maximum, both at the time
+            of its first sample. Ranges with at most 2 * buckets samples are returned as they are.
+        """
+        times, values = self.window(t0, t1)
+        if len(times) <= 2 * buckets:
+            return times, values
+        width = (t1 - t0) / buckets
+        bucket = np.minimum(((times - t0) / width).astype(np.int64), buckets - 1)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+        pairs = np.stack((np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)), axis=1)
+        return np.repeat(times[starts], 2), pairs.ravel()
+
+    def clear(self):
+        self._times, self._values, self._starts = [], [], []
+        self._fill = 0
+
+
+class TelemetryStore:
+    """
+    The telemetry series of a dashboard, by key. Series are created when first written to, all with the same chunk
+    size and retention.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, retention=None, max_samples=None):
+        self.chunk_size = chunk_size
+        self.retention = retention
+        self.max_samples = max_samples
+        self._series = {}
+
+    def __contains__(self, key):
+        return key in self._series
+
+    def __getitem__(self, key):
+        return self._series[key]
+
+    def __iter__(self):
+        return iter(self._series)
+
+    def __len__(self):
+        return len(self._series)
+
+    def keys(self):
+        return self._series.keys()
+
+    def series(self, key):
+        """
+        :return: the TelemetrySeries of key, created empty if there is none
+        """
+        if key not in self._series:
+            self._series[key] = TelemetrySeries(key, self.chunk_size, self.retention, self.max_samples)
+        return self._series[key]
+
+    def append(self, key, t, value):
+        self.series(key).append(t, value)
+
+    def extend(self, key, times, values):
+        self.series(key).extend(times, values)
+
+    def record(self, values, t=None):
+        """
+        Append a batch of values taken at the same time, e.g. as a TelemetryDispatcher subscriber. Values that are not
+        numbers, such as strings, arrays and deleted entries, are skipped.
+        :param values: dict of key -> value
+        :param t: optional. Defaults to time.monotonic().
+        """
+        t = time.monotonic() if t is None else t
+        for key, value in values.items():
+            if isinstance(value, numbers.Real):
+                self.series(key).append(t, value)
+
+    def window(self, key, t0=None, t1=None):
+        return self._series[key].window(t0, t1)
+
+    def clear(self):
+        for series in self._series.values():
+            series.clear()
+
+
+__all__ = ['TelemetrySeries', 'TelemetryStore']